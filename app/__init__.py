@@ -1,20 +1,29 @@
 from flask import Flask
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_smorest import Api
 
+from app.database import engine_options, init_query_tracking
+from app.local_cache import init_local_cache
 from app.logger import setup_logger
+from app.metrics import init_metrics
+from app.redis_client import init_redis
 from app.routes import register_routes
 from .config import Config
 
 db = SQLAlchemy()
-migrate = Migrate()
 jwt = JWTManager()
 
-def create_app():
+def create_app(role=None):
+    """
+    Creates the app for a process role: "web" or "worker" (default APP_ROLE), which sizes its database pool.
+
+    Workers neither serve the API nor run migrations, so they skip the blueprints and
+    Flask-Migrate, and with them the imports of flask-smorest, marshmallow and alembic.
+    """
+    role = role or Config.APP_ROLE
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(Config)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config, role)
 
     # Set up the logger once and assign it to app.logger
     setup_logger(app)
@@ -24,8 +33,15 @@ def create_app():
 
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
     jwt.init_app(app)
-    register_routes(app)
+    init_redis(app)
+    init_local_cache(app)
+    if role == "web":
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+        register_routes(app)
+    init_metrics(app)
+    init_query_tracking(app)
     
     return app
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import delete, func, select, tuple_, update
+from app import db
+from app.cache import invalidate_user_events
+from app.cold_storage import get_cold_store
+from app.models import EventLog
+from app.partitions import drop_expired_partitions, ensure_partitions
+
+
+def _next_chunk_bound(last_id, batch_size, *criteria):
+    """Return the highest id of the next keyset chunk matching criteria, or None when exhausted."""
+    chunk = (
+        select(EventLog.id)
+        .where(EventLog.id > last_id, *criteria)
+        .order_by(EventLog.id)
+        .limit(batch_size)
+        .subquery()
+    )
+    return db.session.execute(select(func.max(chunk.c.id))).scalar()
+
+
+def _run_in_chunks(build_statement, batch_size, *criteria):
+    """
+    Applies a set-based statement to every row matching criteria, one keyset chunk at a time.
+
+    Each chunk is bounded by (last_id, upper_id] over event_logs.id and committed on its own,
+    so row locks are only held for the duration of a single chunk.
+    Returns the total number of affected rows.
+    """
+    total = 0
+    last_id = 0
+    while True:
+        upper_id = _next_chunk_bound(last_id, batch_size, *criteria)
+        if upper_id is None:
+            break
+
+        statement = build_statement().where(EventLog.id > last_id, EventLog.id <= upper_id, *criteria)
+        result = db.session.execute(statement.execution_options(synchronize_session=False))
+        db.session.commit()
+
+        total += result.rowcount
+        last_id = upper_id
+    return total
+
+
+def archive_events(older_than, batch_size):
+    """Marks active events created before older_than as archived."""
+    return _run_in_chunks(
+        lambda: update(EventLog).values(status="archived", archived_at=datetime.now(timezone.utc)),
+        batch_size,
+        EventLog.status == "active",
+        EventLog.created_at <= older_than,
+    )
+
+
+def move_events_to_cold_storage(older_than, batch_size):
+    """
+    Moves events created before older_than out of event_logs into cold storage segments.
+
+    Rows are read in keyset chunks ordered by (user_id, created_at, id), so each chunk covers
+    few users and days. A chunk is only deleted once its segments are on disk: a crash in
+    between leaves rows in both places rather than losing them. Also sweeps rows archived
+    in-table by the "table" backend. Returns (moved rows, ids of the affected users).
+    """
+    store = get_cold_store(current_app.config)
+    key = tuple_(EventLog.user_id, EventLog.created_at, EventLog.id)
+    criteria = (
+        EventLog.status.in_(("active", "archived")),
+        EventLog.created_at <= older_than,
+        EventLog.user_id.isnot(None),
+    )
+    columns = (EventLog.id, EventLog.trigger_id, EventLog.user_id, EventLog.created_at,
+               EventLog.archived_at, EventLog.response)
+
+    total = 0
+    user_ids = set()
+    last_key = None
+    while True:
+        query = select(*columns).where(*criteria)
+        if last_key is not None:
+            query = query.where(key > last_key)
+        rows = db.session.execute(query.order_by(EventLog.user_id, EventLog.created_at, EventLog.id)
+                                  .limit(batch_size)).all()
+        if not rows:
+            break
+
+        store.write(rows, archived_at=datetime.now(timezone.utc).replace(tzinfo=None))
+        # Delete exactly the rows written, so nothing inserted meanwhile is lost. The created_at
+        # bounds let Postgres skip the partitions the chunk doesn't touch.
+        created = [row.created_at for row in rows]
+        db.session.execute(
+            delete(EventLog)
+            .where(EventLog.id.in_([row.id for row in rows]),
+                   EventLog.created_at >= min(created), EventLog.created_at <= max(created))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        total += len(rows)
+        user_ids.update(row.user_id for row in rows)
+        last_key = (rows[-1].user_id, rows[-1].created_at, rows[-1].id)
+    return total, user_ids
+
+
+def run_archival(batch_size=None):
+    """
+    Runs one archival pass.
+
+    Archives aged active events (to cold storage, or in place with the "table" backend),
+    pre-creates upcoming event_logs partitions and removes partitions past the retention
+    window. Returns a summary of the run, where purged counts every row that left
+    event_logs: moved to cold storage, or past the retention window.
+    """
+    config = current_app.config
+    batch_size = batch_size or config["ARCHIVE_BATCH_SIZE"]
+    now = datetime.now(timezone.utc)
+    older_than = now - timedelta(hours=config["ARCHIVE_AFTER_HOURS"])
+
+    if config["EVENT_ARCHIVE_BACKEND"] == "cold":
+        archived, user_ids = move_events_to_cold_storage(older_than.replace(tzinfo=None), batch_size)
+        purged = archived
+        # Moved rows leave both the active and the archived pages of their users
+        if user_ids:
+            invalidate_user_events(user_ids)
+    else:
+        archived = archive_events(older_than, batch_size)
+        purged = 0
+    created = ensure_partitions()
+    dropped, expired = drop_expired_partitions(now.replace(tzinfo=None) - timedelta(hours=config["PURGE_AFTER_HOURS"]))
+    purged += expired
+
+    return {"archived": archived, "purged": purged, "backend": config["EVENT_ARCHIVE_BACKEND"],
+            "partitions_created": created, "partitions_dropped": dropped}
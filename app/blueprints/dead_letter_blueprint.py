@@ -0,0 +1,81 @@
+from flask import current_app
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.schemas import DeadLetterArgsSchema, DeadLetterReplaySchema, DeadLetterSchema
+from app.retries import get_dead_letter, list_dead_letters, remove_dead_letter, replay_dead_letter
+
+blp = Blueprint("dead_letters", __name__, description="Trigger fires that failed every attempt")
+
+# List Dead Letters
+@blp.route("/dead-letters/")
+class DeadLetterList(MethodView):
+    @jwt_required()
+    @blp.arguments(DeadLetterArgsSchema, location="query")
+    @blp.response(200, DeadLetterSchema(many=True))
+    def get(self, args):
+        """Retrieve the user's dead-lettered fires, most recent first."""
+        try:
+            return list_dead_letters(int(get_jwt_identity()), args["limit"])
+
+        except Exception as e:
+            current_app.logger.error(f"Error retrieving dead letters: {str(e)}")
+            abort(500, message="An error occurred while retrieving the dead letters.")
+
+# View and Discard a Dead Letter
+@blp.route("/dead-letters/<string:dead_letter_id>")
+class DeadLetterResource(MethodView):
+    @jwt_required()
+    @blp.response(200, DeadLetterSchema)
+    def get(self, dead_letter_id):
+        """Retrieve a dead-lettered fire and the outcome of its last attempt."""
+        try:
+            entry = get_dead_letter(int(get_jwt_identity()), dead_letter_id)
+
+        except Exception as e:
+            current_app.logger.error(f"Error retrieving dead letter: {str(e)}")
+            abort(500, message="An error occurred while retrieving the dead letter.")
+
+        if entry is None:
+            abort(404, message="Dead letter not found.")
+        return entry
+
+    @jwt_required()
+    def delete(self, dead_letter_id):
+        """Discard a dead-lettered fire without replaying it."""
+        try:
+            entry = get_dead_letter(int(get_jwt_identity()), dead_letter_id)
+            removed = entry is not None and remove_dead_letter(entry)
+
+        except Exception as e:
+            current_app.logger.error(f"Error discarding dead letter: {str(e)}")
+            abort(500, message="An error occurred while discarding the dead letter.")
+
+        if not removed:
+            abort(404, message="Dead letter not found.")
+        return {"message": "Dead letter discarded successfully"}, 200
+
+# Replay a Dead Letter
+@blp.route("/dead-letters/<string:dead_letter_id>/replay")
+class DeadLetterReplay(MethodView):
+    @jwt_required()
+    @blp.response(202, DeadLetterReplaySchema)
+    def post(self, dead_letter_id):
+        """
+        Fire a dead-lettered fire again, with a fresh set of attempts.
+
+        API fires are resent with their original Idempotency-Key and return an execution to
+        poll; scheduled fires run again for the time they were planned for.
+        """
+        try:
+            entry = get_dead_letter(int(get_jwt_identity()), dead_letter_id)
+            replayed = replay_dead_letter(entry) if entry is not None else None
+
+        except Exception as e:
+            current_app.logger.error(f"Error replaying dead letter: {str(e)}")
+            abort(500, message="An error occurred while replaying the dead letter.")
+
+        if replayed is None:
+            abort(404, message="Dead letter not found.")
+        current_app.logger.info(f"Dead letter {dead_letter_id} replayed for trigger {entry['trigger_id']}")
+        return replayed
@@ -1,77 +1,255 @@
-from flask import current_app, request
+import csv
+import io
+from itertools import islice
+from flask import Response, current_app, stream_with_context
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from flask_smorest.pagination import PaginationMetadataSchema
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from redis import Redis
-from app.models import EventLog, Trigger
-from app.schemas import EventLogSchema
+from sqlalchemy import select
+from app import db
+from app.models import EventLog
+from app.cache import cached_events_page, events_cache_stats, json_response, to_json
+from app.cold_storage import get_cold_store
+from app.recurrence import as_utc
+from app.schemas import EventLogExportArgsSchema, EventLogListArgsSchema, EventLogPageSchema, EventLogSchema
+from app.pagination import estimated_count, keyset_page, parse_cursor, total_count
 from datetime import datetime, timedelta, timezone
-import json
 
 blp = Blueprint("event_log", __name__, description="Event Log Management")
-redis_conn = Redis(host='redis_cache')
+
+EXPORT_COLUMNS = ("id", "trigger_id", "status", "created_at", "archived_at", "response")
+# Fields of EventLogSchema that archived events in cold storage carry
+COLD_EVENT_FIELDS = ("id", "trigger_id", "status", "created_at", "archived_at")
+EXPORT_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def export_record(row):
+    """Turns an exported row into plain JSON types."""
+    record = row._asdict()
+    for column in ("created_at", "archived_at"):
+        if record[column] is not None:
+            record[column] = record[column].isoformat()
+    return record
+
+def ndjson_chunk(records):
+    return b"".join(to_json(record) + b"\n" for record in records)
+
+def csv_chunk(records, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for record in records:
+        record["response"] = to_json(record["response"]).decode() if record["response"] is not None else ""
+        writer.writerow(record[column] for column in EXPORT_COLUMNS)
+    return buffer.getvalue().encode()
 
 @blp.route("/events/")
 class EventLogList(MethodView):
     @jwt_required()
-    @blp.response(200, EventLogSchema(many=True))
-    def get(self):
-        """Fetch event logs with pagination."""
+    @blp.arguments(EventLogListArgsSchema, location="query", error_status_code=400)
+    @blp.response(200, EventLogPageSchema)
+    def get(self, args):
+        """
+        Fetch event logs with pagination.
+
+        Pass `after=<created_at>,<id>` (empty for the first page) to switch to keyset pagination,
+        and `count=exact|estimated|none` to choose how the total is computed.
+        """
+        user_id = int(get_jwt_identity())
+        status = args["status"]
+        page = args["page"]
+        per_page = args["per_page"]
+        keyset = "after" in args
+        after = args.get("after", "")
+        count_mode = args.get("count", "none" if keyset else "exact")
+
         try:
-            user_id = get_jwt_identity()
-            status = request.args.get("status", "active")
-            page = int(request.args.get("page", 1))
-            per_page = int(request.args.get("per_page", 10))
+            cursor = parse_cursor(after)
+        except ValueError:
+            abort(400, message="Invalid cursor. Use 'after=<created_at>,<id>'.")
 
-            # Generate a cache key
-            cache_key = f"events:{user_id}:{status}:page:{page}"
+        def build_cold_page():
+            store = get_cold_store(current_app.config)
+            # Segments hold naive UTC timestamps
+            cold_cursor = (as_utc(cursor[0]).replace(tzinfo=None), cursor[1]) if cursor else None
+            records, has_more = store.page(user_id, per_page, page=1 if keyset else page, cursor=cold_cursor)
+            events = [{field: record[field] for field in COLD_EVENT_FIELDS} for record in records]
+            total = store.count(user_id) if count_mode != "none" else None
 
-            # Check if the data is cached
-            cached_data = redis_conn.get(cache_key)
-            if cached_data:
-                current_app.logger.info("Returning cached event logs.")
-                response = json.loads(cached_data)
-                return response, 200
+            if keyset:
+                return {
+                    "events": events,
+                    "pagination": {
+                        "total": total,
+                        "per_page": per_page,
+                        "after": after or None,
+                        "next_after": f"{records[-1]['created_at']},{records[-1]['id']}" if has_more else None,
+                    }
+                }
+
+            pages = -(-total // per_page) if total is not None else None
+            return {
+                "events": events,
+                "pagination": {
+                    "total": total,
+                    "total_pages": pages,
+                    "first_page": 1,
+                    "last_page": pages,
+                    "page": page,
+                    "previous_page": page - 1 if page > 1 else None,
+                    "next_page": page + 1 if has_more else None,
+                }
+            }
+
+        def build_page():
+            # Archived events live in cold storage unless they are kept in-table
+            if status == "archived" and current_app.config["EVENT_ARCHIVE_BACKEND"] == "cold":
+                return build_cold_page()
 
             if status == "active":
                 two_hours_ago = datetime.now(timezone.utc) - timedelta(hours=2)
-                events = EventLog.query.join(Trigger).filter(
-                    Trigger.user_id == user_id,
+                query = EventLog.query.filter(
+                    EventLog.user_id == user_id,
                     EventLog.status == "active",
                     EventLog.created_at >= two_hours_ago
-                ).paginate(page=page, per_page=per_page, error_out=False)
-            elif status == "archived":
-                events = EventLog.query.join(Trigger).filter(
-                    Trigger.user_id == user_id,
-                    EventLog.status == "archived"
-                ).paginate(page=page, per_page=per_page, error_out=False)
+                )
             else:
-                abort(400, message="Invalid status. Use 'active' or 'archived'.")
+                # Bound created_at by the retention window so only live partitions are scanned
+                retention_start = datetime.now(timezone.utc) - timedelta(hours=current_app.config["PURGE_AFTER_HOURS"])
+                query = EventLog.query.filter(
+                    EventLog.user_id == user_id,
+                    EventLog.status == "archived",
+                    EventLog.created_at >= retention_start
+                )
 
             # Serialize the data
             event_schema = EventLogSchema(many=True)
-            result = event_schema.dump(events.items)
+
+            if keyset:
+                items, next_after = keyset_page(query, EventLog, cursor, per_page)
+                return {
+                    "events": event_schema.dump(items),
+                    "pagination": {
+                        "total": total_count(query, count_mode),
+                        "per_page": per_page,
+                        "after": after or None,
+                        "next_after": next_after,
+                    }
+                }
+
+            events = query.order_by(EventLog.created_at.desc(), EventLog.id.desc()).paginate(
+                page=page, per_page=per_page, error_out=False, count=count_mode == "exact"
+            )
+            if count_mode == "estimated":
+                events.total = estimated_count(query)
+
+            # Without a total, assume another page exists whenever this one is full
+            has_next = events.has_next if events.total is not None else len(events.items) == per_page
 
             # Add pagination metadata
-            response = {
-                "events": result,
+            return {
+                "events": event_schema.dump(events.items),
                 "pagination": {
                     "total": events.total,
-                    "total_pages": events.pages,
+                    "total_pages": events.pages if events.total is not None else None,
                     "first_page": 1,
-                    "last_page": events.pages,
+                    "last_page": events.pages if events.total is not None else None,
                     "page": events.page,
                     "previous_page": events.prev_num if events.has_prev else None,
-                    "next_page": events.next_num if events.has_next else None,
+                    "next_page": events.page + 1 if has_next else None,
                 }
             }
-    
-            # Cache the data for 10 minutes
-            redis_conn.set(cache_key, json.dumps(response), ex=600)
 
-            return response, 200
+        try:
+            # Every parameter that shapes the page is part of the cache key
+            params = {"status": status, "per_page": per_page, "count": count_mode}
+            params.update({"after": after} if keyset else {"page": page})
+            return json_response(cached_events_page(user_id, params, build_page))
 
         except Exception as e:
             current_app.logger.error(f"Error fetching event logs: {str(e)}")
-            abort(500, message="An error occurred while fetching the event logs.")
\ No newline at end of file
+            abort(500, message="An error occurred while fetching the event logs.")
+
+
+@blp.route("/events/cache/stats")
+class EventLogCacheStats(MethodView):
+    @jwt_required()
+    def get(self):
+        """Hit, miss and invalidation counters for the event log cache."""
+        try:
+            return events_cache_stats(), 200
+        except Exception as e:
+            current_app.logger.error(f"Error fetching cache stats: {str(e)}")
+            abort(500, message="An error occurred while fetching the cache stats.")
+
+
+
+@blp.route("/events/export")
+class EventLogExport(MethodView):
+    @jwt_required()
+    @blp.arguments(EventLogExportArgsSchema, location="query")
+    def get(self, args):
+        """
+        Stream every matching event log as NDJSON or CSV, oldest first.
+
+        Rows are read through a server-side cursor and written out as they arrive, so memory
+        use stays flat however large the export is. `since`/`until` bound created_at.
+        Events in cold storage come first, as they are older than anything left in Postgres.
+        """
+        user_id = int(get_jwt_identity())
+        batch_size = current_app.config["EVENT_EXPORT_BATCH_SIZE"]
+        include_cold = current_app.config["EVENT_ARCHIVE_BACKEND"] == "cold" and args.get("status") != "active"
+
+        statement = select(*(getattr(EventLog, column) for column in EXPORT_COLUMNS)).where(
+            EventLog.user_id == user_id)
+        if "status" in args:
+            statement = statement.where(EventLog.status == args["status"])
+        if "trigger_id" in args:
+            statement = statement.where(EventLog.trigger_id == args["trigger_id"])
+        if "since" in args:
+            statement = statement.where(EventLog.created_at >= as_utc(args["since"]))
+        if "until" in args:
+            statement = statement.where(EventLog.created_at < as_utc(args["until"]))
+        statement = statement.order_by(EventLog.created_at, EventLog.id).execution_options(yield_per=batch_size)
+
+        export_format = args["format"]
+
+        def cold_batches():
+            since, until = (as_utc(args[name]).replace(tzinfo=None) if name in args else None
+                            for name in ("since", "until"))
+            records = get_cold_store(current_app.config).iter_records(user_id, since=since, until=until)
+            if "trigger_id" in args:
+                records = (record for record in records if record["trigger_id"] == args["trigger_id"])
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    return
+                yield batch
+
+        def batches():
+            if include_cold:
+                yield from cold_batches()
+            for rows in db.session.execute(statement).partitions():
+                yield [export_record(row) for row in rows]
+
+        def generate():
+            exported = 0
+            try:
+                if export_format == "csv":
+                    yield csv_chunk([], header=True)
+                for records in batches():
+                    yield ndjson_chunk(records) if export_format == "ndjson" else csv_chunk(records)
+                    exported += len(records)
+                current_app.logger.info(f"Exported {exported} event logs for user {user_id}.")
+
+            except Exception as e:
+                # Headers are already sent, so all we can do is cut the stream short
+                current_app.logger.error(f"Error exporting event logs after {exported} rows: {str(e)}")
+                raise
+            finally:
+                db.session.rollback()
+
+        return Response(stream_with_context(generate()), mimetype=EXPORT_CONTENT_TYPES[export_format], headers={
+            "Content-Disposition": f"attachment; filename=events.{export_format}",
+        })
@@ -1,44 +1,125 @@
-from flask import current_app, request
+from flask import current_app, jsonify, request, url_for
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import delete, insert, select
 from sqlalchemy.exc import SQLAlchemyError
-from app.models import Trigger
+from app.models import EventLog, Trigger
 from app import db
-from app.schemas import TriggerCreateSchema, TriggerSchema, TriggerUpdateSchema, TriggerTestSchema
+from app.schemas import (TriggerAcceptedSchema, TriggerBulkDeleteSchema, TriggerBulkResultSchema,
+                         TriggerBulkUpdateSchema, TriggerCreateSchema, TriggerExecutionSchema, TriggerSchema,
+                         TriggerUpdateSchema, TriggerTestSchema)
 from datetime import datetime, timedelta, timezone
 
-from app.tasks import execute_api_trigger, execute_scheduled_trigger, execute_test_scheduled_trigger, trigger_queue
+from app.cache import invalidate_trigger, json_response, to_json
+from app.executions import enqueue_api_fire, get_execution
+from app.local_cache import local_cached, publish_invalidation
+from app.recurrence import first_fire_time
+from app.scheduler import schedule_trigger, schedule_triggers, unschedule_trigger
+from app.redis_client import get_queue, get_redis
 
 blp = Blueprint("triggers", __name__, description="Trigger Management")
 
+# Columns written by a bulk create; every row carries all of them so they share one INSERT
+BULK_CREATE_COLUMNS = ("type", "schedule_time", "interval", "recurrence", "catch_up_policy", "max_attempts",
+                       "retry_backoff_ms", "api_endpoint", "api_payload", "user_id", "next_fire_at")
+
+def wants_async_response():
+    """True when the client sent `Prefer: respond-async` and accepts 202 with an execution handle."""
+    return "respond-async" in request.headers.get("Prefer", "")
+
+def plan_first_fire(trigger):
+    """Sets next_fire_at on a scheduled trigger that has a schedule_time or interval; call before committing."""
+    if trigger.type == "scheduled" and (trigger.schedule_time or trigger.interval):
+        trigger.next_fire_at = first_fire_time(trigger).replace(tzinfo=None)
+
+def replan_fire(trigger, data):
+    """
+    Updates next_fire_at for the changes in data; call before committing. Returns True when
+    the scheduler index has to follow: schedule next_fire_at, or unschedule if it is None.
+    """
+    if trigger.type != "scheduled" or not (trigger.schedule_time or trigger.interval):
+        # No longer fired on a schedule, so drop the pending fire as DELETE does
+        pending = trigger.next_fire_at is not None
+        trigger.next_fire_at = None
+        return pending
+    if "schedule_time" in data or "interval" in data:
+        # Move the pending fire to the new time
+        plan_first_fire(trigger)
+        return True
+    if data.get("recurrence") and trigger.next_fire_at is None:
+        # A one-off trigger that already fired starts recurring
+        plan_first_fire(trigger)
+        return True
+    return False
+
+def new_trigger_error(trigger):
+    """Returns why a trigger can't be created, or None if it can."""
+    if trigger.type == "scheduled":
+        if not (trigger.schedule_time or trigger.interval):
+            return "For scheduled triggers, provide either schedule_time or interval."
+    elif trigger.type == "api":
+        if not trigger.api_endpoint:
+            return "For API triggers, provide api_endpoint."
+    else:
+        return "Invalid trigger type"
+    return None
+
+def check_bulk_size(items):
+    limit = current_app.config["TRIGGER_BULK_MAX_ITEMS"]
+    if len(items) > limit:
+        abort(400, message=f"Too many items, send at most {limit} per request.")
+
+def bulk_response(results):
+    """Wraps per-item results, listed in request order, with success and failure counts."""
+    failed = sum(1 for result in results if result["status"] not in ("created", "updated", "deleted"))
+    return {"succeeded": len(results) - failed, "failed": failed, "results": results}
+
+def accepted_response(trigger, execution_id):
+    """Builds the 202 Accepted response pointing at the execution to poll."""
+    body = TriggerAcceptedSchema().dump({
+        "trigger": trigger,
+        "execution_id": execution_id,
+        "status_url": url_for("triggers.TriggerExecutionResource", execution_id=execution_id),
+    })
+    return jsonify(body), 202, {"Location": body["status_url"]}
+
 # Create a Trigger
 @blp.route("/triggers/")
 class TriggerList(MethodView):
     @jwt_required()
     @blp.arguments(TriggerCreateSchema)
     @blp.response(201, TriggerSchema)
+    @blp.alt_response(202, schema=TriggerAcceptedSchema)
     def post(self, data):
-        """Create a new trigger (Scheduled or API-based)."""
+        """
+        Create a new trigger (Scheduled or API-based).
+
+        API triggers are fired in the background. Send `Prefer: respond-async` to get
+        202 Accepted with an execution handle to poll instead of the plain trigger.
+        """
         try:
-            user_id = get_jwt_identity()
+            user_id = int(get_jwt_identity())
             trigger = Trigger(user_id=user_id, **data)
+            plan_first_fire(trigger)
 
             db.session.add(trigger)
             db.session.commit()
+            invalidate_trigger(trigger.user_id, trigger.id)
             
             if trigger.type == "scheduled":
-                if trigger.schedule_time:
-                    trigger_queue.enqueue_at(trigger.schedule_time, execute_scheduled_trigger, trigger.id, trigger.recurrence)
-                    current_app.logger.info(f"Trigger scheduled for {trigger.schedule_time}")
-                elif trigger.interval:
-                    execution_time = datetime.now(timezone.utc) + timedelta(minutes=trigger.interval)
-                    trigger_queue.enqueue_at(execution_time, execute_scheduled_trigger, trigger.id, trigger.recurrence)
-                    current_app.logger.info(f"Trigger scheduled at Interval {trigger.interval} minutes.")
+                if trigger.next_fire_at:
+                    schedule_trigger(get_redis(), trigger.id, trigger.next_fire_at)
+                    current_app.logger.info(f"Trigger scheduled for {trigger.next_fire_at}")
                 else:
                     abort(400, message="For scheduled triggers, provide either schedule_time or interval.")
             elif trigger.type == "api":
-                execute_api_trigger(trigger.id, trigger.api_endpoint, trigger.api_payload)
+                execution_id = enqueue_api_fire(trigger.id, trigger.user_id, trigger.api_endpoint, trigger.api_payload,
+                                                max_attempts=trigger.max_attempts,
+                                                retry_backoff_ms=trigger.retry_backoff_ms)
+                if wants_async_response():
+                    return accepted_response(trigger, execution_id)
+                return trigger, 201, {"X-Execution-Id": execution_id}
             
             return trigger
         
@@ -53,13 +134,20 @@ class TriggerList(MethodView):
     def get(self):
         """Retrieve all triggers created by the user."""
         try:
-            user_id = get_jwt_identity()
-            return Trigger.query.filter_by(user_id=user_id).all()
+            user_id = int(get_jwt_identity())
+            body = local_cached(f"triggers:{user_id}", f"triggers:{user_id}", lambda: to_json(
+                TriggerSchema(many=True).dump(Trigger.query.filter_by(user_id=user_id).all())))
+            return json_response(body)
         
         except Exception as e:
             current_app.logger.error(f"Error retrieving triggers: {str(e)}")
             abort(500, message="An error occurred while retrieving the triggers.")
 
+def trigger_body(user_id, trigger_id):
+    """Serialized trigger owned by user_id, or None when there is no such trigger."""
+    trigger = Trigger.query.filter_by(id=trigger_id, user_id=user_id).first()
+    return to_json(TriggerSchema().dump(trigger)) if trigger else None
+
 # View, Update, and Delete a Trigger
 @blp.route("/triggers/<int:trigger_id>")
 class TriggerResource(MethodView):
@@ -68,13 +156,18 @@ class TriggerResource(MethodView):
     def get(self, trigger_id):
         """Retrieve details of a specific trigger."""
         try:
-            trigger = Trigger.query.get_or_404(trigger_id)
-            return trigger
-        
+            user_id = int(get_jwt_identity())
+            body = local_cached(f"trigger:{user_id}:{trigger_id}", f"trigger:{trigger_id}",
+                                lambda: trigger_body(user_id, trigger_id))
+
         except Exception as e:
             current_app.logger.error(f"Error retrieving trigger: {str(e)}")
             abort(500, message="An error occurred while retrieving the trigger.")
 
+        if body is None:
+            abort(404, message="Trigger not found.")
+        return json_response(body)
+
     @jwt_required()
     @blp.arguments(TriggerUpdateSchema)
     @blp.response(200, TriggerSchema)
@@ -84,8 +177,17 @@ class TriggerResource(MethodView):
             trigger = Trigger.query.get_or_404(trigger_id)
             for key, value in data.items():
                 setattr(trigger, key, value)
+            replanned = replan_fire(trigger, data)
 
             db.session.commit()
+
+            pipe = get_redis().pipeline(transaction=False)
+            invalidate_trigger(trigger.user_id, trigger.id, pipe=pipe)
+            if replanned and trigger.next_fire_at:
+                schedule_trigger(get_redis(), trigger.id, trigger.next_fire_at, pipe=pipe)
+            elif replanned:
+                unschedule_trigger(get_redis(), trigger.id, pipe=pipe)
+            pipe.execute()
             return trigger
         
         except Exception as e:
@@ -97,34 +199,187 @@ class TriggerResource(MethodView):
         """Delete a trigger (but keep event logs)."""
         try:
             trigger = Trigger.query.get_or_404(trigger_id)
+            user_id = trigger.user_id
             db.session.delete(trigger)
             db.session.commit()
+            unschedule_trigger(get_redis(), trigger_id)
+            invalidate_trigger(user_id, trigger_id)
             return {"message": "Trigger deleted successfully"}, 200
         
         except Exception as e:
             current_app.logger.error(f"Error deleting trigger: {str(e)}")
             abort(500, message="An error occurred while deleting the trigger.")
 
+# Create, Update and Delete Triggers in Bulk
+@blp.route("/triggers/bulk")
+class TriggerBulk(MethodView):
+    @jwt_required()
+    @blp.arguments(TriggerCreateSchema(many=True))
+    @blp.response(200, TriggerBulkResultSchema)
+    def post(self, items):
+        """
+        Create many triggers at once.
+
+        Valid items are inserted with one multi-row INSERT and scheduled (or, for API
+        triggers, queued for firing) in one Redis pipeline. Each item gets a result.
+        """
+        check_bulk_size(items)
+        try:
+            user_id = int(get_jwt_identity())
+            results, rows = [], []
+            for index, data in enumerate(items):
+                trigger = Trigger(user_id=user_id, **data)
+                error = new_trigger_error(trigger)
+                if error:
+                    results.append({"index": index, "id": None, "status": "invalid", "message": error})
+                    continue
+                plan_first_fire(trigger)
+                rows.append({column: getattr(trigger, column) for column in BULK_CREATE_COLUMNS})
+                results.append({"index": index, "status": "created"})
+
+            if rows:
+                ids = db.session.scalars(
+                    insert(Trigger).returning(Trigger.id, sort_by_parameter_order=True), rows
+                ).all()
+                db.session.commit()
+
+                pipe = get_redis().pipeline(transaction=False)
+                created = [result for result in results if result["status"] == "created"]
+                fire_times = {}
+                for result, row, trigger_id in zip(created, rows, ids):
+                    result["id"] = trigger_id
+                    if row["type"] == "scheduled":
+                        fire_times[trigger_id] = row["next_fire_at"]
+                    else:
+                        result["execution_id"] = enqueue_api_fire(
+                            trigger_id, user_id, row["api_endpoint"], row["api_payload"], pipe=pipe,
+                            max_attempts=row["max_attempts"], retry_backoff_ms=row["retry_backoff_ms"])
+                schedule_triggers(get_redis(), fire_times, pipe=pipe)
+                publish_invalidation(f"triggers:{user_id}", pipe=pipe)
+                pipe.execute()
+
+            current_app.logger.info(f"Bulk created {len(rows)} of {len(items)} triggers for user {user_id}")
+            return bulk_response(results)
+
+        except Exception as e:
+            current_app.logger.error(f"Error saving triggers: {str(e)}")
+            abort(500, message="An error occurred while saving the triggers.")
+
+    @jwt_required()
+    @blp.arguments(TriggerBulkUpdateSchema(many=True))
+    @blp.response(200, TriggerBulkResultSchema)
+    def put(self, items):
+        """Update many of the user's triggers at once, in one transaction."""
+        check_bulk_size(items)
+        try:
+            user_id = int(get_jwt_identity())
+            triggers = {trigger.id: trigger for trigger in Trigger.query.filter(
+                Trigger.id.in_({item["id"] for item in items}), Trigger.user_id == user_id)}
+
+            results, rescheduled, unscheduled = [], {}, []
+            for index, data in enumerate(items):
+                trigger = triggers.get(data["id"])
+                if trigger is None:
+                    results.append({"index": index, "id": data["id"], "status": "not_found",
+                                    "message": "Trigger not found."})
+                    continue
+                for key, value in data.items():
+                    if key != "id":
+                        setattr(trigger, key, value)
+                if replan_fire(trigger, data):
+                    if trigger.next_fire_at:
+                        rescheduled[trigger.id] = trigger.next_fire_at
+                    else:
+                        unscheduled.append(trigger.id)
+                results.append({"index": index, "id": trigger.id, "status": "updated"})
+
+            db.session.commit()
+
+            pipe = get_redis().pipeline(transaction=False)
+            schedule_triggers(get_redis(), rescheduled, pipe=pipe)
+            for trigger_id in unscheduled:
+                unschedule_trigger(get_redis(), trigger_id, pipe=pipe)
+            publish_invalidation(f"triggers:{user_id}", *(f"trigger:{trigger_id}" for trigger_id in triggers),
+                                 pipe=pipe)
+            pipe.execute()
+
+            return bulk_response(results)
+
+        except Exception as e:
+            current_app.logger.error(f"Error updating triggers: {str(e)}")
+            abort(500, message="An error occurred while updating the triggers.")
+
+    @jwt_required()
+    @blp.arguments(TriggerBulkDeleteSchema)
+    @blp.response(200, TriggerBulkResultSchema)
+    def delete(self, data):
+        """Delete many of the user's triggers at once. Triggers that have event logs are kept."""
+        ids = data["ids"]
+        check_bulk_size(ids)
+        try:
+            user_id = int(get_jwt_identity())
+            owned = set(db.session.scalars(
+                select(Trigger.id).where(Trigger.id.in_(ids), Trigger.user_id == user_id)))
+            # Event logs reference their trigger, so a trigger with logs can't be deleted
+            logged = set(db.session.scalars(select(Trigger.id).where(
+                Trigger.id.in_(owned), select(EventLog.id).where(EventLog.trigger_id == Trigger.id).exists())))
+            deleted = owned - logged
+            if deleted:
+                db.session.execute(delete(Trigger).where(Trigger.id.in_(deleted)))
+            db.session.commit()
+
+            pipe = get_redis().pipeline(transaction=False)
+            for trigger_id in deleted:
+                unschedule_trigger(get_redis(), trigger_id, pipe=pipe)
+            publish_invalidation(f"triggers:{user_id}", *(f"trigger:{trigger_id}" for trigger_id in deleted),
+                                 pipe=pipe)
+            pipe.execute()
+
+            results = []
+            for index, trigger_id in enumerate(ids):
+                if trigger_id in deleted:
+                    results.append({"index": index, "id": trigger_id, "status": "deleted"})
+                elif trigger_id in logged:
+                    results.append({"index": index, "id": trigger_id, "status": "conflict",
+                                    "message": "Trigger has event logs."})
+                else:
+                    results.append({"index": index, "id": trigger_id, "status": "not_found",
+                                    "message": "Trigger not found."})
+            return bulk_response(results)
+
+        except Exception as e:
+            current_app.logger.error(f"Error deleting triggers: {str(e)}")
+            abort(500, message="An error occurred while deleting the triggers.")
+
 # Test a Trigger (Manually Fire Once)
 @blp.route("/triggers/test/")
 class TriggerTest(MethodView):
     @jwt_required()
     @blp.arguments(TriggerTestSchema)
     @blp.response(200, TriggerSchema)
+    @blp.alt_response(202, schema=TriggerAcceptedSchema)
     def post(self, data):
-        """Manually test a trigger (Scheduled or API) without saving it."""
+        """
+        Manually test a trigger (Scheduled or API) without saving it.
+
+        API tests run in the background; `Prefer: respond-async` returns 202 with an execution handle.
+        """
         try:
-            user_id = get_jwt_identity()
+            user_id = int(get_jwt_identity())
             trigger = Trigger(user_id=user_id, **data)
 
             # not saving the trigger to the database
             # but we can still log the event            
             if trigger.type == "scheduled":
                 execution_time = datetime.now(timezone.utc) + timedelta(minutes=trigger.interval)
-                trigger_queue.enqueue_at(execution_time, execute_test_scheduled_trigger, trigger.id, trigger.recurrence)
+                # By name, so the API doesn't import the worker-side task code
+                get_queue('trigger').enqueue_at(execution_time, 'app.tasks.execute_test_scheduled_trigger', trigger.id)
 
             elif trigger.type == "api":
-                execute_api_trigger(trigger.id, trigger.api_endpoint, trigger.api_payload)
+                execution_id = enqueue_api_fire(None, user_id, trigger.api_endpoint, trigger.api_payload, status='test')
+                if wants_async_response():
+                    return accepted_response(trigger, execution_id)
+                return trigger, 200, {"X-Execution-Id": execution_id}
 
             else:
                 abort(400, message="Invalid trigger type")
@@ -134,4 +389,21 @@ class TriggerTest(MethodView):
         except Exception as e:
             current_app.logger.error(f"Error saving trigger: {str(e)}")
             abort(500, message="An error occurred while saving the trigger.")
-        
+
+# Poll an asynchronous API trigger execution
+@blp.route("/executions/<string:execution_id>")
+class TriggerExecutionResource(MethodView):
+    @jwt_required()
+    @blp.response(200, TriggerExecutionSchema)
+    def get(self, execution_id):
+        """Retrieve the status and result of a trigger execution."""
+        try:
+            execution = get_execution(execution_id)
+
+        except Exception as e:
+            current_app.logger.error(f"Error retrieving execution: {str(e)}")
+            abort(500, message="An error occurred while retrieving the execution.")
+
+        if execution is None or execution["user_id"] != int(get_jwt_identity()):
+            abort(404, message="Execution not found.")
+        return execution
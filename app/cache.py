@@ -0,0 +1,254 @@
+import json
+import math
+import random
+import time
+import uuid
+import zlib
+from urllib.parse import urlencode
+from flask import current_app
+from app.local_cache import get_local_cache, local_cached, publish_invalidation
+from app.metrics import CACHE_REQUESTS
+from app.redis_client import get_redis
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up, fall back to the standard library
+    orjson = None
+
+# Cached /events/ pages live under events:{user_id}:v{version}:..., so bumping a user's
+# version makes every cached page of theirs unreachable in O(1); stale pages simply expire.
+EVENTS_VERSION_KEY = "events:version:{}"
+# Set for the length of a coalescing window after a version bump
+EVENTS_DIRTY_KEY = "events:dirty:{}"
+EVENTS_STATS_KEY = "cache:stats:events"
+# How often a request waiting on another request's rebuild re-checks the cache
+LOCK_POLL_INTERVAL = 0.05
+
+# Reads a page in one round trip: resolves the user's version, fetches the versioned key,
+# counts the hit or miss, and reports the TTLs of the user's coalescing window and of the page.
+# The page key is derived inside the script, so this assumes a single (non-cluster) Redis.
+READ_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+local page_key = ARGV[1] .. ':v' .. version .. ':' .. ARGV[2]
+local data = redis.call('GET', page_key)
+redis.call('HINCRBY', KEYS[3], data and 'hits' or 'misses', 1)
+return {version, data, redis.call('PTTL', KEYS[2]), redis.call('PTTL', page_key)}
+"""
+
+# Bumps a user's version, unless it was already bumped within the coalescing window
+INVALIDATE_SCRIPT = """
+redis.call('HINCRBY', KEYS[3], 'invalidations', 1)
+if tonumber(ARGV[1]) > 0 and not redis.call('SET', KEYS[2], 1, 'NX', 'PX', ARGV[1]) then
+    redis.call('HINCRBY', KEYS[3], 'coalesced', 1)
+    return 0
+end
+return redis.call('INCR', KEYS[1])
+"""
+
+# Releases a rebuild lock only if it is still ours
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_scripts = {}
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = get_redis().register_script(source)
+    return _scripts[name]
+
+
+def _page_key(user_id, version, suffix):
+    return f"events:{user_id}:v{version}:{suffix}"
+
+
+def events_cache_suffix(params):
+    """Builds the part of a page key after the version from every query parameter that shapes the page."""
+    return urlencode(sorted((name, "" if value is None else value) for name, value in params.items()))
+
+
+def to_json(response):
+    """Serializes a response body to JSON bytes, with orjson when it is installed."""
+    return orjson.dumps(response) if orjson else json.dumps(response).encode()
+
+
+def json_response(body):
+    """Wraps already serialized JSON in a response, skipping the response schema."""
+    return current_app.response_class(body, mimetype="application/json")
+
+
+def serialize(body, build_ms):
+    """
+    Encodes a JSON page as b"<build_ms>:<format>:<body>".
+
+    The body is zlib-compressed when it reaches EVENTS_CACHE_COMPRESS_MIN_BYTES.
+    build_ms is kept for probabilistic early refresh.
+    """
+    min_bytes = current_app.config["EVENTS_CACHE_COMPRESS_MIN_BYTES"]
+    if min_bytes and len(body) >= min_bytes:
+        return b"%d:z:" % build_ms + zlib.compress(body, 1)
+    return b"%d:j:" % build_ms + body
+
+
+def deserialize(data):
+    """Returns (body, build_ms) from a value written by serialize."""
+    build_ms, encoding, body = data.split(b":", 2)
+    if encoding == b"z":
+        body = zlib.decompress(body)
+    return body, int(build_ms)
+
+
+def read_events_cache(user_id, suffix):
+    """
+    Looks up a cached /events/ page for a user.
+
+    Returns (data, version, window_ms, ttl_ms): data is None on a miss, version must be passed
+    back to write_events_cache, window_ms is the time left in the user's coalescing window and
+    ttl_ms the time left before the page expires (both negative when not set).
+    """
+    version, data, window_ms, ttl_ms = _script("read", READ_SCRIPT)(
+        keys=[EVENTS_VERSION_KEY.format(user_id), EVENTS_DIRTY_KEY.format(user_id), EVENTS_STATS_KEY],
+        args=[f"events:{user_id}", suffix],
+    )
+    return data, int(version), window_ms, ttl_ms
+
+
+def write_events_cache(user_id, version, suffix, data, window_ms, pipe=None):
+    """Caches a page under the version it was read with."""
+    ttl_ms = current_app.config["EVENTS_CACHE_TTL"] * 1000
+    # Invalidations inside an open window are coalesced, so don't let this page outlive the window
+    if window_ms > 0:
+        ttl_ms = min(ttl_ms, window_ms)
+    (pipe or get_redis()).set(_page_key(user_id, version, suffix), data, px=ttl_ms)
+
+
+def _should_refresh_early(build_ms, ttl_ms):
+    """
+    Probabilistic early expiration (XFetch): the closer a page is to expiring and the slower it
+    was to build, the likelier a reader is to rebuild it ahead of time, so it rarely expires under load.
+    """
+    beta = current_app.config["EVENTS_CACHE_EARLY_REFRESH_BETA"]
+    if not beta or ttl_ms < 0:
+        return False
+    return -build_ms * beta * math.log(1.0 - random.random()) >= ttl_ms
+
+
+def cached_events_page(user_id, params, build):
+    """
+    Read-through cache for /events/ pages, returning the page as JSON bytes.
+
+    Pages are looked up in this process's local cache first, then in Redis, and only then
+    built by calling build(), which returns the response dict.
+    """
+    suffix = events_cache_suffix(params)
+    return local_cached(f"events:{user_id}:{suffix}", f"events:{user_id}",
+                        lambda: _redis_events_page(user_id, suffix, build))
+
+
+def _redis_events_page(user_id, suffix, build):
+    """
+    Returns a page from Redis or builds it. Only one request per page rebuilds at a time
+    (a SET NX lock); the others wait briefly for its result instead of all hitting the
+    database, and fall back to building it themselves if it never comes.
+    """
+    redis_conn = get_redis()
+    started = time.perf_counter()
+
+    data, version, window_ms, ttl_ms = read_events_cache(user_id, suffix)
+    CACHE_REQUESTS.labels("redis", "hit" if data is not None else "miss").inc()
+    if data is not None:
+        body, build_ms = deserialize(data)
+        if not _should_refresh_early(build_ms, ttl_ms):
+            current_app.logger.info(
+                f"Returning cached event logs ({(time.perf_counter() - started) * 1000:.2f} ms).")
+            return body
+        stale = body
+    else:
+        stale = None
+
+    lock_key = _page_key(user_id, version, suffix) + ":lock"
+    lock_timeout_ms = current_app.config["EVENTS_CACHE_LOCK_TIMEOUT_MS"]
+    token = uuid.uuid4().hex
+    locked = redis_conn.set(lock_key, token, nx=True, px=lock_timeout_ms)
+
+    if not locked:
+        # Someone else is already refreshing this page: serve what we have, or wait for theirs
+        if stale is not None:
+            return stale
+        deadline = time.monotonic() + lock_timeout_ms / 1000
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            data = redis_conn.get(_page_key(user_id, version, suffix))
+            if data is not None:
+                redis_conn.hincrby(EVENTS_STATS_KEY, "lock_waits", 1)
+                return deserialize(data)[0]
+
+    build_started = time.perf_counter()
+    try:
+        body = to_json(build())
+        build_ms = (time.perf_counter() - build_started) * 1000
+
+        pipe = redis_conn.pipeline(transaction=False)
+        if locked:
+            write_events_cache(user_id, version, suffix, serialize(body, build_ms), window_ms, pipe=pipe)
+        if stale is not None:
+            pipe.hincrby(EVENTS_STATS_KEY, "early_refreshes", 1)
+        pipe.hincrby(EVENTS_STATS_KEY, "builds", 1)
+        pipe.hincrbyfloat(EVENTS_STATS_KEY, "build_ms", build_ms)
+        pipe.execute()
+    finally:
+        if locked:
+            _script("release", RELEASE_SCRIPT)(keys=[lock_key], args=[token])
+
+    current_app.logger.info(f"Built event log page in {build_ms:.2f} ms.")
+    return body
+
+
+def invalidate_user_events(user_ids):
+    """
+    Invalidates the cached /events/ pages of every given user in one round trip,
+    in Redis and in every process's local cache.
+
+    With EVENTS_CACHE_COALESCE_MS set, only the first invalidation per user in each window
+    bumps the version; pages cached during the window expire when it closes.
+    """
+    script = _script("invalidate", INVALIDATE_SCRIPT)
+    window_ms = current_app.config["EVENTS_CACHE_COALESCE_MS"]
+
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id in set(user_ids):
+        script(keys=[EVENTS_VERSION_KEY.format(user_id), EVENTS_DIRTY_KEY.format(user_id), EVENTS_STATS_KEY],
+               args=[window_ms], client=pipe)
+        publish_invalidation(f"events:{user_id}", pipe=pipe)
+    pipe.execute()
+
+
+def events_cache_stats():
+    """
+    Returns the /events/ cache counters and timings.
+
+    db_ms_saved estimates the database time avoided by Redis hits: hits times the average page build time.
+    """
+    raw = {name.decode(): value for name, value in get_redis().hgetall(EVENTS_STATS_KEY).items()}
+    counters = ("hits", "misses", "invalidations", "coalesced", "builds", "early_refreshes", "lock_waits")
+    stats = {name: int(raw.get(name, 0)) for name in counters}
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+    build_ms = float(raw.get("build_ms", 0))
+    stats["avg_build_ms"] = round(build_ms / stats["builds"], 2) if stats["builds"] else None
+    stats["db_ms_saved"] = round(stats["hits"] * stats["avg_build_ms"], 2) if stats["builds"] else None
+
+    # The local tier is per process, so this only covers the process serving the request
+    local_cache = get_local_cache()
+    stats["local"] = local_cache.stats() if local_cache else None
+    return stats
+
+
+def invalidate_trigger(user_id, trigger_id, pipe=None):
+    """Drops a trigger and its owner's trigger list from every process's local cache."""
+    publish_invalidation(f"triggers:{user_id}", f"trigger:{trigger_id}", pipe=pipe)
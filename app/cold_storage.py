@@ -0,0 +1,172 @@
+import fcntl
+import gzip
+import heapq
+import io
+import json
+import os
+import uuid
+from datetime import datetime
+from itertools import groupby
+from app.cache import to_json
+
+try:
+    import zstandard
+except ImportError:  # Optional, segments are gzip-compressed without it
+    zstandard = None
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _row_key(row):
+    return datetime.fromisoformat(row["created_at"]), row["id"]
+
+
+def _encode_row(row, archived_at):
+    """Turns an event_logs row into the JSON record stored in a segment."""
+    return {
+        "id": row.id,
+        "trigger_id": row.trigger_id,
+        "status": "archived",
+        "created_at": row.created_at.isoformat(),
+        "archived_at": (row.archived_at or archived_at).isoformat(),
+        "response": row.response,
+    }
+
+
+def _write_atomic(path, data):
+    """Writes data to path so readers only ever see the complete file."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ColdStore:
+    """
+    Archived event logs on local disk, as compressed NDJSON segments.
+
+    Segments live under <root>/user=<user_id>/day=<YYYY-MM-DD>/ and each holds rows of one
+    user and day sorted by (created_at, id). Every user directory has a manifest.json listing
+    its segments with their row counts and time ranges, so reads only open the segments they need.
+    """
+
+    def __init__(self, root, compression_level=3):
+        self.root = root
+        self.compression_level = compression_level
+
+    def _user_dir(self, user_id):
+        return os.path.join(self.root, f"user={user_id}")
+
+    def segments(self, user_id):
+        """Returns the manifest entries of a user's segments, oldest first."""
+        try:
+            with open(os.path.join(self._user_dir(user_id), MANIFEST_NAME), "rb") as f:
+                return json.load(f)["segments"]
+        except FileNotFoundError:
+            return []
+
+    def write(self, rows, archived_at):
+        """
+        Writes event_logs rows to new segments, one per user and day, and adds them to the manifests.
+
+        Returns once every segment and manifest is on disk, so the rows can then be deleted from Postgres.
+        """
+        rows = sorted(rows, key=lambda row: (row.user_id, row.created_at, row.id))
+        for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+            entries = [
+                self._write_segment(user_id, day, [_encode_row(row, archived_at) for row in day_rows])
+                for day, day_rows in groupby(user_rows, key=lambda row: row.created_at.date().isoformat())
+            ]
+            self._add_to_manifest(user_id, entries)
+
+    def _write_segment(self, user_id, day, records):
+        body = b"".join(to_json(record) + b"\n" for record in records)
+        if zstandard is not None:
+            data, extension = zstandard.ZstdCompressor(level=self.compression_level).compress(body), "zst"
+        else:
+            data, extension = gzip.compress(body, compresslevel=min(self.compression_level, 9)), "gz"
+
+        name = f"day={day}/segment-{uuid.uuid4().hex}.ndjson.{extension}"
+        path = os.path.join(self._user_dir(user_id), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, data)
+        return {
+            "file": name,
+            "day": day,
+            "rows": len(records),
+            "bytes": len(data),
+            "min_created_at": records[0]["created_at"],
+            "max_created_at": records[-1]["created_at"],
+        }
+
+    def _add_to_manifest(self, user_id, entries):
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        # Serialize manifest updates in case two archival runs ever overlap
+        with open(os.path.join(user_dir, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segments = self.segments(user_id) + entries
+            segments.sort(key=lambda entry: (entry["min_created_at"], entry["max_created_at"]))
+            _write_atomic(os.path.join(user_dir, MANIFEST_NAME), json.dumps({"segments": segments}).encode())
+
+    def read_segment(self, user_id, entry):
+        """Yields the records of one segment in (created_at, id) order."""
+        path = os.path.join(self._user_dir(user_id), entry["file"])
+        with open(path, "rb") as raw:
+            if path.endswith(".zst"):
+                stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            else:
+                stream = gzip.GzipFile(fileobj=raw)
+            with io.BufferedReader(stream) as lines:
+                for line in lines:
+                    yield json.loads(line)
+
+    def count(self, user_id):
+        return sum(entry["rows"] for entry in self.segments(user_id))
+
+    def page(self, user_id, per_page, page=1, cursor=None):
+        """
+        Returns (records, has_more) for one page of a user's archive, newest first.
+
+        Either the page-th page of per_page records, or the per_page records right after
+        cursor, a (created_at, id) pair. Segments are read newest first and reading stops as
+        soon as no remaining segment can hold a record of the page.
+        """
+        skip = 0 if cursor else (page - 1) * per_page
+        needed = skip + per_page + 1
+        records = []
+
+        for entry in sorted(self.segments(user_id), key=lambda entry: entry["max_created_at"], reverse=True):
+            if cursor and datetime.fromisoformat(entry["min_created_at"]) > cursor[0]:
+                continue
+            if len(records) >= needed and \
+                    datetime.fromisoformat(entry["max_created_at"]) < _row_key(records[-1])[0]:
+                break
+            records.extend(record for record in self.read_segment(user_id, entry)
+                           if not cursor or _row_key(record) < cursor)
+            records.sort(key=_row_key, reverse=True)
+            del records[needed:]
+
+        return records[skip:skip + per_page], len(records) > skip + per_page
+
+    def iter_records(self, user_id, since=None, until=None):
+        """Yields a user's archived records oldest first, optionally bounded by naive UTC since/until."""
+        entries = self.segments(user_id)
+        if since:
+            entries = [entry for entry in entries if datetime.fromisoformat(entry["max_created_at"]) >= since]
+        if until:
+            entries = [entry for entry in entries if datetime.fromisoformat(entry["min_created_at"]) < until]
+
+        # Days never overlap, so only the segments of one day at a time need merging
+        for _, day_entries in groupby(sorted(entries, key=lambda entry: entry["day"]), key=lambda entry: entry["day"]):
+            for record in heapq.merge(*(self.read_segment(user_id, entry) for entry in day_entries), key=_row_key):
+                created_at = datetime.fromisoformat(record["created_at"])
+                if (since and created_at < since) or (until and created_at >= until):
+                    continue
+                yield record
+
+
+def get_cold_store(config):
+    return ColdStore(config["EVENT_ARCHIVE_DIR"], config["EVENT_ARCHIVE_COMPRESSION_LEVEL"])
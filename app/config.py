@@ -1,12 +1,35 @@
 import os
-from dotenv import load_dotenv
 from datetime import timedelta
-load_dotenv()  # Load environment variables
+# Settings are read from the environment when this module is imported; entry points
+# (main.py, worker.py, dispatcher.py) load .env before importing the app
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    RQ_REDIS_URL = os.getenv("REDIS_URL")
+    # Database engine per process role; create_app(role) turns WEB_DB_* or WORKER_DB_* into SQLALCHEMY_ENGINE_OPTIONS
+    APP_ROLE = os.getenv("APP_ROLE", "web")                                                   # Role when create_app() isn't given one
+    WEB_DB_POOL_SIZE = int(os.getenv("WEB_DB_POOL_SIZE", 10))                                 # Connections kept open per process
+    WEB_DB_MAX_OVERFLOW = int(os.getenv("WEB_DB_MAX_OVERFLOW", 10))                           # Extra connections allowed under load
+    WEB_DB_POOL_PRE_PING = os.getenv("WEB_DB_POOL_PRE_PING", "true").lower() == "true"        # Test connections before handing them out
+    WEB_DB_POOL_RECYCLE = int(os.getenv("WEB_DB_POOL_RECYCLE", 1800))                         # Seconds before a connection is replaced
+    WEB_DB_STATEMENT_TIMEOUT_MS = int(os.getenv("WEB_DB_STATEMENT_TIMEOUT_MS", 15000))        # 0 disables
+    WORKER_DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", 3))                            # Job, event sink and dispatcher flush threads
+    WORKER_DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", 5))
+    WORKER_DB_POOL_PRE_PING = os.getenv("WORKER_DB_POOL_PRE_PING", "true").lower() == "true"
+    WORKER_DB_POOL_RECYCLE = int(os.getenv("WORKER_DB_POOL_RECYCLE", 1800))
+    WORKER_DB_STATEMENT_TIMEOUT_MS = int(os.getenv("WORKER_DB_STATEMENT_TIMEOUT_MS", 300000)) # Archival chunks can take a while
+    # Query tracking (app/database.py)
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", 500))                     # Log statements slower than this, 0 disables
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 25))                        # Max statements per request, 0 disables
+    QUERY_BUDGETS = os.getenv("QUERY_BUDGETS", "")                           # Per endpoint, e.g. "event_log.EventLogList=4"
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")               # "warn", or "raise" to fail the request
+    RQ_REDIS_URL = os.getenv("REDIS_URL", "redis://redis_cache:6379/0")
+    # Redis connection pool (one per process, see app/redis_client.py)
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))               # Pool size per process
+    REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))                    # Seconds to wait for a free connection
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))                # Must exceed SCHEDULER_MAX_SLEEP
+    REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 2))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))   # Seconds idle before a PING check
     API_TITLE = "Event Trigger API"
     API_VERSION = "v1"
     OPENAPI_VERSION = "3.0.2"
@@ -20,4 +43,88 @@ class Config:
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7)     # Refresh token expires in 7 days
     JWT_TOKEN_LOCATION = ["headers"]       # Allow tokens in headers or cookies
     JWT_COOKIE_SECURE = False                         # Set to True in production (HTTPS only)
-    JWT_COOKIE_CSRF_PROTECT = True                    # Enable CSRF protection for cookies
\ No newline at end of file
+    JWT_COOKIE_CSRF_PROTECT = True                    # Enable CSRF protection for cookies
+    # Event log archival
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))    # Rows updated/deleted per transaction
+    ARCHIVE_AFTER_HOURS = int(os.getenv("ARCHIVE_AFTER_HOURS", 2))     # Archive active events older than this
+    PURGE_AFTER_HOURS = int(os.getenv("PURGE_AFTER_HOURS", 48))        # Drop event log partitions older than this
+    EVENT_ARCHIVE_BACKEND = os.getenv("EVENT_ARCHIVE_BACKEND", "cold")                # "cold" moves archived events to disk, "table" keeps them in event_logs
+    EVENT_ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR", "/var/lib/triggerwise/archive")  # Root directory of cold storage segments, outside the source tree
+    EVENT_ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("EVENT_ARCHIVE_COMPRESSION_LEVEL", 3))  # zstd level (gzip without zstandard)
+    # Logging (app/logger.py)
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")                                 # "text" or "json" (one object per line)
+    LOG_DIR = os.getenv("LOG_DIR", "logs")                                       # Daily rotated app.log, empty for stdout only
+    LOG_SAMPLE_EVERY = os.getenv(                                                # Keep 1 in N messages containing each text
+        "LOG_SAMPLE_EVERY", "Event logged for trigger=100,Event buffered for trigger=100")
+    # Metrics (app/metrics.py); set PROMETHEUS_MULTIPROC_DIR to aggregate samples across processes
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"     # Expose /metrics and time requests
+    # Event log partitioning
+    EVENT_LOG_PARTITION_INTERVAL = os.getenv("EVENT_LOG_PARTITION_INTERVAL", "day")  # "day" or "hour"
+    EVENT_LOG_PARTITIONS_AHEAD = int(os.getenv("EVENT_LOG_PARTITIONS_AHEAD", 3))     # Future partitions to keep ready
+    EVENT_LOG_RETENTION_MODE = os.getenv("EVENT_LOG_RETENTION_MODE", "drop")         # "drop" or "detach" expired partitions
+    # API trigger dispatch
+    API_TRIGGER_TIMEOUT = float(os.getenv("API_TRIGGER_TIMEOUT", 10))                  # Seconds per outbound call
+    API_TRIGGER_CONNECT_TIMEOUT = float(os.getenv("API_TRIGGER_CONNECT_TIMEOUT", 3))   # Seconds to establish a connection
+    DISPATCH_CONCURRENCY = int(os.getenv("DISPATCH_CONCURRENCY", 200))                 # Max in-flight calls per dispatcher
+    DISPATCH_PER_HOST_LIMIT = int(os.getenv("DISPATCH_PER_HOST_LIMIT", 20))            # Max in-flight calls per target host
+    DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", 500))                   # Fires popped from Redis at once
+    DISPATCH_FLUSH_SIZE = int(os.getenv("DISPATCH_FLUSH_SIZE", 500))                   # Event logs written per batch
+    DISPATCH_FLUSH_INTERVAL_MS = int(os.getenv("DISPATCH_FLUSH_INTERVAL_MS", 200))     # Max delay before writing event logs
+    EXECUTION_TTL = int(os.getenv("EXECUTION_TTL", 86400))                             # Seconds an execution handle can be polled
+    # Per target host guard shared by all dispatchers (app/dispatch_guard.py)
+    DISPATCH_GUARD_ENABLED = os.getenv("DISPATCH_GUARD_ENABLED", "true").lower() == "true"
+    DISPATCH_HOST_RATE = float(os.getenv("DISPATCH_HOST_RATE", 50))                    # Fires per second per host, 0 = unlimited
+    DISPATCH_HOST_BURST = int(os.getenv("DISPATCH_HOST_BURST", 100))                   # Fires a host may get at once after idling
+    DISPATCH_HOST_CONCURRENCY = int(os.getenv("DISPATCH_HOST_CONCURRENCY", 20))        # In-flight fires per host, 0 = unlimited
+    DISPATCH_BREAKER_FAILURES = int(os.getenv("DISPATCH_BREAKER_FAILURES", 5))         # Consecutive failures that open a circuit
+    DISPATCH_BREAKER_COOLDOWN = float(os.getenv("DISPATCH_BREAKER_COOLDOWN", 30))      # Seconds open before a half-open probe
+    DISPATCH_DEFER_BASE_MS = int(os.getenv("DISPATCH_DEFER_BASE_MS", 200))             # First backoff of a held back fire, doubling
+    DISPATCH_DEFER_MAX_MS = int(os.getenv("DISPATCH_DEFER_MAX_MS", 60000))             # Longest backoff
+    DISPATCH_DEFER_MAX_AGE = int(os.getenv("DISPATCH_DEFER_MAX_AGE", 3600))            # Seconds before a held back fire is failed
+    # Retries of failed fires and the dead-letter store (app/retries.py); triggers can override the policy
+    TRIGGER_MAX_ATTEMPTS = int(os.getenv("TRIGGER_MAX_ATTEMPTS", 5))                   # Attempts per fire before it is dead-lettered
+    TRIGGER_RETRY_BACKOFF_MS = int(os.getenv("TRIGGER_RETRY_BACKOFF_MS", 1000))        # First retry delay, doubling per attempt
+    TRIGGER_RETRY_MAX_MS = int(os.getenv("TRIGGER_RETRY_MAX_MS", 300000))              # Longest retry delay
+    DEAD_LETTER_TTL = int(os.getenv("DEAD_LETTER_TTL", 7 * 86400))                     # Seconds a dead letter is kept for replay
+    # Worker supervisor (worker.py)
+    WORKER_MODE = os.getenv("WORKER_MODE", "dedicated")                              # "dedicated" or "weighted"
+    WORKER_CONCURRENCY = os.getenv("WORKER_CONCURRENCY", "trigger=4,archive=1")       # Processes per queue in dedicated mode
+    WORKER_QUEUE_PRIORITY = os.getenv("WORKER_QUEUE_PRIORITY", "trigger,archive")    # Highest priority first
+    WORKER_WEIGHTS = os.getenv("WORKER_WEIGHTS", "trigger=5,archive=1")              # Queue weights in weighted mode
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 0))                         # Weighted mode processes, 0 = CPU count
+    DISPATCHER_PROCESSES = int(os.getenv("DISPATCHER_PROCESSES", 1))                 # Async API trigger dispatchers
+    WORKER_SHUTDOWN_TIMEOUT = int(os.getenv("WORKER_SHUTDOWN_TIMEOUT", 30))          # Seconds to finish current jobs on SIGTERM
+    SCHEDULER_PROCESSES = int(os.getenv("SCHEDULER_PROCESSES", 1))                   # Trigger schedulers (safe to run several)
+    # Trigger scheduler
+    SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 1000))              # Due triggers enqueued per round trip
+    SCHEDULER_MAX_SLEEP = float(os.getenv("SCHEDULER_MAX_SLEEP", 1.0))               # Max seconds between checks
+    # Recurring triggers
+    RECURRENCE_CATCH_UP_POLICY = os.getenv("RECURRENCE_CATCH_UP_POLICY", "coalesce")  # fire_all, coalesce or skip
+    RECURRENCE_MAX_CATCH_UP = int(os.getenv("RECURRENCE_MAX_CATCH_UP", 10))          # Max windows fired by fire_all, 0 = no catch-up
+    # /events/ response cache
+    EVENTS_CACHE_TTL = int(os.getenv("EVENTS_CACHE_TTL", 600))                       # Seconds a cached page is kept
+    EVENTS_CACHE_COALESCE_MS = int(os.getenv("EVENTS_CACHE_COALESCE_MS", 0))         # Merge invalidations within this window, 0 = off
+    EVENTS_CACHE_LOCK_TIMEOUT_MS = int(os.getenv("EVENTS_CACHE_LOCK_TIMEOUT_MS", 5000))  # Max wait for another request's rebuild
+    EVENTS_CACHE_EARLY_REFRESH_BETA = float(os.getenv("EVENTS_CACHE_EARLY_REFRESH_BETA", 1.0))  # Early refresh eagerness, 0 = off
+    EVENTS_CACHE_COMPRESS_MIN_BYTES = int(os.getenv("EVENTS_CACHE_COMPRESS_MIN_BYTES", 8192))  # zlib-compress larger pages, 0 = off
+    # In-process cache in front of Redis/Postgres for hot reads (see app/local_cache.py)
+    LOCAL_CACHE_ENABLED = os.getenv("LOCAL_CACHE_ENABLED", "true") == "true"
+    LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 32 * 1024 * 1024))  # Summed size of cached bodies per process
+    LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 10000))
+    LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", 5))                          # Seconds, bounds staleness if a message is lost
+    # Bulk trigger API
+    TRIGGER_BULK_MAX_ITEMS = int(os.getenv("TRIGGER_BULK_MAX_ITEMS", 10000))        # Items accepted per /triggers/bulk call
+    # Buffered event log writes in workers (see app/event_sink.py)
+    EVENT_SINK_ENABLED = os.getenv("EVENT_SINK_ENABLED", "true") == "true"
+    EVENT_SINK_FLUSH_SIZE = int(os.getenv("EVENT_SINK_FLUSH_SIZE", 500))             # Rows per multi-row INSERT
+    EVENT_SINK_FLUSH_INTERVAL_MS = int(os.getenv("EVENT_SINK_FLUSH_INTERVAL_MS", 200))  # Max time a row waits to be written
+    EVENT_EXPORT_BATCH_SIZE = int(os.getenv("EVENT_EXPORT_BATCH_SIZE", 5000))       # Rows fetched per server-side cursor round trip
+
+
+def parse_queue_counts(value):
+    """Parses "trigger=4,archive=1" into {"trigger": 4, "archive": 1}, keeping the order given."""
+    counts = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, count = item.partition("=")
+        counts[name.strip()] = int(count or 1)
+    return counts
@@ -0,0 +1,95 @@
+import logging
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import parse_queue_counts
+from app.metrics import DB_QUERY_DURATION
+
+ROLES = ("web", "worker")
+
+logger = logging.getLogger(__name__)
+
+# Set from the app's SLOW_QUERY_MS by init_query_tracking; the statement hooks below are engine-wide
+_slow_query_ms = 0
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised after a request that ran more statements than its budget, when QUERY_BUDGET_MODE is "raise"."""
+
+
+def engine_options(config, role):
+    """
+    Builds SQLALCHEMY_ENGINE_OPTIONS for a process role from its WEB_DB_* or WORKER_DB_* settings.
+
+    statement_timeout is set per connection, so a runaway query is cancelled by Postgres
+    instead of holding a pooled connection (and a worker slot) indefinitely.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown role {role!r}, expected one of {', '.join(ROLES)}.")
+    prefix = f"{role.upper()}_DB_"
+    options = {
+        "pool_size": config[prefix + "POOL_SIZE"],
+        "max_overflow": config[prefix + "MAX_OVERFLOW"],
+        "pool_pre_ping": config[prefix + "POOL_PRE_PING"],
+        "pool_recycle": config[prefix + "POOL_RECYCLE"],
+    }
+    if config[prefix + "STATEMENT_TIMEOUT_MS"]:
+        options["connect_args"] = {"options": f"-c statement_timeout={config[prefix + 'STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.split(None, 1)[0].upper() if statement.strip() else ""
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        operation = "OTHER"
+    DB_QUERY_DURATION.labels(operation).observe(elapsed)
+
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+        g.query_seconds = g.get("query_seconds", 0.0) + elapsed
+    if _slow_query_ms and elapsed * 1000 >= _slow_query_ms:
+        where = f" in {request.endpoint}" if has_request_context() else ""
+        logger.warning(f"Slow query{where} ({elapsed * 1000:.1f} ms): {statement[:500]}")
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def init_query_tracking(app):
+    """
+    Counts the statements each request runs and checks them against its query budget.
+
+    The budget is QUERY_BUDGET, or the endpoint's entry in QUERY_BUDGETS. Going over it
+    logs a warning, or raises QueryBudgetExceeded with QUERY_BUDGET_MODE="raise" (meant
+    for tests, to catch N+1 patterns as soon as they appear). Also sets the SLOW_QUERY_MS
+    threshold for logging slow statements.
+    """
+    global _slow_query_ms
+    _slow_query_ms = app.config["SLOW_QUERY_MS"]
+    default_budget = app.config["QUERY_BUDGET"]
+    budgets = parse_queue_counts(app.config["QUERY_BUDGETS"])
+    mode = app.config["QUERY_BUDGET_MODE"]
+
+    @app.after_request
+    def check_query_budget(response):
+        count = g.get("query_count", 0)
+        budget = budgets.get(request.endpoint, default_budget)
+        if budget and count > budget:
+            message = (f"{request.method} {request.path} ({request.endpoint}) ran {count} queries "
+                       f"in {g.get('query_seconds', 0.0) * 1000:.1f} ms, over its budget of {budget}.")
+            if mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
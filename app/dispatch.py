@@ -0,0 +1,341 @@
+import asyncio
+import json
+import signal
+import time
+import uuid
+from datetime import datetime, timezone
+
+import aiohttp
+
+from app.dispatch_guard import (DEFERRED_KEY, HOLD_RETRY_INTERVAL, REQUEUE_BATCH_SIZE, REQUEUE_SCRIPT, DispatchGuard,
+                                is_failure)
+from app.executions import DISPATCH_QUEUE_KEY, complete_executions, execution_failed, retry_execution
+from app.metrics import DISPATCH_LATENCY, TRIGGER_RETRIES, dispatch_outcome
+from app.redis_client import create_async_redis
+from app.retries import add_dead_letters, api_dead_letter, next_retry_delay
+from app.tasks import log_events
+
+# Seconds between moves of due deferred and retried fires back onto the dispatch list
+REQUEUE_INTERVAL = 0.05
+# Per dispatcher: the fires it claimed (list), and a key that expires when it stops beating; plus the set of them
+PROCESSING_KEY = "trigger:api-dispatch:processing:{}"
+ALIVE_KEY = "trigger:api-dispatch:alive:{}"
+DISPATCHERS_KEY = "trigger:api-dispatch:dispatchers"
+# Seconds after the last heartbeat before a dispatcher's claims are taken back, and between heartbeats
+HEARTBEAT_TTL = 30
+HEARTBEAT_INTERVAL = HEARTBEAT_TTL / 3
+
+# Atomically moves up to ARGV[1] fires from the head of the dispatch list to the end of a processing list
+CLAIM_SCRIPT = """
+local fires = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #fires > 0 then
+    redis.call('LTRIM', KEYS[1], #fires, -1)
+    redis.call('RPUSH', KEYS[2], unpack(fires))
+end
+return fires
+"""
+
+# Unless the dispatcher ARGV[1] is alive (KEYS[2]), moves its processing list (KEYS[1]) back to the
+# head of the dispatch list (KEYS[3]) in order and unregisters it (KEYS[4]). Returns the fires moved, or -1.
+RECOVER_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return -1
+end
+local moved = 0
+while redis.call('LMOVE', KEYS[1], KEYS[3], 'RIGHT', 'LEFT') do
+    moved = moved + 1
+end
+redis.call('SREM', KEYS[4], ARGV[1])
+return moved
+"""
+
+
+class AsyncDispatcher:
+    """Fires API triggers concurrently over a shared keep-alive connection pool."""
+
+    def __init__(self, concurrency=200, per_host_limit=20, timeout=10, connect_timeout=3):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host_limit)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def fire(self, fire):
+        """Posts one fire and returns (fire, result); failures are captured in the result, never raised."""
+        # Every attempt of a fire sends the same key, so targets can drop the duplicates a retry may cause
+        idempotency_key = fire.get("idempotency_key") or fire.get("execution_id")
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        started = time.perf_counter()
+        try:
+            async with self._session.post(fire["api_endpoint"], json=fire.get("api_payload"),
+                                          headers=headers) as response:
+                await response.read()
+                result = {"status_code": response.status}
+        except Exception as e:
+            result = {"error": str(e) or e.__class__.__name__}
+
+        elapsed = time.perf_counter() - started
+        DISPATCH_LATENCY.labels(dispatch_outcome(result.get("status_code"))).observe(elapsed)
+        result["elapsed_ms"] = round(elapsed * 1000, 2)
+        return fire, result
+
+    async def fire_many(self, fires):
+        return await asyncio.gather(*(self.fire(fire) for fire in fires))
+
+
+def _to_event(fire, result):
+    return {
+        "trigger_id": fire["trigger_id"],
+        "user_id": fire["user_id"],
+        "response": result,
+        "status": fire.get("status", "active"),
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+class ClaimedFires:
+    """
+    The fires a dispatcher took off the dispatch list and isn't done with yet.
+
+    Fires are moved, never popped, into this dispatcher's own processing list, and only
+    removed from it (acked) once they are finished and logged, or parked in the deferred
+    set. A fire is therefore never lost: if the dispatcher dies, its heartbeat key expires
+    and the next dispatcher to beat moves the orphaned list back onto the dispatch list.
+    The heartbeat runs as its own task (keep_alive), so a slow flush or target doesn't
+    make a live dispatcher look dead. Delivery is at least once; targets dedupe by
+    Idempotency-Key.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.id = uuid.uuid4().hex
+        self.key = PROCESSING_KEY.format(self.id)
+        self._claimed = {}  # id(fire) -> the JSON it was claimed as, which is what ack removes
+        self._claim = redis.register_script(CLAIM_SCRIPT)
+        self._recover = redis.register_script(RECOVER_SCRIPT)
+
+    async def pop(self, count, block):
+        """Claims up to count fires. When block is set, waits up to a second for the first one."""
+        raw = []
+        if block:
+            item = await self.redis.blmove(DISPATCH_QUEUE_KEY, self.key, 1, "LEFT", "RIGHT")
+            if item is None:
+                return []
+            raw.append(item)
+            count -= 1
+        if count > 0:
+            raw.extend(await self._claim(keys=[DISPATCH_QUEUE_KEY, self.key], args=[count]))
+        fires = []
+        for item in raw:
+            fire = json.loads(item)
+            self._claimed[id(fire)] = item
+            fires.append(fire)
+        return fires
+
+    def ack(self, fires, pipe):
+        """Adds removing finished or parked fires from the processing list to a pipeline."""
+        for fire in fires:
+            item = self._claimed.pop(id(fire), None)
+            if item is not None:
+                pipe.lrem(self.key, 1, item)
+
+    async def ack_now(self, fires):
+        pipe = self.redis.pipeline(transaction=False)
+        self.ack(fires, pipe)
+        await pipe.execute()
+
+    async def heartbeat(self):
+        """
+        Keeps this dispatcher's claims its own for another HEARTBEAT_TTL, and takes back those
+        of dispatchers that died. Returns how many fires were taken back.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(ALIVE_KEY.format(self.id), 1, ex=HEARTBEAT_TTL)
+        pipe.sadd(DISPATCHERS_KEY, self.id)
+        await pipe.execute()
+        return await self.recover_orphans()
+
+    async def keep_alive(self, logger):
+        """Beats every HEARTBEAT_INTERVAL until cancelled; run it as a task next to the dispatch loop."""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                recovered = await self.heartbeat()
+                if recovered:
+                    logger.warning(f"Recovered {recovered} API trigger fires claimed by dispatchers that died.")
+            except Exception as e:
+                # Try again next beat; the key only expires after HEARTBEAT_TTL
+                logger.error(f"Error refreshing dispatcher heartbeat: {str(e)}")
+
+    async def recover_orphans(self):
+        """Moves the claims of dispatchers whose heartbeat expired back onto the dispatch list. Returns how many."""
+        recovered = 0
+        for dispatcher_id in await self.redis.smembers(DISPATCHERS_KEY):
+            dispatcher_id = dispatcher_id.decode()
+            if dispatcher_id != self.id:
+                recovered += max(0, await self._recover(
+                    keys=[PROCESSING_KEY.format(dispatcher_id), ALIVE_KEY.format(dispatcher_id), DISPATCH_QUEUE_KEY,
+                          DISPATCHERS_KEY],
+                    args=[dispatcher_id],
+                ))
+        return recovered
+
+    async def close(self):
+        """Hands every fire still claimed back to the head of the dispatch list, e.g. the ones held by the guard."""
+        self._claimed = {}
+        await self.redis.delete(ALIVE_KEY.format(self.id))
+        await self._recover(keys=[self.key, ALIVE_KEY.format(self.id), DISPATCH_QUEUE_KEY, DISPATCHERS_KEY],
+                            args=[self.id])
+
+
+def _plan_retries(finished, config):
+    """
+    Splits finished fires into final (fire, result) pairs and (fire, result, delay) ones to
+    retry: failures a later attempt may fix, with attempts left. Test fires aren't retried.
+    """
+    final, retries = [], []
+    for fire, result in finished:
+        attempt = fire.get("attempt", 1)
+        delay = None
+        if fire.get("status") != "test" and is_failure(result):
+            delay = next_retry_delay(config, attempt, fire.get("max_attempts"), fire.get("retry_backoff_ms"))
+        if delay is None:
+            result["attempts"] = attempt
+            final.append((fire, result))
+        else:
+            retries.append((fire, result, delay))
+    return final, retries
+
+
+async def _park_retries(redis, retries, execution_ttl, claims):
+    """Parks fires to retry with the deferred ones until their backoff is over, without holding a slot."""
+    now = time.time()
+    pipe = redis.pipeline(transaction=False)
+    claims.ack([fire for fire, _, _ in retries], pipe)
+    parked = {}
+    for fire, result, delay in retries:
+        retry_execution(pipe, fire["execution_id"], result, fire.get("attempt", 1), execution_ttl)
+        # A retry is a new attempt, with its own deferrals by the guard
+        fire = {key: value for key, value in fire.items() if key not in ("deferrals", "deferred_since")}
+        fire["attempt"] = fire.get("attempt", 1) + 1
+        parked[json.dumps(fire)] = now + delay
+    pipe.zadd(DEFERRED_KEY, parked)
+    await pipe.execute()
+    TRIGGER_RETRIES.labels("api").inc(len(retries))
+
+
+async def _consume(app, stop):
+    config = app.config
+    loop = asyncio.get_running_loop()
+    redis = create_async_redis()
+    flush_interval = config["DISPATCH_FLUSH_INTERVAL_MS"] / 1000
+
+    def flush(results):
+        with app.app_context():
+            # Failed for good: keep them for replay, and say so in the event log and the execution
+            dead = [(fire, result) for fire, result in results
+                    if fire.get("status") != "test" and execution_failed(result)]
+            dead_letter_ids = add_dead_letters([api_dead_letter(fire, result) for fire, result in dead])
+            for (fire, result), dead_letter_id in zip(dead, dead_letter_ids):
+                result["dead_letter_id"] = dead_letter_id
+
+            # Fires of unsaved test triggers have nothing to log against, only an execution record
+            events = [_to_event(fire, result) for fire, result in results if fire["trigger_id"] is not None]
+            if events:
+                log_events(events)
+            complete_executions([(fire["execution_id"], result) for fire, result in results
+                                 if fire.get("execution_id")])
+
+    # Fires to hosts that are rate limited, at their concurrency cap or circuit broken wait in Redis, not here
+    guard = DispatchGuard(redis, config) if config["DISPATCH_GUARD_ENABLED"] else None
+    requeue = redis.register_script(REQUEUE_SCRIPT)
+    claims = ClaimedFires(redis)
+    # Beat once before claiming anything, then on a timer that flushes and slow targets can't hold up
+    recovered = await claims.heartbeat()
+    if recovered:
+        app.logger.warning(f"Recovered {recovered} API trigger fires claimed by dispatchers that died.")
+    heartbeat = asyncio.create_task(claims.keep_alive(app.logger))
+    in_flight = set()
+    results = []
+    last_flush = last_requeue = time.monotonic()
+
+    async with AsyncDispatcher(
+        concurrency=config["DISPATCH_CONCURRENCY"],
+        per_host_limit=config["DISPATCH_PER_HOST_LIMIT"],
+        timeout=config["API_TRIGGER_TIMEOUT"],
+        connect_timeout=config["API_TRIGGER_CONNECT_TIMEOUT"],
+    ) as dispatcher:
+        while not stop.is_set() or in_flight:
+            if time.monotonic() - last_requeue >= REQUEUE_INTERVAL:
+                await requeue(keys=[DEFERRED_KEY, DISPATCH_QUEUE_KEY], args=[time.time(), REQUEUE_BATCH_SIZE])
+                last_requeue = time.monotonic()
+
+            # Only pull as many fires as there are free connection slots, counting fires waiting for one
+            held = guard.held if guard else 0
+            room = dispatcher.concurrency - len(in_flight) - held
+            if not stop.is_set():
+                fires = guard.take_held() if held else []
+                if room > 0:
+                    fires += await claims.pop(min(room, config["DISPATCH_BATCH_SIZE"]),
+                                              block=not in_flight and not held)
+                if guard and fires:
+                    fires, expired = await guard.admit(fires, ack=claims.ack)
+                    results.extend(expired)
+                in_flight.update(asyncio.create_task(dispatcher.fire(fire)) for fire in fires)
+
+            if not in_flight and held:
+                # Every waiting fire's host is busy with other dispatchers' calls
+                await asyncio.sleep(HOLD_RETRY_INTERVAL)
+            elif in_flight:
+                done, in_flight = await asyncio.wait(in_flight, timeout=flush_interval,
+                                                     return_when=asyncio.FIRST_COMPLETED)
+                finished = [task.result() for task in done]
+                if guard and finished:
+                    for host in await guard.release(finished):
+                        app.logger.warning(f"Circuit opened for API trigger target {host}, deferring its fires.")
+                finished, retries = _plan_retries(finished, config)
+                if retries:
+                    await _park_retries(redis, retries, config["EXECUTION_TTL"], claims)
+                results.extend(finished)
+
+            if results and (len(results) >= config["DISPATCH_FLUSH_SIZE"] or stop.is_set()
+                            or time.monotonic() - last_flush >= flush_interval):
+                await loop.run_in_executor(None, flush, results)
+                # Only now, with their outcomes recorded, are the fires done
+                await claims.ack_now([fire for fire, _ in results])
+                results = []
+                last_flush = time.monotonic()
+
+        if results:
+            await loop.run_in_executor(None, flush, results)
+            await claims.ack_now([fire for fire, _ in results])
+        if guard:
+            guard.drop_held()
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        await claims.close()
+
+    await redis.aclose()
+
+
+def run_dispatcher(app):
+    """Runs the dispatcher until SIGTERM/SIGINT, then finishes in-flight fires and flushes their logs."""
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        app.logger.info("API trigger dispatcher started.")
+        await _consume(app, stop)
+        app.logger.info("API trigger dispatcher stopped.")
+
+    asyncio.run(main())
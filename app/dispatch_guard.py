@@ -0,0 +1,278 @@
+"""
+Per target host guard for API trigger dispatch, shared by every dispatcher through Redis.
+
+Before a fire is sent, its host must pass, in one atomic step:
+- a circuit breaker: DISPATCH_BREAKER_FAILURES consecutive failures (errors, timeouts,
+  429 and 5xx responses) open the circuit for DISPATCH_BREAKER_COOLDOWN seconds. After
+  that, one probe at a time is let through (half-open); its success closes the circuit
+  and its failure opens it again;
+- a concurrency cap of DISPATCH_HOST_CONCURRENCY fires in flight, held as leases that
+  expire on their own if a dispatcher dies mid-call;
+- a token bucket refilled at DISPATCH_HOST_RATE fires per second, up to DISPATCH_HOST_BURST.
+
+Fires turned away by a rate limit or an open circuit are deferred: parked in a sorted set
+with exponential backoff and jitter, then moved back onto the dispatch list when due.
+Fires turned away because their host is at its concurrency cap wait in the dispatcher
+(up to half its slots per host) and are retried as calls to that host finish; any beyond
+that are deferred for DISPATCH_DEFER_BASE_MS, without growing backoff, as the host is
+healthy, only busy. Waiting fires never hold a connection, so a slow or failing host
+can't hold up the fires of healthy ones.
+"""
+import json
+import random
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from app.metrics import DISPATCH_GUARD_DEFERRALS
+
+# Fires waiting out a backoff, the guard's or a retry's (app/retries.py), scored by the epoch time they may go again
+DEFERRED_KEY = "trigger:api-dispatch:deferred"
+# Per host: circuit breaker and token bucket state (hash), and in-flight leases (sorted set by expiry)
+HOST_STATE_KEY = "dispatch:host:{}"
+HOST_LEASES_KEY = "dispatch:host:{}:leases"
+# Idle host state is dropped after this long
+HOST_STATE_TTL_MS = 24 * 3600 * 1000
+# Deferred fires moved back onto the dispatch list per round trip
+REQUEUE_BATCH_SIZE = 1000
+# Seconds between retries of every fire waiting for a slot, as other dispatchers' calls free slots too
+HOLD_RETRY_INTERVAL = 0.1
+
+# Decides whether a fire to a host may go now. ARGV: rate/s, burst, concurrency cap,
+# lease id, lease TTL in ms, state TTL in ms. Returns {allowed, retry after ms, reason}.
+ACQUIRE_SCRIPT = """
+redis.replicate_commands()
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local rate, burst, limit = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local lease_ttl, state_ttl = tonumber(ARGV[5]), tonumber(ARGV[6])
+local state = redis.call('HMGET', KEYS[1], 'open_until', 'probe_until', 'tokens', 'refilled_at')
+
+local probe = false
+local open_until = tonumber(state[1]) or 0
+if open_until > 0 then
+    if now < open_until then
+        return {0, open_until - now, 'circuit_open'}
+    end
+    local probe_until = tonumber(state[2]) or 0
+    if probe_until > now then
+        return {0, probe_until - now, 'circuit_half_open'}
+    end
+    probe = true
+end
+
+if limit > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+    if redis.call('ZCARD', KEYS[2]) >= limit then
+        return {0, 0, 'concurrency'}
+    end
+end
+
+if rate > 0 then
+    local tokens = tonumber(state[3]) or burst
+    local refilled_at = tonumber(state[4]) or now
+    tokens = math.min(burst, tokens + (now - refilled_at) * rate / 1000)
+    if tokens < 1 then
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'refilled_at', now)
+        return {0, math.ceil((1 - tokens) * 1000 / rate), 'rate_limited'}
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'refilled_at', now)
+end
+
+if limit > 0 then
+    redis.call('ZADD', KEYS[2], now + lease_ttl, ARGV[4])
+    redis.call('PEXPIRE', KEYS[2], lease_ttl)
+end
+if probe then
+    redis.call('HSET', KEYS[1], 'probe_until', now + lease_ttl)
+end
+redis.call('PEXPIRE', KEYS[1], state_ttl)
+return {1, 0, probe and 'probe' or 'allowed'}
+"""
+
+# Records the outcome of a fire. ARGV: lease id, "success" or "failure", failure threshold,
+# cooldown in ms. Returns 1 when this failure opened the circuit, 0 otherwise.
+RELEASE_SCRIPT = """
+redis.replicate_commands()
+redis.call('ZREM', KEYS[2], ARGV[1])
+if ARGV[2] == 'success' then
+    redis.call('HDEL', KEYS[1], 'failures', 'open_until', 'probe_until')
+    return 0
+end
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until')) or 0
+-- A failure while open or half-open (a failed probe) keeps the circuit open for another cooldown
+if failures >= tonumber(ARGV[3]) or open_until > 0 then
+    redis.call('HSET', KEYS[1], 'open_until', now + tonumber(ARGV[4]))
+    redis.call('HDEL', KEYS[1], 'probe_until')
+    return open_until == 0 and 1 or 0
+end
+return 0
+"""
+
+# Atomically moves up to ARGV[2] deferred fires due at or before ARGV[1] onto the dispatch list
+REQUEUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+    redis.call('RPUSH', KEYS[2], unpack(due))
+end
+return #due
+"""
+
+
+def target_host(api_endpoint):
+    """Returns the host (and port, if any) a fire is sent to, which is what the guard is keyed by."""
+    try:
+        return urlsplit(api_endpoint).netloc.lower() or "invalid"
+    except (AttributeError, ValueError):
+        return "invalid"
+
+
+def is_failure(result):
+    """True for outcomes that count against a host's circuit: errors, timeouts, 429 and 5xx."""
+    status_code = result.get("status_code")
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class DispatchGuard:
+    """Rate limits and circuit breaks API trigger fires per target host, on an asyncio Redis client."""
+
+    def __init__(self, redis, config):
+        self.redis = redis
+        self.rate = config["DISPATCH_HOST_RATE"]
+        self.burst = max(1, config["DISPATCH_HOST_BURST"])
+        self.concurrency = config["DISPATCH_HOST_CONCURRENCY"]
+        self.failure_threshold = max(1, config["DISPATCH_BREAKER_FAILURES"])
+        self.cooldown_ms = int(config["DISPATCH_BREAKER_COOLDOWN"] * 1000)
+        self.defer_base_ms = config["DISPATCH_DEFER_BASE_MS"]
+        self.defer_max_ms = config["DISPATCH_DEFER_MAX_MS"]
+        self.defer_max_age = config["DISPATCH_DEFER_MAX_AGE"]
+        self.hold_limit = max(1, config["DISPATCH_CONCURRENCY"] // 2)
+        # A lease outlives the longest possible call, so only a crashed dispatcher's leases expire
+        self.lease_ttl_ms = int((config["API_TRIGGER_TIMEOUT"] + config["API_TRIGGER_CONNECT_TIMEOUT"] + 5) * 1000)
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+        self._held = {}  # host -> fires waiting for a free slot at that host
+        self._freed = {}  # host -> slots freed by this dispatcher's calls since the last retry
+        self._retry_held_at = 0.0
+
+    @staticmethod
+    def _keys(host):
+        return [HOST_STATE_KEY.format(host), HOST_LEASES_KEY.format(host)]
+
+    @property
+    def held(self):
+        """Number of fires waiting in this dispatcher for a free slot at their host."""
+        return sum(len(fires) for fires in self._held.values())
+
+    def take_held(self):
+        """
+        Returns waiting fires for another try: as many per host as this dispatcher's calls
+        to it have freed slots, or all of them every HOLD_RETRY_INTERVAL.
+        """
+        retry_all = time.monotonic() >= self._retry_held_at
+        fires = []
+        for host, held in self._held.items():
+            count = len(held) if retry_all else self._freed.get(host, 0)
+            fires.extend(held[:count])
+            del held[:count]
+        self._held = {host: held for host, held in self._held.items() if held}
+        self._freed = {}
+        return fires
+
+    async def admit(self, fires, ack=None):
+        """
+        Checks a batch of fires in one round trip. Returns (allowed, expired): allowed
+        fires carry a lease and must be released, the others wait or are deferred, and
+        expired are (fire, result) pairs for fires that were deferred for too long.
+        ack(fires, pipe) is passed on to defer.
+        """
+        if not fires:
+            return [], []
+        pipe = self.redis.pipeline(transaction=False)
+        for fire in fires:
+            fire["guard"] = {"host": target_host(fire["api_endpoint"]), "lease": uuid.uuid4().hex}
+            await self._acquire(
+                keys=self._keys(fire["guard"]["host"]),
+                args=[self.rate, self.burst, self.concurrency, fire["guard"]["lease"], self.lease_ttl_ms,
+                      HOST_STATE_TTL_MS],
+                client=pipe,
+            )
+        decisions = await pipe.execute()
+
+        allowed, deferred = [], []
+        for fire, (ok, retry_after_ms, reason) in zip(fires, decisions):
+            reason = reason.decode()
+            held = self._held.setdefault(fire["guard"]["host"], [])
+            if ok:
+                allowed.append(fire)
+            elif reason == "concurrency" and len(held) < self.hold_limit:
+                held.append(fire)
+            else:
+                deferred.append((fire, retry_after_ms, reason))
+        self._held = {host: held for host, held in self._held.items() if held}
+        if self._held and time.monotonic() >= self._retry_held_at:
+            self._retry_held_at = time.monotonic() + HOLD_RETRY_INTERVAL
+        expired = await self.defer(deferred, ack) if deferred else []
+        return allowed, expired
+
+    async def release(self, results):
+        """Frees the leases of finished fires and feeds their outcomes to the circuit breakers. Returns newly opened hosts."""
+        pipe = self.redis.pipeline(transaction=False)
+        hosts = []
+        for fire, result in results:
+            guard = fire.pop("guard", None)
+            if guard is None:
+                continue
+            hosts.append(guard["host"])
+            self._freed[guard["host"]] = self._freed.get(guard["host"], 0) + 1
+            await self._release(
+                keys=self._keys(guard["host"]),
+                args=[guard["lease"], "failure" if is_failure(result) else "success", self.failure_threshold,
+                      self.cooldown_ms],
+                client=pipe,
+            )
+        if not hosts:
+            return []
+        opened = await pipe.execute()
+        return sorted({host for host, was_opened in zip(hosts, opened) if was_opened})
+
+    def backoff_ms(self, deferrals, retry_after_ms, reason):
+        """Exponential backoff with jitter (flat for busy hosts), never sooner than the guard asked for."""
+        exponent = 0 if reason == "concurrency" else min(deferrals, 20)
+        ceiling = min(self.defer_max_ms, self.defer_base_ms * 2 ** exponent)
+        return max(retry_after_ms, random.uniform(ceiling / 2, ceiling))
+
+    async def defer(self, deferred, ack=None):
+        """
+        Parks turned away fires ([(fire, retry after ms, reason)]) until their backoff is over.
+        Returns (fire, result) pairs for the fires that have waited longer than DISPATCH_DEFER_MAX_AGE.
+        If given, ack(fires, pipe) adds taking the parked fires off wherever they came from to the parking round trip.
+        """
+        now = time.time()
+        parked, expired, parked_fires = {}, [], []
+        for fire, retry_after_ms, reason in deferred:
+            fire.pop("guard", None)
+            DISPATCH_GUARD_DEFERRALS.labels(reason).inc()
+            deferred_since = fire.setdefault("deferred_since", now)
+            if now - deferred_since > self.defer_max_age:
+                expired.append((fire, {"error": f"Gave up after {fire.get('deferrals', 0)} deferrals ({reason})"}))
+                continue
+            delay_ms = self.backoff_ms(fire.get("deferrals", 0), retry_after_ms, reason)
+            fire["deferrals"] = fire.get("deferrals", 0) + 1
+            parked[json.dumps(fire)] = now + delay_ms / 1000
+            parked_fires.append(fire)
+        if parked:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(DEFERRED_KEY, parked)
+            if ack:
+                ack(parked_fires, pipe)
+            await pipe.execute()
+        return expired
+
+    def drop_held(self):
+        """Forgets the fires waiting for a slot, e.g. on shutdown, when the dispatcher hands back everything it claimed."""
+        self._held = {}
@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from datetime import datetime
+from app.redis_client import get_redis
+
+# Redis list of event log rows that could not be written to Postgres, waiting to be replayed
+SPILL_KEY = "events:spill"
+# Seconds between checks of the spill list by a running sink
+REPLAY_INTERVAL = 5
+
+_sink = None
+
+
+def _encode(row):
+    return json.dumps({**row, "created_at": row["created_at"].isoformat()})
+
+
+def _decode(raw):
+    row = json.loads(raw)
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return row
+
+
+def spill_events(rows):
+    """Parks rows in Redis until Postgres is writable again."""
+    get_redis().rpush(SPILL_KEY, *(_encode(row) for row in rows))
+
+
+def replay_spilled_events(batch_size):
+    """
+    Writes back up to batch_size spilled rows and returns how many were taken.
+
+    LPOP hands each row to exactly one replaying process; rows that fail again are spilled again.
+    """
+    from app.tasks import log_events
+
+    raw = get_redis().lpop(SPILL_KEY, batch_size)
+    if raw:
+        log_events([_decode(item) for item in raw])
+    return len(raw or [])
+
+
+class EventLogSink:
+    """
+    Buffers event log rows and writes them with one multi-row INSERT per flush.
+
+    A flush happens once flush_size rows are waiting, or flush_interval_ms after the oldest
+    one arrived, whichever comes first; a background thread covers the idle case. Rows that
+    can't be written are spilled to Redis (see log_events) and replayed later.
+    """
+
+    def __init__(self, app, flush_size=500, flush_interval_ms=200):
+        self.app = app
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.rows = []
+        self.oldest = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, row):
+        with self._lock:
+            if not self.rows:
+                self.oldest = time.monotonic()
+            self.rows.append(row)
+            full = len(self.rows) >= self.flush_size
+        if full:
+            self.flush()
+
+    def due(self):
+        return bool(self.rows) and time.monotonic() - self.oldest >= self.flush_interval
+
+    def flush(self):
+        with self._lock:
+            rows, self.rows = self.rows, []
+        if rows:
+            from app.tasks import log_events
+
+            with self.app.app_context():
+                log_events(rows)
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="event-log-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and writes out whatever is still buffered."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        last_replay = time.monotonic()
+        while not self._stopping.wait(self.flush_interval / 2):
+            try:
+                self.flush_if_due()
+                if time.monotonic() - last_replay >= REPLAY_INTERVAL:
+                    last_replay = time.monotonic()
+                    with self.app.app_context():
+                        replay_spilled_events(self.flush_size)
+            except Exception as e:
+                self.app.logger.error(f"Error flushing event logs: {str(e)}")
+
+
+def install_event_sink(app):
+    """
+    Creates and starts this process's event log sink, unless EVENT_SINK_ENABLED is off.
+
+    Only long-lived processes should install one; log_event writes through it from then on.
+    """
+    global _sink
+    if not app.config["EVENT_SINK_ENABLED"]:
+        return None
+    _sink = EventLogSink(app, app.config["EVENT_SINK_FLUSH_SIZE"], app.config["EVENT_SINK_FLUSH_INTERVAL_MS"])
+    _sink.start()
+    return _sink
+
+
+def get_event_sink():
+    """Returns this process's event log sink, or None if log_event should write directly."""
+    return _sink
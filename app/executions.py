@@ -0,0 +1,105 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from flask import current_app
+from app.redis_client import get_redis
+
+# Redis list holding pending API trigger fires for the async dispatcher (app/dispatch.py)
+DISPATCH_QUEUE_KEY = "trigger:api-dispatch"
+
+
+def execution_key(execution_id):
+    return f"execution:{execution_id}"
+
+
+def create_execution(pipe, trigger_id, user_id):
+    """Adds a "queued" execution record to a Redis pipeline and returns its id."""
+    execution_id = uuid.uuid4().hex
+    key = execution_key(execution_id)
+    pipe.hset(key, mapping={
+        "trigger_id": trigger_id if trigger_id is not None else "",
+        "user_id": user_id,
+        "status": "queued",
+        "queued_at": datetime.now(timezone.utc).isoformat(),
+    })
+    pipe.expire(key, current_app.config["EXECUTION_TTL"])
+    return execution_id
+
+
+def execution_failed(result):
+    return "error" in result or result.get("status_code", 500) >= 400
+
+
+def retry_execution(pipe, execution_id, result, attempts, ttl):
+    """Adds marking an execution as "retrying" after a failed attempt, with that attempt's result, to a pipeline."""
+    key = execution_key(execution_id)
+    pipe.hset(key, mapping={"status": "retrying", "attempts": attempts, "result": json.dumps(result)})
+    pipe.expire(key, ttl)
+
+
+def complete_executions(results):
+    """Records the outcome of many executions in one round trip. results holds (execution_id, result) pairs."""
+    if not results:
+        return
+    ttl = current_app.config["EXECUTION_TTL"]
+    completed_at = datetime.now(timezone.utc).isoformat()
+
+    pipe = get_redis().pipeline(transaction=False)
+    for execution_id, result in results:
+        key = execution_key(execution_id)
+        pipe.hset(key, mapping={
+            "status": "failed" if execution_failed(result) else "completed",
+            "attempts": result.get("attempts", 1),
+            "result": json.dumps(result),
+            "completed_at": completed_at,
+        })
+        pipe.expire(key, ttl)
+    pipe.execute()
+
+
+def get_execution(execution_id):
+    """Returns the execution record, or None once it has expired or never existed."""
+    data = get_redis().hgetall(execution_key(execution_id))
+    if not data:
+        return None
+
+    execution = {key.decode(): value.decode() for key, value in data.items()}
+    execution["execution_id"] = execution_id
+    execution["trigger_id"] = int(execution["trigger_id"]) if execution["trigger_id"] else None
+    execution["user_id"] = int(execution["user_id"])
+    if "attempts" in execution:
+        execution["attempts"] = int(execution["attempts"])
+    if "result" in execution:
+        execution["result"] = json.loads(execution["result"])
+    return execution
+
+
+def enqueue_api_fire(trigger_id, user_id, api_endpoint, api_payload, status='active', pipe=None,
+                     idempotency_key=None, max_attempts=None, retry_backoff_ms=None):
+    """
+    Queues one API trigger fire for the async dispatcher and returns its execution id.
+
+    The execution record and the fire are written in a single round trip, or added to
+    `pipe` for the caller to execute. The fire is sent with an Idempotency-Key header,
+    the execution id unless given, and retried per the trigger's policy (app/retries.py).
+    """
+    target = pipe if pipe is not None else get_redis().pipeline(transaction=False)
+    execution_id = create_execution(target, trigger_id, user_id)
+    fire = {
+        "execution_id": execution_id,
+        "trigger_id": trigger_id,
+        "user_id": user_id,
+        "api_endpoint": api_endpoint,
+        "api_payload": api_payload,
+        "status": status,
+        "idempotency_key": idempotency_key or execution_id,
+    }
+    # Left out when the trigger has no policy of its own, so the dispatcher's defaults apply
+    if max_attempts is not None:
+        fire["max_attempts"] = max_attempts
+    if retry_backoff_ms is not None:
+        fire["retry_backoff_ms"] = retry_backoff_ms
+    target.rpush(DISPATCH_QUEUE_KEY, json.dumps(fire))
+    if pipe is None:
+        target.execute()
+    return execution_id
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.metrics import CACHE_REQUESTS
+from app.redis_client import get_redis
+
+# Pub/sub channel carrying the namespaces whose cached entries changed, one per message
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+_settings = None  # (max_bytes, max_entries, ttl), or None while disabled
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+class LocalCache:
+    """
+    Size-bounded in-process LRU cache of serialized responses.
+
+    Every entry belongs to a namespace (e.g. "events:42") and expires after ttl seconds.
+    Entries are evicted least recently used first once either max_entries or max_bytes (the
+    summed length of the cached values) is exceeded. Dropping a namespace bumps its generation,
+    so a value read from a slower tier before the drop can't be stored after it.
+    """
+
+    def __init__(self, max_bytes, max_entries, ttl):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, namespace, expires_at)
+        self._namespaces = {}          # namespace -> set of keys
+        self._generations = {}
+        self._epoch = 0                # Bumped by clear(), which invalidates every namespace at once
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def generation(self, namespace):
+        """Returns a token to pass to set(); take it before reading the value from the slower tier."""
+        return self._epoch, self._generations.get(namespace, 0)
+
+    def set(self, key, value, namespace, generation):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            # The namespace was invalidated while the value was being fetched, so it may be stale
+            if (self._epoch, self._generations.get(namespace, 0)) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, namespace, time.monotonic() + self.ttl)
+            self._namespaces.setdefault(namespace, set()).add(key)
+            self.size += len(value)
+
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for key in self._namespaces.pop(namespace, ()):
+                value = self._entries.pop(key)[0]
+                self.size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+            self._namespaces.clear()
+            self.size = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key):
+        value, namespace, _ = self._entries.pop(key)
+        self.size -= len(value)
+        keys = self._namespaces.get(namespace)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._namespaces[namespace]
+
+
+def _listen(cache):
+    """Drops namespaces named on the invalidation channel, and everything whenever the subscription breaks."""
+    while True:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published before the subscription was up may have been missed
+            cache.clear()
+            while True:
+                # Poll rather than listen(), which would trip the pool's socket timeout when idle
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    cache.invalidate(message["data"].decode())
+        except Exception:
+            cache.clear()
+            time.sleep(1)
+        finally:
+            pubsub.close()
+
+
+def init_local_cache(app):
+    """Takes the local cache's settings from the app's config; the cache itself is created on first use."""
+    global _settings
+    config = app.config
+    if config["LOCAL_CACHE_ENABLED"]:
+        _settings = (config["LOCAL_CACHE_MAX_BYTES"], config["LOCAL_CACHE_MAX_ENTRIES"], config["LOCAL_CACHE_TTL"])
+    else:
+        _settings = None
+
+
+def get_local_cache():
+    """
+    Returns this process's local cache, or None when LOCAL_CACHE_ENABLED is off (or no app configured it).
+
+    The cache and its invalidation listener are created on first use in each process,
+    so a forked worker never inherits its parent's entries or listener thread.
+    """
+    global _cache, _cache_pid
+    if _settings is None:
+        return None
+    if _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache_pid != os.getpid():
+                _cache = LocalCache(*_settings)
+                threading.Thread(target=_listen, args=(_cache,), name="local-cache-invalidation",
+                                 daemon=True).start()
+                _cache_pid = os.getpid()
+    return _cache
+
+
+def publish_invalidation(*namespaces, pipe=None):
+    """Tells every process to drop its local entries for the given namespaces."""
+    target = pipe if pipe is not None else get_redis().pipeline(transaction=False)
+    for namespace in namespaces:
+        target.publish(INVALIDATION_CHANNEL, namespace)
+    if pipe is None:
+        target.execute()
+
+
+def local_cached(key, namespace, build):
+    """Returns the locally cached JSON body for key, or builds, caches and returns it."""
+    cache = get_local_cache()
+    if cache is None:
+        return build()
+    body = cache.get(key)
+    CACHE_REQUESTS.labels("local", "hit" if body is not None else "miss").inc()
+    if body is None:
+        generation = cache.generation(namespace)
+        body = build()
+        if body is not None:  # build() returns None when there is nothing to cache, e.g. a missing row
+            cache.set(key, body, namespace, generation)
+    return body
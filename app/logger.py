@@ -1,41 +1,148 @@
+import copy
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
-import sys
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from multiprocessing.util import Finalize
 import os
+import queue
+import sys
+import threading
+
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only one in every N records whose message contains a given text, e.g.
+    {"Event logged for trigger": 100}; every other record passes through.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.seen = dict.fromkeys(rates, 0)
+
+    def filter(self, record):
+        if not self.rates or not isinstance(record.msg, str):
+            return True
+        for text, every in self.rates.items():
+            if text in record.msg:
+                self.seen[text] += 1
+                return every <= 1 or self.seen[text] % every == 1
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to the background listener without formatting them in the caller's thread.
+
+    Only the message and, if any, the traceback are rendered up front, as they can't cross the queue.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LazyRotatingFileHandler(TimedRotatingFileHandler):
+    """Creates the log directory and opens the file on the first record rather than at setup."""
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def parse_sample_rates(value):
+    """Parses "Event logged for trigger=100,..." into {"Event logged for trigger": 100}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        text, _, every = item.rpartition("=")
+        rates[text.strip()] = int(every)
+    return rates
+
+
+def _stop_listener(listener):
+    # Both atexit and multiprocessing's exit hooks may get here; only the first stop does anything
+    if listener._thread is not None:
+        listener.stop()
+
 
 def setup_logger(app):
-    """Sets up the logger for the application with daily log rotation."""
-    log_level = logging.DEBUG if app.config['FLASK_ENV'] == "development" else logging.INFO
+    """
+    Sets up logging for the application: stdout plus a daily rotated file, written by a background thread.
 
-    # Create a logger object
+    Loggers only put records on an in-memory queue, so requests and jobs never wait on
+    file I/O or the handlers' locks. Safe to call more than once: each process gets one
+    listener, however many apps it creates.
+    """
+    global _listener, _listener_pid
+    log_level = logging.DEBUG if app.config['FLASK_ENV'] == "development" else logging.INFO
     logger = logging.getLogger()
     logger.setLevel(log_level)
 
-    # Create a console handler for streaming logs to stdout
-    ch = logging.StreamHandler(sys.stdout)
-    ch.setLevel(log_level)
-
-    # Create a file handler for daily rotation
-    log_directory = "logs"
-    if not os.path.exists(log_directory):
-        os.makedirs(log_directory)
-    
-    log_file = os.path.join(log_directory, "app.log")
-
-    # Set up timed rotating file handler (rotate every day)
-    fh = TimedRotatingFileHandler(
-        log_file, when="midnight", interval=1, backupCount=7  # Keeps last 7 days of logs
-    )
-    fh.setLevel(logging.INFO)
-
-    # Create a formatter and add it to both handlers
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    ch.setFormatter(formatter)
-    fh.setFormatter(formatter)
-
-    # Add handlers to the logger
-    logger.addHandler(ch)
-    logger.addHandler(fh)
+    with _setup_lock:
+        if _listener_pid != os.getpid():
+            # A forked child inherits the handler but not the listener thread, so start over
+            for handler in [handler for handler in logger.handlers if isinstance(handler, BackgroundQueueHandler)]:
+                logger.removeHandler(handler)
+
+            if app.config["LOG_FORMAT"] == "json":
+                formatter = JsonFormatter()
+            else:
+                formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+            # Create a console handler for streaming logs to stdout
+            ch = logging.StreamHandler(sys.stdout)
+            ch.setLevel(log_level)
+            ch.setFormatter(formatter)
+            handlers = [ch]
+
+            # Create a file handler for daily rotation, keeping the last 7 days of logs
+            log_directory = app.config["LOG_DIR"]
+            if log_directory:
+                fh = LazyRotatingFileHandler(
+                    os.path.join(log_directory, "app.log"), when="midnight", interval=1, backupCount=7
+                )
+                fh.setLevel(logging.INFO)
+                fh.setFormatter(formatter)
+                handlers.append(fh)
+
+            # SimpleQueue.put is reentrant, so logging from a signal handler can't deadlock
+            log_queue = queue.SimpleQueue()
+            qh = BackgroundQueueHandler(log_queue)
+            qh.addFilter(SamplingFilter(parse_sample_rates(app.config["LOG_SAMPLE_EVERY"])))
+            logger.addHandler(qh)
+
+            _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            _listener.start()
+            _listener_pid = os.getpid()
+            # Flush what is still queued on exit, including in multiprocessing children
+            Finalize(None, _stop_listener, args=(_listener,), exitpriority=0)
 
     # Attach logger to Flask's app object
     app.logger = logger
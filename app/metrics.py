@@ -0,0 +1,108 @@
+import os
+import time
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from app.redis_client import get_redis
+
+# With PROMETHEUS_MULTIPROC_DIR set, every process (gunicorn/flask, RQ workers, dispatchers,
+# schedulers) writes its samples to files in that directory and /metrics aggregates them.
+# The directory must exist and be emptied before the processes start (see entrypoint.sh).
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LATENESS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+REQUEST_LATENCY = Histogram(
+    "triggerwise_http_request_duration_seconds", "Time spent handling API requests, up to the response headers.",
+    ["endpoint", "method", "status"],
+)
+DISPATCH_LATENCY = Histogram(
+    "triggerwise_dispatch_duration_seconds", "Duration of outbound API trigger calls.",
+    ["outcome"],
+)
+SCHEDULER_LATENESS = Histogram(
+    "triggerwise_scheduler_lateness_seconds", "Actual minus planned fire time of scheduled triggers.",
+    buckets=LATENESS_BUCKETS,
+)
+# Observed by the engine hooks in app/database.py
+DB_QUERY_DURATION = Histogram(
+    "triggerwise_db_query_duration_seconds", "Duration of database statements.",
+    ["operation"], buckets=FAST_BUCKETS,
+)
+DISPATCH_GUARD_DEFERRALS = Counter(
+    "triggerwise_dispatch_deferrals_total", "API trigger fires held back by the per-host dispatch guard.",
+    ["reason"],
+)
+TRIGGER_RETRIES = Counter(
+    "triggerwise_trigger_retries_total", "Failed trigger fires scheduled for another attempt.",
+    ["kind"],
+)
+DEAD_LETTERS = Counter(
+    "triggerwise_dead_letters_total", "Trigger fires that failed every attempt and were dead-lettered.",
+    ["kind"],
+)
+CACHE_REQUESTS = Counter(
+    "triggerwise_cache_requests_total", "Cache lookups by tier and result.",
+    ["tier", "result"],
+)
+
+
+def dispatch_outcome(status_code=None):
+    """Labels a dispatch by status class ("2xx", "5xx", ...), or "error" when no response came back."""
+    return f"{status_code // 100}xx" if status_code else "error"
+
+
+class QueueDepthCollector:
+    """Reports the backlog of the RQ queues, the API dispatch list, deferred fires and dead letters at scrape time."""
+
+    def collect(self):
+        from rq import Queue
+        from app.dispatch_guard import DEFERRED_KEY
+        from app.executions import DISPATCH_QUEUE_KEY
+        from app.retries import DEAD_LETTER_INDEX_KEY
+
+        depth = GaugeMetricFamily("triggerwise_queue_depth", "Jobs waiting in each queue.", labels=["queue"])
+        pipe = get_redis().pipeline(transaction=False)
+        for name in ("trigger", "archive"):
+            pipe.llen(Queue.redis_queue_namespace_prefix + name)
+        pipe.llen(DISPATCH_QUEUE_KEY)
+        pipe.zcard(DEFERRED_KEY)
+        pipe.zcard(DEAD_LETTER_INDEX_KEY)
+        for name, count in zip(("trigger", "archive", "api-dispatch", "api-dispatch-deferred", "dead-letter"),
+                               pipe.execute()):
+            depth.add_metric([name], count)
+        yield depth
+
+
+def render_metrics():
+    """Returns every metric in the Prometheus text format, aggregated over all processes in multiprocess mode."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    queues = CollectorRegistry()
+    queues.register(QueueDepthCollector())
+    return generate_latest(registry) + generate_latest(queues)
+
+
+def init_metrics(app):
+    """Times every request and exposes /metrics, unless METRICS_ENABLED is off."""
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            REQUEST_LATENCY.labels(request.endpoint or "unmatched", request.method, response.status_code).observe(
+                time.perf_counter() - started)
+        return response
+
+    app.add_url_rule("/metrics", "metrics", lambda: Response(render_metrics(), content_type=CONTENT_TYPE_LATEST))
@@ -29,19 +29,29 @@ class Trigger(db.Model):
     schedule_time = db.Column(db.DateTime, nullable=True)  # For scheduled triggers
     interval = db.Column(db.Integer, nullable=True)  # Interval in minutes for recurring
     recurrence = db.Column(db.Boolean, nullable=True)  # Cron-like for recurring triggers
+    next_fire_at = db.Column(db.DateTime, nullable=True)  # Planned time of the next fire
+    catch_up_policy = db.Column(db.String(20), nullable=True)  # fire_all, coalesce or skip; defaults from config
+    max_attempts = db.Column(db.Integer, nullable=True)  # Attempts per fire before dead-lettering; defaults from config
+    retry_backoff_ms = db.Column(db.Integer, nullable=True)  # First retry delay, doubling per attempt; defaults from config
     api_endpoint = db.Column(db.Text, nullable=True)  # For API triggers
     api_payload = db.Column(db.JSON, nullable=True)  # For API triggers payload
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, nullable=True)
 
 # Event Log Model
 class EventLog(db.Model):
     __tablename__ = 'event_logs'
-    id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = (
+        db.Index('ix_event_logs_trigger_status_created', 'trigger_id', 'status', 'created_at', 'id'),
+        db.Index('ix_event_logs_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},  # Partitioned by day/hour, see app/partitions.py
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     trigger_id = db.Column(db.Integer, db.ForeignKey('triggers.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Copied from the trigger at insert time
     response = db.Column(db.JSON, nullable=True)
     status = db.Column(db.String(50), default="active")  # active, archived, deleted
     trigger = db.relationship('Trigger', backref='logs')
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, primary_key=True, default=lambda: datetime.now(timezone.utc))  # Partition key
     archived_at = db.Column(db.DateTime, nullable=True)
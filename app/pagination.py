@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+from app import db
+
+COUNT_MODES = ("exact", "estimated", "none")
+
+
+def parse_cursor(value):
+    """Parses an `after` cursor of the form "<created_at>,<id>". An empty value starts from the top."""
+    if not value:
+        return None
+    created_at, _, row_id = value.rpartition(",")
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
+def encode_cursor(row):
+    return f"{row.created_at.isoformat()},{row.id}"
+
+
+def keyset_page(query, model, cursor, per_page):
+    """
+    Returns (items, next_cursor) for the page that follows cursor, newest first.
+
+    Seeks on (created_at, id) instead of using OFFSET, so deep pages cost the same as the first one.
+    """
+    order = (model.created_at.desc(), model.id.desc())
+    if cursor is not None:
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(*cursor))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > per_page else None
+    return items, next_cursor
+
+
+def estimated_count(query):
+    """Returns the planner's row estimate for query without running it."""
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.session.get_bind().dialect)
+    plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def total_count(query, mode):
+    """Counts query according to mode: "exact", "estimated" or "none" (returns None)."""
+    if mode == "exact":
+        return query.order_by(None).count()
+    if mode == "estimated":
+        return estimated_count(query)
+    return None
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import text
+from app import db
+
+PARENT_TABLE = "event_logs"
+DEFAULT_PARTITION = "event_logs_default"
+PARTITION_PREFIX = "event_logs_p"
+
+# Partition names encode their lower bound: event_logs_pYYYYMMDD or event_logs_pYYYYMMDDHH
+_INTERVALS = {
+    "day": ("%Y%m%d", timedelta(days=1)),
+    "hour": ("%Y%m%d%H", timedelta(hours=1)),
+}
+
+
+def _utcnow():
+    # created_at is stored as a naive UTC timestamp
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _floor(moment, interval):
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if interval == "day" else moment
+
+
+def partition_name(start, interval):
+    """Returns the partition table name for the range starting at start."""
+    fmt, _ = _INTERVALS[interval]
+    return f"{PARTITION_PREFIX}{start.strftime(fmt)}"
+
+
+def list_partitions():
+    """Returns (name, lower, upper) for every ranged partition of event_logs, oldest first."""
+    names = db.session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :parent"
+    ), {"parent": PARENT_TABLE}).scalars()
+
+    partitions = []
+    for name in names:
+        suffix = name[len(PARTITION_PREFIX):]
+        if not name.startswith(PARTITION_PREFIX) or not suffix.isdigit():
+            continue
+        interval = "day" if len(suffix) == 8 else "hour"
+        fmt, step = _INTERVALS[interval]
+        lower = datetime.strptime(suffix, fmt)
+        partitions.append((name, lower, lower + step))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(start, end, name):
+    """
+    Creates and attaches a partition for [start, end).
+
+    Rows that landed in the default partition for this range are moved into the
+    new table first, otherwise attaching it would fail the default partition's constraint.
+    """
+    bounds = {"start": start, "end": end}
+    db.session.execute(text(
+        f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    db.session.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    db.session.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    db.session.commit()
+
+
+def ensure_partitions(ahead=None, now=None):
+    """
+    Creates partitions for the current interval and the next `ahead` intervals.
+
+    Ranges that overlap an existing partition (for example after switching from
+    daily to hourly partitions) are skipped. Returns the names of created partitions.
+    """
+    config = current_app.config
+    interval = config["EVENT_LOG_PARTITION_INTERVAL"]
+    ahead = config["EVENT_LOG_PARTITIONS_AHEAD"] if ahead is None else ahead
+    _, step = _INTERVALS[interval]
+
+    existing = list_partitions()
+    start = _floor(now or _utcnow(), interval)
+    created = []
+    for _ in range(ahead + 1):
+        end = start + step
+        if not any(lower < end and start < upper for _, lower, upper in existing):
+            name = partition_name(start, interval)
+            create_partition(start, end, name)
+            existing.append((name, start, end))
+            created.append(name)
+        start = end
+
+    if created:
+        current_app.logger.info(f"Created event log partitions: {', '.join(created)}")
+    return created
+
+
+def drop_expired_partitions(older_than):
+    """
+    Removes every partition whose whole range is older than older_than.
+
+    Partitions are dropped, or only detached when EVENT_LOG_RETENTION_MODE is "detach"
+    so they can be archived elsewhere. Stray rows in the default partition are deleted.
+    Returns (names of removed partitions, rows they and the default partition purge held).
+    """
+    detach_only = current_app.config["EVENT_LOG_RETENTION_MODE"] == "detach"
+    removed = []
+    purged = 0
+    for name, _, upper in list_partitions():
+        if upper > older_than:
+            break
+        purged += db.session.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        db.session.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        if not detach_only:
+            db.session.execute(text(f"DROP TABLE {name}"))
+        db.session.commit()
+        removed.append(name)
+
+    result = db.session.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"),
+                                {"cutoff": older_than})
+    purged += result.rowcount
+    db.session.commit()
+
+    if removed:
+        current_app.logger.info(f"Removed expired event log partitions: {', '.join(removed)}")
+    return removed, purged
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+# What to do with fire windows missed while the trigger was overdue (e.g. during an outage):
+#   fire_all - fire every missed window, up to a bounded number (0 fires none, like skip)
+#   coalesce - fire once for all of them
+#   skip     - fire nothing for them; only windows that are still current fire
+CATCH_UP_POLICIES = ("fire_all", "coalesce", "skip")
+
+
+def as_utc(moment):
+    """Returns moment as an aware UTC datetime; naive values are stored as UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def recurrence_step(trigger):
+    """Returns the recurrence period: daily for triggers with a schedule_time, else every `interval` minutes."""
+    if trigger.schedule_time:
+        return timedelta(days=1)
+    if trigger.interval:
+        return timedelta(minutes=trigger.interval)
+    return None
+
+
+def first_fire_time(trigger, now=None):
+    """Returns when a newly created or rescheduled trigger should first fire."""
+    if trigger.schedule_time:
+        return as_utc(trigger.schedule_time)
+    return (now or datetime.now(timezone.utc)) + timedelta(minutes=trigger.interval)
+
+
+def plan_fires(planned, step, now, policy, max_catch_up):
+    """
+    Works out which fires are due for a recurring trigger that was planned for `planned`.
+
+    The next fire time is always derived from the planned time, never from when the
+    job actually ran, so queue latency does not accumulate. Returns (fires, next_fire)
+    where fires lists the planned times to fire now.
+    """
+    # Every window from `planned` up to now is due; the first one after now is next.
+    # Only the windows that actually fire are built, so a long outage costs no memory.
+    missed = int((now - planned) / step) if now >= planned else 0
+    next_fire = planned + step * (missed + 1)
+
+    if policy == "fire_all" and max_catch_up > 0:
+        # Keep the most recent windows so an outage turns into one bounded burst
+        count = min(max_catch_up, missed + 1)
+        fires = [planned + step * index for index in range(missed + 1 - count, missed + 1)]
+    elif policy in ("skip", "fire_all"):
+        # Fire only if this run is still inside its own window (fire_all with no catch-up allowed too)
+        fires = [planned] if missed == 0 else []
+    else:
+        fires = [planned + step * missed]
+    return fires, next_fire
@@ -0,0 +1,69 @@
+from urllib.parse import urlsplit
+
+import redis
+
+_url = None
+_connection_kwargs = None
+_client = None
+_queues = {}
+
+
+def init_redis(app):
+    """Takes the Redis URL and pool settings from the app's config; clients are created on first use."""
+    global _url, _connection_kwargs, _client
+    config = app.config
+    kwargs = {
+        "max_connections": config["REDIS_MAX_CONNECTIONS"],
+        "timeout": config["REDIS_POOL_TIMEOUT"],
+        "socket_timeout": config["REDIS_SOCKET_TIMEOUT"],
+        "socket_connect_timeout": config["REDIS_SOCKET_CONNECT_TIMEOUT"],
+        "health_check_interval": config["REDIS_HEALTH_CHECK_INTERVAL"],
+    }
+    # Keepalive is a TCP option; unix:// connections reject it. redis-py picks hiredis itself when installed.
+    if urlsplit(config["RQ_REDIS_URL"]).scheme in ("redis", "rediss"):
+        kwargs["socket_keepalive"] = True
+
+    # A later app with other settings gets clients of its own
+    if (config["RQ_REDIS_URL"], kwargs) != (_url, _connection_kwargs):
+        _url, _connection_kwargs = config["RQ_REDIS_URL"], kwargs
+        _client = None
+        _queues.clear()
+
+
+def _settings():
+    if _url is None:
+        raise RuntimeError("Redis is not configured yet; create the app (create_app) first.")
+    return _url, dict(_connection_kwargs)
+
+
+def get_redis():
+    """
+    Returns the process-wide Redis client.
+
+    All callers share one blocking connection pool sized by REDIS_MAX_CONNECTIONS, so the
+    number of connections per process is bounded. redis-py resets the pool after a fork.
+    """
+    global _client
+    if _client is None:
+        url, kwargs = _settings()
+        pool = redis.BlockingConnectionPool.from_url(url, **kwargs)
+        _client = redis.Redis(connection_pool=pool)
+    return _client
+
+
+def get_queue(name):
+    """Returns the process-wide RQ queue called name, created on first use."""
+    if name not in _queues:
+        from rq import Queue  # Only processes that enqueue jobs pay for importing rq
+
+        _queues[name] = Queue(name, connection=get_redis())
+    return _queues[name]
+
+
+def create_async_redis():
+    """Returns a new asyncio Redis client with the same pool settings. Create one per event loop."""
+    from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool, Redis as AsyncRedis
+
+    url, kwargs = _settings()
+    pool = AsyncBlockingConnectionPool.from_url(url, **kwargs)
+    return AsyncRedis(connection_pool=pool)
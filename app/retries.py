@@ -0,0 +1,182 @@
+"""
+Retries of failed trigger fires, and the dead-letter store for fires that ran out of them.
+
+A fire that fails (for API triggers an error, a timeout, a 429 or a 5xx response; for
+scheduled triggers any exception) is tried again up to its trigger's max_attempts
+(TRIGGER_MAX_ATTEMPTS by default). The wait before each retry doubles from the trigger's
+retry_backoff_ms (TRIGGER_RETRY_BACKOFF_MS), up to TRIGGER_RETRY_MAX_MS, with jitter so
+a burst of failures doesn't come back all at once. A pending retry never holds a worker:
+API fires wait in the dispatcher's deferred set in Redis, scheduled fires in RQ's
+scheduled job registry. Every attempt of an API fire carries the same Idempotency-Key.
+
+A fire that failed its last attempt, or failed in a way retrying can't fix (any other
+4xx response), is dead-lettered: kept in Redis for DEAD_LETTER_TTL seconds, where its
+owner can list, replay or discard it through /dead-letters/.
+"""
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from app.executions import enqueue_api_fire
+from app.metrics import DEAD_LETTERS
+from app.redis_client import get_queue, get_redis
+
+# Dead letters by id (hash of JSON entries), indexed by the time they failed, overall and per user
+DEAD_LETTER_KEY = "trigger:dead-letter"
+DEAD_LETTER_INDEX_KEY = "trigger:dead-letter:index"
+USER_DEAD_LETTERS_KEY = "trigger:dead-letter:user:{}"
+# Expired dead letters dropped per write
+PRUNE_BATCH_SIZE = 1000
+# Fire fields kept in an API dead letter, enough to send it again
+API_FIRE_FIELDS = ("api_endpoint", "api_payload", "idempotency_key", "max_attempts", "retry_backoff_ms")
+
+# Drops up to ARGV[2] dead letters that failed at or before ARGV[1]
+PRUNE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #expired > 0 then
+    redis.call('ZREM', KEYS[1], unpack(expired))
+    redis.call('HDEL', KEYS[2], unpack(expired))
+end
+return #expired
+"""
+
+
+def backoff_seconds(attempt, base_ms, max_ms):
+    """Exponential backoff with jitter before the retry that follows the attempt-th try."""
+    ceiling = min(max_ms, base_ms * 2 ** min(attempt - 1, 20))
+    return random.uniform(ceiling / 2, ceiling) / 1000
+
+
+def next_retry_delay(config, attempt, max_attempts=None, backoff_ms=None):
+    """
+    Returns the seconds to wait before retrying a fire that failed its attempt-th try, or
+    None when it is out of attempts. max_attempts and backoff_ms are the trigger's policy.
+    """
+    if attempt >= (max_attempts or config["TRIGGER_MAX_ATTEMPTS"]):
+        return None
+    base_ms = config["TRIGGER_RETRY_BACKOFF_MS"] if backoff_ms is None else backoff_ms
+    return backoff_seconds(attempt, base_ms, config["TRIGGER_RETRY_MAX_MS"])
+
+
+def api_dead_letter(fire, result):
+    """Builds the dead letter of an API fire from its last (fire, result)."""
+    return {
+        "kind": "api",
+        "trigger_id": fire["trigger_id"],
+        "user_id": fire["user_id"],
+        "attempts": fire.get("attempt", 1),
+        "result": result,
+        "fire": {field: fire[field] for field in API_FIRE_FIELDS if fire.get(field) is not None},
+    }
+
+
+def add_dead_letters(entries):
+    """
+    Stores dead letters (dicts with kind, trigger_id, user_id, attempts, result and, per
+    kind, fire or planned_at) in one round trip, dropping expired ones. Returns their ids.
+    """
+    if not entries:
+        return []
+    ttl = current_app.config["DEAD_LETTER_TTL"]
+    now = time.time()
+    failed_at = datetime.now(timezone.utc).isoformat()
+
+    redis = get_redis()
+    pipe = redis.pipeline(transaction=False)
+    ids = []
+    for entry in entries:
+        entry = {**entry, "id": uuid.uuid4().hex, "failed_at": failed_at}
+        ids.append(entry["id"])
+        pipe.hset(DEAD_LETTER_KEY, entry["id"], json.dumps(entry))
+        pipe.zadd(DEAD_LETTER_INDEX_KEY, {entry["id"]: now})
+        # Fires whose trigger couldn't be read have no owner to list them for
+        if entry["user_id"] is not None:
+            key = USER_DEAD_LETTERS_KEY.format(entry["user_id"])
+            pipe.zadd(key, {entry["id"]: now})
+            pipe.expire(key, ttl)
+        DEAD_LETTERS.labels(entry["kind"]).inc()
+    redis.register_script(PRUNE_SCRIPT)(keys=[DEAD_LETTER_INDEX_KEY, DEAD_LETTER_KEY],
+                                        args=[now - ttl, PRUNE_BATCH_SIZE], client=pipe)
+    pipe.execute()
+    return ids
+
+
+def list_dead_letters(user_id, limit=50):
+    """Returns a user's dead letters, most recent first."""
+    redis = get_redis()
+    key = USER_DEAD_LETTERS_KEY.format(user_id)
+    ids = redis.zrevrange(key, 0, limit - 1)
+    if not ids:
+        return []
+    entries = redis.hmget(DEAD_LETTER_KEY, ids)
+
+    # Expired entries are only dropped from the overall index, so tidy up the user's here
+    expired = [entry_id for entry_id, entry in zip(ids, entries) if entry is None]
+    if expired:
+        redis.zrem(key, *expired)
+    return [json.loads(entry) for entry in entries if entry is not None]
+
+
+def get_dead_letter(user_id, dead_letter_id):
+    """Returns the dead letter, or None if it doesn't exist, expired or belongs to another user."""
+    entry = get_redis().hget(DEAD_LETTER_KEY, dead_letter_id)
+    if entry is None:
+        return None
+    entry = json.loads(entry)
+    return entry if entry["user_id"] == user_id else None
+
+
+def remove_dead_letter(entry):
+    """Removes a dead letter. Returns False if it was already gone, e.g. replayed or discarded meanwhile."""
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hdel(DEAD_LETTER_KEY, entry["id"])
+    pipe.zrem(DEAD_LETTER_INDEX_KEY, entry["id"])
+    pipe.zrem(USER_DEAD_LETTERS_KEY.format(entry["user_id"]), entry["id"])
+    return bool(pipe.execute()[0])
+
+
+def replay_dead_letter(entry):
+    """
+    Fires a dead letter again, with a fresh set of attempts, and removes it from the store.
+    Returns None if it was already gone.
+
+    API fires are sent as they were, with the same Idempotency-Key, and return the
+    execution to poll. Scheduled fires are run for the time they were planned for, which
+    also puts a broken recurrence chain back on schedule, and return the RQ job.
+    """
+    # Removed first, so replaying the same dead letter twice at once fires it only once
+    if not remove_dead_letter(entry):
+        return None
+    try:
+        if entry["kind"] == "api":
+            fire = entry["fire"]
+            execution_id = enqueue_api_fire(
+                entry["trigger_id"], entry["user_id"], fire["api_endpoint"], fire.get("api_payload"),
+                idempotency_key=fire.get("idempotency_key"), max_attempts=fire.get("max_attempts"),
+                retry_backoff_ms=fire.get("retry_backoff_ms"),
+            )
+            return {"id": entry["id"], "execution_id": execution_id}
+
+        # By name, so the API doesn't import the worker-side task code
+        job = get_queue("trigger").enqueue("app.tasks.execute_scheduled_trigger", entry["trigger_id"],
+                                           planned_at=entry.get("planned_at"))
+        return {"id": entry["id"], "job_id": job.id}
+
+    except Exception:
+        # Keep it for another try
+        restore_dead_letter(entry)
+        raise
+
+
+def restore_dead_letter(entry):
+    redis = get_redis()
+    failed_at = datetime.fromisoformat(entry["failed_at"]).timestamp()
+    pipe = redis.pipeline(transaction=False)
+    pipe.hset(DEAD_LETTER_KEY, entry["id"], json.dumps(entry))
+    pipe.zadd(DEAD_LETTER_INDEX_KEY, {entry["id"]: failed_at})
+    pipe.zadd(USER_DEAD_LETTERS_KEY.format(entry["user_id"]), {entry["id"]: failed_at})
+    pipe.execute()
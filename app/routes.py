@@ -5,12 +5,14 @@ def register_routes(app):
     from .blueprints.trigger_blueprint import blp as TriggerBlueprint
     from .blueprints.user_blueprint import blp as UserBlueprint
     from .blueprints.event_log_blueprint import blp as EventLogBlueprint
+    from .blueprints.dead_letter_blueprint import blp as DeadLetterBlueprint
     
     api = Api(app)
     
     api.register_blueprint(UserBlueprint, url_prefix="")
     api.register_blueprint(TriggerBlueprint, url_prefix="")
     api.register_blueprint(EventLogBlueprint, url_prefix="")
+    api.register_blueprint(DeadLetterBlueprint, url_prefix="")
 
     # Configure Swagger UI to include JWT authentication
     api.spec.components.security_scheme(
@@ -0,0 +1,193 @@
+import signal
+import time
+from datetime import timezone
+
+# Sorted set of trigger ids scored by their next fire time (epoch seconds)
+SCHEDULE_KEY = "trigger:schedule"
+# Pushed to whenever a trigger is scheduled, so a sleeping scheduler re-checks its nearest deadline
+WAKEUP_KEY = "trigger:schedule:wakeup"
+# Shortest wait worth a blocking Redis call
+MIN_BLOCK = 0.01
+# Seconds a scheduler has to enqueue the fires it claimed before another one puts them back
+CLAIM_LEASE = 30
+
+
+def processing_key(key):
+    """Sorted set of claimed trigger ids, scored by when their claim expires."""
+    return f"{key}:processing"
+
+
+def claims_key(key):
+    """Hash of claimed trigger id -> the fire time it was claimed for."""
+    return f"{key}:claims"
+
+
+# Atomically claims up to ARGV[2] members scored at or before ARGV[1]: moves them from the
+# index (KEYS[1]) to the processing set (KEYS[2]) with a lease until ARGV[3], keeping their
+# fire times in KEYS[3]. They stay there until their jobs are enqueued.
+CLAIM_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+for i = 1, #due, 2 do
+    redis.call('ZREM', KEYS[1], due[i])
+    redis.call('ZADD', KEYS[2], ARGV[3], due[i])
+    redis.call('HSET', KEYS[3], due[i], due[i + 1])
+end
+return due
+"""
+
+# Puts claims whose lease expired at or before ARGV[1] (their scheduler died before enqueuing)
+# back into the index at their fire time, unless the trigger was rescheduled meanwhile
+RECOVER_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+    local fire_at = redis.call('HGET', KEYS[3], member)
+    if fire_at then
+        redis.call('ZADD', KEYS[1], 'NX', fire_at, member)
+    end
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('HDEL', KEYS[3], member)
+end
+return #expired
+"""
+
+
+def to_timestamp(moment):
+    """Converts a datetime to epoch seconds; naive datetimes are taken as UTC like the rest of the app."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def schedule_trigger(connection, trigger_id, fire_at, pipe=None):
+    """Sets the next fire time of a trigger, replacing any previous one."""
+    schedule_triggers(connection, {trigger_id: fire_at}, pipe=pipe)
+
+
+def schedule_triggers(connection, fire_times, pipe=None):
+    """Sets the next fire times of many triggers ({trigger_id: fire_at}) with one ZADD and one wake-up."""
+    if not fire_times:
+        return
+    target = pipe if pipe is not None else connection.pipeline(transaction=False)
+    target.zadd(SCHEDULE_KEY, {str(trigger_id): to_timestamp(fire_at) for trigger_id, fire_at in fire_times.items()})
+    target.lpush(WAKEUP_KEY, 1)
+    target.ltrim(WAKEUP_KEY, 0, 0)
+    if pipe is None:
+        target.execute()
+
+
+def unschedule_trigger(connection, trigger_id, pipe=None):
+    target = pipe if pipe is not None else connection.pipeline(transaction=False)
+    target.zrem(SCHEDULE_KEY, str(trigger_id))
+    # A claimed fire must not be put back if its scheduler dies
+    target.zrem(processing_key(SCHEDULE_KEY), str(trigger_id))
+    target.hdel(claims_key(SCHEDULE_KEY), str(trigger_id))
+    if pipe is None:
+        target.execute()
+
+
+class TriggerScheduler:
+    """
+    Moves due triggers from the schedule index onto an RQ queue in bulk.
+
+    Sleeps until the nearest deadline (or until woken by a new schedule), claims every
+    due trigger in one atomic step and enqueues them with a single pipeline. Several
+    schedulers can run against the same index without firing a trigger twice.
+
+    Claimed triggers sit in a processing set under a lease, and are only removed from
+    it in the same transaction that enqueues their jobs. If a scheduler dies in between,
+    its claims expire and are put back in the index at startup or by a running peer, so
+    a fire (and with it a recurrence chain) is never dropped.
+    """
+
+    def __init__(self, connection, queue, func, batch_size=1000, max_sleep=1.0, key=SCHEDULE_KEY,
+                 lease=CLAIM_LEASE):
+        self.connection = connection
+        self.queue = queue
+        self.func = func
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.key = key
+        self.lease = lease
+        self.stopping = False
+        self._keys = [key, processing_key(key), claims_key(key)]
+        self._claim_due = connection.register_script(CLAIM_DUE_SCRIPT)
+        self._recover = connection.register_script(RECOVER_SCRIPT)
+        self._recovered_at = 0.0
+
+    def claim_due(self, now):
+        """Returns [(trigger_id, planned_at)] for up to batch_size due triggers, claiming them for `lease` seconds."""
+        flat = self._claim_due(keys=self._keys, args=[now, self.batch_size, now + self.lease])
+        return [(int(flat[i]), float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+    def recover(self, now):
+        """Puts expired claims back in the index and returns how many there were."""
+        self._recovered_at = now
+        return self._recover(keys=self._keys, args=[now])
+
+    def enqueue(self, due):
+        """Enqueues the claimed fires and releases their claims, in one transaction."""
+        jobs = [
+            self.queue.prepare_data(self.func, args=(trigger_id,), kwargs={"planned_at": planned_at})
+            for trigger_id, planned_at in due
+        ]
+        members = [str(trigger_id) for trigger_id, _ in due]
+        with self.connection.pipeline() as pipe:
+            self.queue.enqueue_many(jobs, pipeline=pipe)
+            pipe.zrem(self._keys[1], *members)
+            pipe.hdel(self._keys[2], *members)
+            pipe.execute()
+
+    def tick(self):
+        """Enqueues due triggers and returns how many were fired."""
+        now = time.time()
+        # This or another scheduler may have died holding claims; leases are checked at startup and once per lease
+        if now - self._recovered_at >= self.lease:
+            self.recover(now)
+        due = self.claim_due(now)
+        if due:
+            self.enqueue(due)
+        return len(due)
+
+    def seconds_until_next(self):
+        nearest = self.connection.zrange(self.key, 0, 0, withscores=True)
+        if not nearest:
+            return self.max_sleep
+        return max(0.0, min(self.max_sleep, nearest[0][1] - time.time()))
+
+    def run(self):
+        while not self.stopping:
+            # A full batch means more triggers may already be due, so go again straight away
+            if self.tick() >= self.batch_size:
+                continue
+
+            wait = self.seconds_until_next()
+            if wait >= MIN_BLOCK:
+                self.connection.blpop(WAKEUP_KEY, timeout=wait)
+            elif wait > 0:
+                # Redis rounds sub-millisecond BLPOP timeouts down to 0, which blocks forever
+                time.sleep(wait)
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+
+def run_scheduler(app):
+    """Runs the trigger scheduler until SIGTERM/SIGINT."""
+    from app.redis_client import get_queue, get_redis
+    from app.tasks import execute_scheduled_trigger
+
+    scheduler = TriggerScheduler(
+        get_redis(), get_queue("trigger"), execute_scheduled_trigger,
+        batch_size=app.config["SCHEDULER_BATCH_SIZE"],
+        max_sleep=app.config["SCHEDULER_MAX_SLEEP"],
+    )
+    signal.signal(signal.SIGTERM, scheduler.request_stop)
+    signal.signal(signal.SIGINT, scheduler.request_stop)
+
+    # Claims left by a scheduler that died before enqueuing them
+    recovered = scheduler.recover(time.time())
+    if recovered:
+        app.logger.warning(f"Put {recovered} expired scheduler claims back in the schedule index.")
+    app.logger.info("Trigger scheduler started.")
+    scheduler.run()
+    app.logger.info("Trigger scheduler stopped.")
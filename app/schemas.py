@@ -1,4 +1,6 @@
 from marshmallow import Schema, fields, validate
+from app.pagination import COUNT_MODES
+from app.recurrence import CATCH_UP_POLICIES
 
 class UserSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -13,6 +15,10 @@ class TriggerSchema(Schema):
     schedule_time = fields.DateTime(allow_none=True)
     interval = fields.Int(allow_none=True)
     recurrence = fields.Bool(allow_none=True)
+    next_fire_at = fields.DateTime(dump_only=True)
+    catch_up_policy = fields.Str(allow_none=True)
+    max_attempts = fields.Int(allow_none=True)
+    retry_backoff_ms = fields.Int(allow_none=True)
     api_endpoint = fields.Str(allow_none=True)
     api_payload = fields.Dict(allow_none=True)
     user_id = fields.Int(required=True)
@@ -26,6 +32,9 @@ class TriggerCreateSchema(Schema):
     schedule_time = fields.DateTime(required=False)
     interval = fields.Int(required=False)
     recurrence = fields.Bool(required=False)
+    catch_up_policy = fields.Str(required=False, validate=validate.OneOf(CATCH_UP_POLICIES))
+    max_attempts = fields.Int(required=False, validate=validate.Range(min=1))
+    retry_backoff_ms = fields.Int(required=False, validate=validate.Range(min=0))
     api_endpoint = fields.Str(required=False)
     api_payload = fields.Dict(required=False)
 
@@ -34,9 +43,32 @@ class TriggerUpdateSchema(Schema):
     schedule_time = fields.DateTime(required=False)
     interval = fields.Int(required=False)
     recurrence = fields.Bool(required=False)
+    catch_up_policy = fields.Str(required=False, validate=validate.OneOf(CATCH_UP_POLICIES))
+    max_attempts = fields.Int(required=False, validate=validate.Range(min=1))
+    retry_backoff_ms = fields.Int(required=False, validate=validate.Range(min=0))
     api_endpoint = fields.Str(required=False)
     api_payload = fields.Dict(required=False)
 
+# Bulk update items name the trigger they change
+class TriggerBulkUpdateSchema(TriggerUpdateSchema):
+    id = fields.Int(required=True)
+
+class TriggerBulkDeleteSchema(Schema):
+    ids = fields.List(fields.Int(), required=True, validate=validate.Length(min=1))
+
+# Outcome of one item of a bulk request, in request order
+class TriggerBulkItemResultSchema(Schema):
+    index = fields.Int()
+    id = fields.Int(allow_none=True)
+    status = fields.Str()  # created, updated, deleted, invalid, not_found, conflict
+    message = fields.Str()
+    execution_id = fields.Str()
+
+class TriggerBulkResultSchema(Schema):
+    succeeded = fields.Int()
+    failed = fields.Int()
+    results = fields.List(fields.Nested(TriggerBulkItemResultSchema))
+
 # Schema for Testing a Trigger
 class TriggerTestSchema(Schema):
     type = fields.Str(required=True)
@@ -44,6 +76,42 @@ class TriggerTestSchema(Schema):
     api_endpoint = fields.Str(required=False)
     api_payload = fields.Dict(required=False)
 
+# Schema for polling an asynchronous trigger execution
+class TriggerExecutionSchema(Schema):
+    execution_id = fields.Str(dump_only=True)
+    trigger_id = fields.Int(allow_none=True)
+    user_id = fields.Int()
+    status = fields.Str()  # queued, retrying, completed, failed
+    attempts = fields.Int()  # Attempts made so far
+    result = fields.Dict(allow_none=True)
+    queued_at = fields.Str()
+    completed_at = fields.Str(allow_none=True)
+
+# Returned with 202 Accepted when the client asks for an asynchronous response
+class TriggerAcceptedSchema(Schema):
+    trigger = fields.Nested(TriggerSchema)
+    execution_id = fields.Str()
+    status_url = fields.Str()
+
+# A fire that failed every attempt, kept for replay
+class DeadLetterSchema(Schema):
+    id = fields.Str(dump_only=True)
+    kind = fields.Str()  # api or scheduled
+    trigger_id = fields.Int(allow_none=True)
+    attempts = fields.Int()
+    result = fields.Dict(allow_none=True)  # Outcome of the last attempt
+    planned_at = fields.Float(allow_none=True)  # Scheduled fires: epoch time the fire was planned for
+    failed_at = fields.Str()
+
+class DeadLetterArgsSchema(Schema):
+    limit = fields.Int(load_default=50, validate=validate.Range(min=1, max=500))
+
+# Returned when a dead letter is replayed: an execution to poll for API fires, an RQ job for scheduled ones
+class DeadLetterReplaySchema(Schema):
+    id = fields.Str()
+    execution_id = fields.Str()
+    job_id = fields.Str()
+
 class EventLogSchema(Schema):
     id = fields.Int(dump_only=True)
     trigger_id = fields.Int(required=True)
@@ -53,6 +121,27 @@ class EventLogSchema(Schema):
     archived_at = fields.DateTime(allow_none=True)
     deleted_at = fields.DateTime(allow_none=True)
 
+# Envelope returned by GET /events/; events are already serialized with EventLogSchema
+class EventLogPageSchema(Schema):
+    events = fields.List(fields.Dict())
+    pagination = fields.Dict()
+
+# Query string of GET /events/
+class EventLogListArgsSchema(Schema):
+    status = fields.Str(load_default="active", validate=validate.OneOf(["active", "archived"]))
+    page = fields.Int(load_default=1, validate=validate.Range(min=1))
+    per_page = fields.Int(load_default=10, validate=validate.Range(min=1, max=100))
+    after = fields.Str()  # Present, even empty, switches to keyset pagination
+    count = fields.Str(validate=validate.OneOf(COUNT_MODES))  # Defaults to exact, or none with after
+
+# Query string of GET /events/export
+class EventLogExportArgsSchema(Schema):
+    format = fields.Str(load_default="ndjson", validate=validate.OneOf(["ndjson", "csv"]))
+    status = fields.Str(validate=validate.OneOf(["active", "archived"]))
+    trigger_id = fields.Int()
+    since = fields.DateTime()  # Inclusive, on created_at
+    until = fields.DateTime()  # Exclusive, on created_at
+
 class UserRegistrationSchema(Schema):
     id = fields.Int(dump_only=True)
     email = fields.Str(required=True, validate=validate.Email())
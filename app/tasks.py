@@ -1,37 +1,129 @@
-from rq import Queue
-from redis import Redis
 from datetime import datetime, timezone, timedelta
-import requests
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models import EventLog, Trigger
+from app.archival import run_archival
+from app.cache import invalidate_trigger, invalidate_user_events
+from app.event_sink import get_event_sink, spill_events
+from app.executions import enqueue_api_fire
+from app.metrics import SCHEDULER_LATENESS, TRIGGER_RETRIES
+from app.redis_client import get_queue, get_redis
+from app.recurrence import as_utc, plan_fires, recurrence_step
+from app.retries import add_dead_letters, next_retry_delay
+from app.scheduler import schedule_trigger
 from flask import current_app
 
-redis_conn = Redis(host='redis_cache')
-trigger_queue = Queue('trigger', connection=redis_conn)
-archive_queue = Queue('archive', connection=redis_conn)
+# Seconds a fire time popped from the scheduler index may differ from the stored next_fire_at
+STALE_FIRE_TOLERANCE = 0.001
 
-def execute_scheduled_trigger(trigger_id, recurrence=False):
+def execute_scheduled_trigger(trigger_id, recurrence=None, planned_at=None, attempt=1):
+    # recurrence is only passed by jobs enqueued before the scheduler index existed;
+    # planned_at is the epoch time the scheduler popped this fire for, kept across retries
     try:
         trigger = Trigger.query.get(trigger_id)
         if not trigger:
             return
 
-        log_event(trigger.id)
-
-        if recurrence:  # Recur if enabled
-            if trigger.schedule_time:
-                next_execution = trigger.schedule_time + timedelta(days=1)
-            else:
-                next_execution = datetime.now(timezone.utc) + timedelta(minutes=trigger.interval)
-            trigger_queue.enqueue_at(next_execution, execute_scheduled_trigger, trigger_id, recurrence)
+        if recurrence is None:
+            recurrence = trigger.recurrence
+
+        now = datetime.now(timezone.utc)
+        current = trigger.next_fire_at
+        reschedule = True
+        if planned_at is not None:
+            planned = datetime.fromtimestamp(planned_at, timezone.utc)
+            # The trigger was edited, or this fire already ran, since the scheduler popped it
+            if current is None or abs(as_utc(current).timestamp() - planned_at) > STALE_FIRE_TOLERANCE:
+                if attempt == 1:
+                    current_app.logger.info(f"Dropped stale fire of trigger {trigger_id} planned for {planned.isoformat()}.")
+                    return
+                # An earlier attempt moved the schedule on before failing; only the logging is left
+                reschedule = False
+            if attempt == 1:
+                SCHEDULER_LATENESS.observe(max(0.0, (now - planned).total_seconds()))
+        else:
+            planned = as_utc(current or trigger.schedule_time or now)
+            # A retry must plan from this fire, not from the next one this attempt may have scheduled
+            planned_at = planned.timestamp()
+
+        step = recurrence_step(trigger) if recurrence and reschedule else None
+        if step:
+            policy = trigger.catch_up_policy or current_app.config["RECURRENCE_CATCH_UP_POLICY"]
+            fires, next_fire = plan_fires(planned, step, now, policy, current_app.config["RECURRENCE_MAX_CATCH_UP"])
+        else:
+            fires, next_fire = [planned], None
+
+        if reschedule:
+            # Schedule the next fire before logging, so a logging failure can't break the chain. Only
+            # move next_fire_at on from the value read above, so a concurrent edit or duplicate fire wins
+            moved = Trigger.query.filter_by(id=trigger_id, next_fire_at=current).update(
+                {"next_fire_at": next_fire.replace(tzinfo=None) if next_fire else None}, synchronize_session=False)
+            db.session.commit()
+            if not moved:
+                current_app.logger.info(f"Dropped stale fire of trigger {trigger_id} planned for {planned.isoformat()}.")
+                return
+
+            # next_fire_at is part of the cached trigger, so invalidate it along with the rescheduling
+            redis_conn = get_redis()
+            pipe = redis_conn.pipeline(transaction=False)
+            invalidate_trigger(trigger.user_id, trigger_id, pipe=pipe)
+            if next_fire:
+                schedule_trigger(redis_conn, trigger_id, next_fire, pipe=pipe)
+            pipe.execute()
+
+        if len(fires) == 1:
+            log_event(trigger.id, response={"planned_at": fires[0].isoformat()}, user_id=trigger.user_id)
+        elif fires:
+            log_events([
+                {"trigger_id": trigger.id, "user_id": trigger.user_id, "status": "active",
+                 "response": {"planned_at": fire.isoformat()}, "created_at": now}
+                for fire in fires
+            ])
 
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error executing scheduled trigger: {str(e)}")
+        retry_scheduled_trigger(trigger_id, planned_at, attempt, e)
 
-def execute_api_trigger(trigger_id, api_endpoint, api_payload):
+def retry_scheduled_trigger(trigger_id, planned_at, attempt, error):
+    """
+    Enqueues the next attempt of a failed scheduled fire after its trigger's backoff, or
+    dead-letters it once out of attempts. The retry waits in RQ's scheduled job registry,
+    not in a worker.
+    """
     try:
-        api_response = requests.post(api_endpoint, json=api_payload)
-        log_event(trigger_id, api_response)
+        try:
+            policy = db.session.query(Trigger.user_id, Trigger.max_attempts, Trigger.retry_backoff_ms).filter_by(
+                id=trigger_id).first()
+        except Exception:
+            # The database may be why the fire failed; retry on the default policy
+            db.session.rollback()
+            policy = None
+        user_id, max_attempts, backoff_ms = policy or (None, None, None)
+
+        delay = next_retry_delay(current_app.config, attempt, max_attempts, backoff_ms)
+        if delay is None:
+            add_dead_letters([{"kind": "scheduled", "trigger_id": trigger_id, "user_id": user_id,
+                               "attempts": attempt, "planned_at": planned_at, "result": {"error": str(error)}}])
+            current_app.logger.error(f"Scheduled trigger {trigger_id} failed {attempt} attempts, dead-lettered.")
+            return
+
+        get_queue('trigger').enqueue_in(timedelta(seconds=delay), execute_scheduled_trigger, trigger_id,
+                                        planned_at=planned_at, attempt=attempt + 1)
+        TRIGGER_RETRIES.labels("scheduled").inc()
+        current_app.logger.info(f"Scheduled trigger {trigger_id} retrying in {delay:.1f}s (attempt {attempt + 1}).")
+
+    except Exception as e:
+        current_app.logger.error(f"Error retrying scheduled trigger: {str(e)}")
+
+# API trigger jobs still on the queue are handed to the dispatcher, whose per-host guard
+# (app/dispatch_guard.py) rate limits and circuit breaks the target instead of a worker waiting on it
+def execute_api_trigger(trigger_id, api_endpoint, api_payload, user_id=None):
+    try:
+        if user_id is None:
+            user_id = db.session.query(Trigger.user_id).filter_by(id=trigger_id).scalar()
+        enqueue_api_fire(trigger_id, user_id, api_endpoint, api_payload)
 
     except Exception as e:
         current_app.logger.error(f"Error executing API trigger: {str(e)}")
@@ -42,75 +134,100 @@ def execute_test_scheduled_trigger(trigger_id):
         if not trigger:
             return
 
-        log_event(trigger.id, status='test')
+        log_event(trigger.id, status='test', user_id=trigger.user_id)
 
     except Exception as e:
         current_app.logger.error(f"Error executing scheduled trigger: {str(e)}")
 
-def execute_test_api_trigger(trigger_id, api_endpoint, api_payload):
+def execute_test_api_trigger(trigger_id, api_endpoint, api_payload, user_id=None):
     try:
-        api_response = requests.post(api_endpoint, json=api_payload)
-        log_event(trigger_id, api_response, status='test')
+        enqueue_api_fire(trigger_id, user_id, api_endpoint, api_payload, status='test')
 
     except Exception as e:
         current_app.logger.error(f"Error executing API trigger: {str(e)}")
 
-def log_event(trigger_id, payload=None, response=None, status='active'):
+def log_event(trigger_id, payload=None, response=None, status='active', user_id=None):
     try:
-        event = EventLog(trigger_id=trigger_id, response=response, status=status)
-        db.session.add(event)
-        db.session.commit()
-        current_app.logger.info(f"-------------- Event logged for trigger {trigger_id} ----------------")
-
-        # Invalidate the cache for this user's event logs
-        user_id = Trigger.query.get(trigger_id).user_id
-        delete_keys_by_pattern(f"events:{user_id}:*")
+        # Callers normally pass the owner along; only look it up when they can't
+        if user_id is None:
+            user_id = Trigger.query.get(trigger_id).user_id
+
+        row = {"trigger_id": trigger_id, "user_id": user_id, "response": response, "status": status,
+               "created_at": datetime.now(timezone.utc)}
+
+        # Workers buffer rows and write them in batches, invalidating the cache once per batch
+        sink = get_event_sink()
+        if sink is not None:
+            sink.add(row)
+            current_app.logger.info(f"-------------- Event buffered for trigger {trigger_id} ----------------")
+            return
 
-        current_app.logger.info(f"Event logged and cache invalidated for user {user_id}.")
+        log_events([row])
+        current_app.logger.info(f"-------------- Event logged for trigger {trigger_id} ----------------")
 
     except Exception as e:
         current_app.logger.error(f"Error logging event: {str(e)}")
 
-def delete_keys_by_pattern(pattern, count=100):
+def log_events(events):
     """
-    Deletes keys from Redis that match the specified pattern.
+    Logs many events with a single multi-row INSERT and one commit.
 
-    Parameters:
-    - redis_client: A Redis client instance (e.g., redis.StrictRedis)
-    - pattern: A pattern to match keys (e.g., "prefix:*")
-    - count: Number of keys to return per scan iteration (default: 100)
+    Each event is a dict of EventLog columns and must include user_id and created_at.
+    If Postgres can't take them they are spilled to Redis and replayed later.
+    Every affected user's cache is invalidated once, however many events they got.
     """
-    cursor = 0
-    while True:
-        cursor, keys = redis_conn.scan(cursor=cursor, match=pattern, count=count)
-        if keys:
-            redis_conn.delete(*keys)
-        if cursor == 0:
-            break
-
-def archive_and_delete_event():
     try:
-        # Archive events older than 2 hours but less than 48 hours
-        events = EventLog.query.filter(EventLog.created_at <= datetime.now(timezone.utc) - timedelta(hours=2),
-                                       EventLog.status == "active").all()
+        db.session.execute(insert(EventLog), events)
+        db.session.commit()
 
+    except IntegrityError as e:
+        # One bad row (e.g. its trigger was deleted meanwhile) must not take the whole batch with it
+        db.session.rollback()
+        if len(events) == 1:
+            current_app.logger.error(f"Error logging event, dropping it: {str(e)}")
+            return
         for event in events:
-            event.status = "archived"
-            event.archived_at = datetime.now(timezone.utc)
-            db.session.commit()
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(EventLog), [event])
+            except IntegrityError as row_error:
+                current_app.logger.error(f"Error logging event, dropping it: {str(row_error)}")
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error logging events, spilling {len(events)} to Redis: {str(e)}")
+        spill_events(events)
+        return
 
-        # Delete events older than 48 hours
-        events_to_delete = EventLog.query.filter(EventLog.created_at <= datetime.now(timezone.utc) - timedelta(hours=48),
-                                                 EventLog.status == "archived").all()
+    try:
+        user_ids = {event["user_id"] for event in events}
+        invalidate_user_events(user_ids)
+        current_app.logger.info(f"{len(events)} events logged and cache invalidated for {len(user_ids)} users.")
 
-        for event in events_to_delete:
-            db.session.delete(event)
+    except Exception as e:
+        current_app.logger.error(f"Error invalidating event log cache: {str(e)}")
 
-        db.session.commit()
+def archive_and_delete_event():
+    try:
+        report = run_archival()
+        current_app.logger.info(
+            f"Event archival complete: {report['archived']} archived ({report['backend']}), {report['purged']} purged, "
+            f"{len(report['partitions_created'])} partitions created, {len(report['partitions_dropped'])} dropped."
+        )
+        return report
 
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error during event archival/deletion: {str(e)}")
 
+    finally:
+        # Keep the maintenance chain going so partitions are always created ahead of time
+        schedule_event_archival_and_deletion()
+
 def schedule_event_archival_and_deletion():
-    """Enqueue the task for event archival and deletion"""
+    """Enqueue the task for event archival and deletion, unless a run is already pending"""
+    archive_queue = get_queue('archive')
+    if archive_queue.scheduled_job_registry.count or archive_queue.count:
+        return
     archive_queue.enqueue_in(timedelta(minutes=2), archive_and_delete_event)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import random
+from rq import SimpleWorker
+from app.event_sink import install_event_sink
+
+
+def prioritized_queues(queue_name, priority):
+    """
+    Returns the queues a worker dedicated to queue_name listens on, highest priority first.
+
+    A worker always takes work from queues ranked above its own, so e.g. archive
+    workers help with a trigger backlog but trigger workers never wait on archival.
+    """
+    if queue_name not in priority:
+        return [queue_name]
+    return priority[:priority.index(queue_name) + 1]
+
+
+class AppWorker(SimpleWorker):
+    """
+    RQ worker that runs every job inside the Flask application context.
+
+    Jobs run in the worker process itself rather than a forked child per job, so event logs
+    can be buffered across jobs by the event log sink; the supervisor restarts a crashed worker.
+    """
+
+    def __init__(self, *args, app=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.app = app
+        self.event_sink = install_event_sink(app)
+
+    def perform_job(self, job, queue):
+        with self.app.app_context():
+            try:
+                return super().perform_job(job, queue)
+            finally:
+                if self.event_sink is not None:
+                    self.event_sink.flush_if_due()
+
+    def teardown(self):
+        # Write out buffered event logs before the worker goes away
+        if self.event_sink is not None:
+            self.event_sink.stop()
+        super().teardown()
+
+
+class WeightedWorker(AppWorker):
+    """Drains several queues, checking them in a random order biased by each queue's weight."""
+
+    def __init__(self, *args, weights=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.weights = weights or {}
+
+    def reorder_queues(self, reference_queue):
+        remaining = list(self._ordered_queues)
+        ordered = []
+        while remaining:
+            weights = [self.weights.get(queue.name, 1) for queue in remaining]
+            queue = random.choices(remaining, weights=weights)[0]
+            remaining.remove(queue)
+            ordered.append(queue)
+        self._ordered_queues = ordered
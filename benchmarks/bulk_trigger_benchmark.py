@@ -0,0 +1,82 @@
+"""
+Benchmark for the bulk trigger API.
+
+Creates, updates and deletes TRIGGERS scheduled triggers through /triggers/bulk in
+one call each, and times SINGLE one-by-one POST /triggers/ calls for comparison.
+Requests go through the Flask test client, so the numbers cover the app, Postgres
+and Redis but not the network. Requires DATABASE_URL and REDIS_URL to point at
+disposable instances.
+
+    python -m benchmarks.bulk_trigger_benchmark --triggers 10000 --single 500
+"""
+import argparse
+import json
+import time
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User
+
+
+def timed(client, method, url, headers, payload):
+    started = time.perf_counter()
+    response = getattr(client, method)(url, headers=headers, json=payload)
+    elapsed = time.perf_counter() - started
+    if response.status_code not in (200, 201):
+        raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+    return response.get_json(), elapsed
+
+
+def run(app, triggers, single):
+    """Runs the benchmark against app and returns the report."""
+    app.config["TRIGGER_BULK_MAX_ITEMS"] = max(app.config["TRIGGER_BULK_MAX_ITEMS"], triggers)
+    client = app.test_client()
+
+    with app.app_context():
+        user = User(email=f"bulk-bench-{int(time.time())}@example.com")
+        user.set_password("benchmark")
+        db.session.add(user)
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+
+    items = [{"type": "scheduled", "interval": 60 + i % 60, "recurrence": True} for i in range(triggers)]
+    created, create_seconds = timed(client, "post", "/triggers/bulk", headers, items)
+    ids = [result["id"] for result in created["results"]]
+
+    updates = [{"id": trigger_id, "interval": 120} for trigger_id in ids]
+    _, update_seconds = timed(client, "put", "/triggers/bulk", headers, updates)
+
+    single_ids, single_seconds = [], 0.0
+    for item in items[:single]:
+        body, elapsed = timed(client, "post", "/triggers/", headers, item)
+        single_ids.append(body["id"])
+        single_seconds += elapsed
+
+    _, delete_seconds = timed(client, "delete", "/triggers/bulk", headers, {"ids": ids})
+    timed(client, "delete", "/triggers/bulk", headers, {"ids": single_ids})
+
+    def rate(count, seconds):
+        return round(count / seconds, 1) if seconds else None
+
+    return {
+        "triggers": triggers,
+        "bulk_create": {"seconds": round(create_seconds, 3), "triggers_per_second": rate(triggers, create_seconds)},
+        "bulk_update": {"seconds": round(update_seconds, 3), "triggers_per_second": rate(triggers, update_seconds)},
+        "bulk_delete": {"seconds": round(delete_seconds, 3), "triggers_per_second": rate(triggers, delete_seconds)},
+        "single_create": {"requests": single, "seconds": round(single_seconds, 3),
+                          "triggers_per_second": rate(single, single_seconds)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--triggers", type=int, default=10_000)
+    parser.add_argument("--single", type=int, default=500, help="One-by-one creates to time for comparison")
+    args = parser.parse_args()
+
+    print(json.dumps(run(create_app(), args.triggers, args.single), indent=2))
+
+
+if __name__ == "__main__":
+    main()
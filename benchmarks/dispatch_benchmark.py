@@ -0,0 +1,95 @@
+"""
+Benchmark for API trigger dispatch.
+
+Starts the stub target, then fires the same number of API triggers through
+today's sequential path (one requests.post per fire) and through AsyncDispatcher,
+and prints fires per second for both. No database or Redis is needed.
+
+    python -m benchmarks.dispatch_benchmark --fires 2000 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import requests
+
+from app.dispatch import AsyncDispatcher
+
+
+def wait_for(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.post(url, json={}, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Stub server at {url} did not start")
+
+
+def sequential(fires):
+    for fire in fires:
+        requests.post(fire["api_endpoint"], json=fire["api_payload"])
+
+
+async def concurrent(fires, concurrency, per_host_limit):
+    async with AsyncDispatcher(concurrency=concurrency, per_host_limit=per_host_limit) as dispatcher:
+        results = await dispatcher.fire_many(fires)
+    failed = [result for _, result in results if result.get("status_code") != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} fires failed, first: {failed[0]}")
+
+
+def timed(fn, fires):
+    started = time.perf_counter()
+    fn(fires)
+    elapsed = time.perf_counter() - started
+    return {"fires": len(fires), "seconds": round(elapsed, 3), "fires_per_second": round(len(fires) / elapsed, 1)}
+
+
+def run(fires, latency_ms, concurrency, per_host_limit, sequential_fires, port):
+    """Starts the stub target, runs the benchmark against it and returns the report."""
+    url = f"http://127.0.0.1:{port}/hook"
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_server",
+                              "--port", str(port), "--latency-ms", str(latency_ms)])
+    try:
+        wait_for(url)
+        make_fires = lambda count: [{"trigger_id": i, "user_id": 1, "api_endpoint": url, "api_payload": {"n": i}}
+                                    for i in range(count)]
+
+        report = {
+            "latency_ms": latency_ms,
+            "sequential": timed(sequential, make_fires(sequential_fires)),
+            "async_dispatcher": timed(
+                lambda batch: asyncio.run(concurrent(batch, concurrency, per_host_limit)),
+                make_fires(fires),
+            ),
+        }
+        report["speedup"] = round(report["async_dispatcher"]["fires_per_second"]
+                                  / report["sequential"]["fires_per_second"], 1)
+        return report
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fires", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=int, default=20, help="Artificial latency of the stub target")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--per-host-limit", type=int, default=200, help="The stub is a single host")
+    parser.add_argument("--sequential-fires", type=int, default=200,
+                        help="Fires for the sequential baseline, which is much slower")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    report = run(args.fires, args.latency_ms, args.concurrency, args.per_host_limit, args.sequential_fires, args.port)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
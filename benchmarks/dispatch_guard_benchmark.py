@@ -0,0 +1,128 @@
+"""
+Benchmark for the per-host dispatch guard: healthy targets next to a bad one.
+
+Starts a healthy stub target and a "bad" one that answers slower than
+API_TRIGGER_TIMEOUT, then runs a real dispatcher process (dispatcher.py) three times:
+healthy fires only, healthy fires mixed with BAD_FIRES to the bad target with the guard
+off, and the same mix with the guard on. Reports how fast the healthy fires complete
+in each run. With the guard on, the bad target's circuit opens, its fires are deferred
+in Redis, and the healthy rate stays close to the healthy-only run.
+
+Uses the real dispatch keys, so REDIS_URL must point at a disposable Redis.
+
+    python -m benchmarks.dispatch_guard_benchmark --fires 2000 --bad-fires 1000
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from app import create_app
+from app.dispatch import ALIVE_KEY, DISPATCHERS_KEY, PROCESSING_KEY
+from app.dispatch_guard import DEFERRED_KEY, HOST_STATE_KEY
+from app.executions import DISPATCH_QUEUE_KEY, enqueue_api_fire, execution_key
+from app.redis_client import get_redis
+from benchmarks.dispatch_benchmark import wait_for
+
+
+def reset(redis):
+    redis.delete(DISPATCH_QUEUE_KEY, DEFERRED_KEY, DISPATCHERS_KEY)
+    keys = [key for pattern in (HOST_STATE_KEY, PROCESSING_KEY, ALIVE_KEY) for key in redis.scan_iter(pattern.format("*"))]
+    if keys:
+        redis.delete(*keys)
+
+
+def enqueue(url, count):
+    pipe = get_redis().pipeline(transaction=False)
+    execution_ids = [enqueue_api_fire(None, 1, url, {"n": i}, status="test", pipe=pipe) for i in range(count)]
+    pipe.execute()
+    return execution_ids
+
+
+def wait_completed(execution_ids, timeout):
+    """Waits until every execution has a result and returns the seconds it took."""
+    redis = get_redis()
+    started = time.perf_counter()
+    pending = list(execution_ids)
+    while pending:
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"{len(pending)} fires still pending after {timeout} s")
+        pipe = redis.pipeline(transaction=False)
+        for execution_id in pending:
+            pipe.hget(execution_key(execution_id), "status")
+        pending = [execution_id for execution_id, status in zip(pending, pipe.execute()) if status == b"queued"]
+        time.sleep(0.05)
+    return time.perf_counter() - started
+
+
+def run_case(healthy_url, bad_url, fires, bad_fires, guard, timeout):
+    """Runs one dispatcher process over the given fires and reports the healthy fires' completion rate."""
+    redis = get_redis()
+    reset(redis)
+    env = {**os.environ, "DISPATCH_GUARD_ENABLED": "true" if guard else "false", "API_TRIGGER_TIMEOUT": str(timeout),
+           "DISPATCH_HOST_RATE": "0", "LOG_DIR": ""}
+    dispatcher = subprocess.Popen([sys.executable, "dispatcher.py"], env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_completed(enqueue(healthy_url, 1), 30)  # Dispatcher is up
+
+        # Bad fires first, so without the guard they are the first to take the dispatcher's slots
+        enqueue(bad_url, bad_fires)
+        healthy = enqueue(healthy_url, fires)
+        elapsed = wait_completed(healthy, 600)
+        return {
+            "fires": fires,
+            "bad_fires": bad_fires,
+            "seconds": round(elapsed, 3),
+            "fires_per_second": round(fires / elapsed, 1),
+            "deferred": redis.zcard(DEFERRED_KEY),
+        }
+    finally:
+        dispatcher.send_signal(signal.SIGTERM)
+        dispatcher.wait()
+        reset(redis)
+
+
+def run(fires, bad_fires, latency_ms, timeout, port):
+    """Starts the stub targets, runs the three cases and returns the report."""
+    healthy_url, bad_url = f"http://127.0.0.1:{port}/hook", f"http://127.0.0.1:{port + 1}/hook"
+    servers = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.stub_server", "--port", str(port),
+                          "--latency-ms", str(latency_ms)]),
+        subprocess.Popen([sys.executable, "-m", "benchmarks.stub_server", "--port", str(port + 1),
+                          "--latency-ms", str(int(timeout * 1000) * 3)]),
+    ]
+    try:
+        wait_for(healthy_url)
+        with create_app("worker").app_context():
+            report = {
+                "healthy_only": run_case(healthy_url, bad_url, fires, 0, True, timeout),
+                "bad_target_no_guard": run_case(healthy_url, bad_url, fires, bad_fires, False, timeout),
+                "bad_target_guard": run_case(healthy_url, bad_url, fires, bad_fires, True, timeout),
+            }
+        report["guard_vs_healthy_only"] = round(report["bad_target_guard"]["fires_per_second"]
+                                                / report["healthy_only"]["fires_per_second"], 2)
+        return report
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fires", type=int, default=2000, help="Fires to the healthy target")
+    parser.add_argument("--bad-fires", type=int, default=1000, help="Fires to the target that times out")
+    parser.add_argument("--latency-ms", type=int, default=20, help="Artificial latency of the healthy target")
+    parser.add_argument("--timeout", type=float, default=2, help="API_TRIGGER_TIMEOUT for the dispatcher")
+    parser.add_argument("--port", type=int, default=8099, help="Healthy target port; the bad one gets the next")
+    args = parser.parse_args()
+
+    report = run(args.fires, args.bad_fires, args.latency_ms, args.timeout, args.port)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
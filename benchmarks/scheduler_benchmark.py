@@ -0,0 +1,93 @@
+"""
+Benchmark for the trigger scheduler.
+
+Schedules TRIGGERS fires spread evenly over the next SPREAD seconds in a scratch
+schedule index, runs TriggerScheduler against a scratch RQ queue until all of them
+are enqueued, and reports triggers fired per second and scheduling lateness
+(enqueue time minus planned fire time). Only Redis is needed.
+
+    python -m benchmarks.scheduler_benchmark --triggers 100000 --spread 30
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from redis import Redis
+from rq import Queue
+
+from app.scheduler import TriggerScheduler
+
+BENCH_KEY = "bench:trigger:schedule"
+BENCH_QUEUE = "bench-trigger"
+
+
+def bench_job(trigger_id, planned_at=None):
+    """Never executed; only its enqueued jobs are inspected."""
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(redis_url, triggers, spread, batch_size):
+    """Runs the benchmark and returns its report."""
+    connection = Redis.from_url(redis_url)
+    queue = Queue(BENCH_QUEUE, connection=connection)
+    connection.delete(BENCH_KEY)
+    queue.empty()
+
+    start = time.time() + 1
+    step = spread / triggers
+    with connection.pipeline(transaction=False) as pipe:
+        for trigger_id in range(triggers):
+            pipe.zadd(BENCH_KEY, {str(trigger_id): start + trigger_id * step})
+        pipe.execute()
+
+    scheduler = TriggerScheduler(connection, queue, bench_job, batch_size=batch_size, key=BENCH_KEY)
+    thread = threading.Thread(target=scheduler.run)
+    thread.start()
+    while queue.count < triggers:
+        time.sleep(0.05)
+    elapsed = time.time() - start
+    scheduler.stopping = True
+    thread.join()
+
+    lateness_ms = []
+    for offset in range(0, triggers, 1000):
+        for job in queue.get_jobs(offset, 1000):
+            lateness_ms.append((job.enqueued_at.timestamp() - job.kwargs["planned_at"]) * 1000)
+
+    report = {
+        "triggers": triggers,
+        "spread_seconds": spread,
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "fires_per_second": round(triggers / elapsed, 1),
+        "lateness_ms": {
+            "p50": round(statistics.median(lateness_ms), 2),
+            "p99": round(percentile(lateness_ms, 0.99), 2),
+            "max": round(max(lateness_ms), 2),
+        },
+    }
+
+    queue.empty()
+    connection.delete(BENCH_KEY)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--triggers", type=int, default=100_000)
+    parser.add_argument("--spread", type=float, default=30.0, help="Seconds over which fires are due")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--redis-url", default="redis://redis_cache:6379/0")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.redis_url, args.triggers, args.spread, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
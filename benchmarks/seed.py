@@ -0,0 +1,83 @@
+"""
+Seeds a disposable database with benchmark data.
+
+Creates USERS users with TRIGGERS_PER_USER triggers each (a mix of recurring
+scheduled triggers and API triggers pointed at the stub target), then EVENTS
+event logs spread over the last HOURS hours. Event volume is skewed so a few
+users and triggers are much hotter than the rest, as in production. Seeded
+users have emails starting with "bench-", which is how the harness finds them.
+
+    python -m benchmarks.seed --users 200 --triggers-per-user 20 --events 2000000
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import insert, text
+
+from app import create_app, db
+from app.models import Trigger, User
+
+EMAIL_PREFIX = "bench-"
+STUB_ENDPOINT = "http://127.0.0.1:8099/hook"
+
+
+def seed(users, triggers_per_user, events, hours=96, chunk_size=500_000):
+    """Inserts the benchmark data and returns what was created. Needs an app context."""
+    run = int(time.time())
+    password = User()
+    password.set_password("benchmark")  # bcrypt is slow, so every user shares one hash
+
+    user_ids = db.session.execute(
+        insert(User).returning(User.id, sort_by_parameter_order=True),
+        [{"email": f"{EMAIL_PREFIX}{run}-{index}@example.com", "password": password.password}
+         for index in range(users)],
+    ).scalars().all()
+
+    triggers = []
+    for user_id in user_ids:
+        for index in range(triggers_per_user):
+            if index % 10 < 7:
+                triggers.append({"user_id": user_id, "type": "scheduled", "interval": 5 + index, "recurrence": True})
+            else:
+                triggers.append({"user_id": user_id, "type": "api", "api_endpoint": STUB_ENDPOINT,
+                                 "api_payload": {"trigger": index}})
+    trigger_ids = db.session.execute(
+        insert(Trigger).returning(Trigger.id, sort_by_parameter_order=True), triggers).scalars().all()
+    db.session.commit()
+
+    # Squaring random() skews the picks towards the first triggers (and so the first users)
+    for offset in range(0, events, chunk_size):
+        db.session.execute(text(
+            "WITH t AS (SELECT array_agg(id ORDER BY id) AS ids, array_agg(user_id ORDER BY id) AS users "
+            "           FROM triggers WHERE id = ANY(:trigger_ids)) "
+            "INSERT INTO event_logs (trigger_id, user_id, status, created_at, response) "
+            "SELECT t.ids[s.k], t.users[s.k], 'active', "
+            "       (now() AT TIME ZONE 'utc') - random() * (:hours * interval '1 hour'), "
+            "       '{\"status_code\": 200, \"elapsed_ms\": 12.5}'::json "
+            "FROM t, LATERAL (SELECT 1 + floor(power(random(), 2) * array_length(t.ids, 1))::int AS k "
+            "                 FROM generate_series(1, :rows)) s"
+        ), {"trigger_ids": trigger_ids, "hours": hours, "rows": min(chunk_size, events - offset)})
+        db.session.commit()
+
+    return {"users": len(user_ids), "triggers": len(trigger_ids), "events": events, "hours": hours}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--triggers-per-user", type=int, default=20)
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--hours", type=int, default=96, help="Spread event logs over this many past hours")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        report = seed(args.users, args.triggers_per_user, args.events, args.hours)
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
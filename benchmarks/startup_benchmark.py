@@ -0,0 +1,90 @@
+"""
+Cold start benchmark: how long a fresh interpreter takes to import the app and run create_app().
+
+Each run is a new Python process, so nothing is warm in memory (the .pyc files and the
+OS page cache are, as on any restart). Reports the p50 and max time per role, and which
+packages the import time goes to according to `python -X importtime`. Exits with
+status 1 when a role's p50 is over --budget-ms. Nothing connects to Postgres or Redis.
+
+    python -m benchmarks.startup_benchmark --runs 10 --budget-ms 1000
+
+To look at the full import tree of one role:
+
+    python -X importtime -c "from app import create_app; create_app('web')" 2> importtime.txt
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROLES = ("web", "worker")
+
+# Prints "<import ms> <import + create_app ms>" as its last line
+PROBE = (
+    "import time; started = time.perf_counter()\n"
+    "from app import create_app; imported = time.perf_counter()\n"
+    "create_app({role!r}); finished = time.perf_counter()\n"
+    "print(f'{{(imported - started) * 1000:.3f}} {{(finished - started) * 1000:.3f}}')\n"
+)
+
+
+def probe(role, importtime=False):
+    """Runs create_app(role) in a fresh interpreter and returns (import ms, total ms, importtime output)."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE.format(role=role)]
+    # No log file, so runs don't pay for (or race on) the log directory
+    result = subprocess.run(command, capture_output=True, text=True, check=True, env={**os.environ, "LOG_DIR": ""})
+    imported, total = map(float, result.stdout.strip().splitlines()[-1].split())
+    return imported, total, result.stderr
+
+
+def import_costs(importtime_output, top=15):
+    """Sums the self time of every imported module by top-level package, slowest first, in ms."""
+    costs = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".", 1)[0]
+        costs[package] = costs.get(package, 0) + int(self_us)
+    ranked = sorted(costs.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {package: round(us / 1000, 1) for package, us in ranked}
+
+
+def run(runs, roles=ROLES):
+    """Runs the benchmark and returns its report."""
+    report = {}
+    for role in roles:
+        probe(role)  # Compile any stale .pyc files first
+        samples = [probe(role) for _ in range(runs)]
+        report[role] = {
+            "runs": runs,
+            "import_p50_ms": round(statistics.median(imported for imported, _, _ in samples), 1),
+            "p50_ms": round(statistics.median(total for _, total, _ in samples), 1),
+            "max_ms": round(max(total for _, total, _ in samples), 1),
+            "import_ms_by_package": import_costs(probe(role, importtime=True)[2]),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--role", choices=ROLES, help="Only measure this role")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Max p50 of import + create_app() per role")
+    args = parser.parse_args()
+
+    report = run(args.runs, [args.role] if args.role else ROLES)
+    print(json.dumps(report, indent=2))
+
+    over = [role for role, result in report.items() if result["p50_ms"] > args.budget_ms]
+    for role in over:
+        print(f"{role}: cold create_app() p50 {report[role]['p50_ms']} ms is over the {args.budget_ms:g} ms budget",
+              file=sys.stderr)
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Local stub HTTP target for API trigger benchmarks.
+
+Accepts any POST and answers 200 after an optional artificial delay.
+
+    python -m benchmarks.stub_server --port 8099 --latency-ms 20
+"""
+import argparse
+import asyncio
+
+from aiohttp import web
+
+
+def make_app(latency_ms=0):
+    async def handle(request):
+        await request.read()
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.latency_ms), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+from dotenv import load_dotenv
+
+load_dotenv()  # Before the app reads its settings from the environment
+
+from app import create_app
+from app.dispatch import run_dispatcher
+
+if __name__ == "__main__":
+
+    app = create_app("worker")
+    run_dispatcher(app)
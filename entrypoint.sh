@@ -6,19 +6,40 @@
 # done
 # echo "PostgreSQL started!"
 
-# Run database migrations
-echo "Running database migrations..."
-flask db upgrade
+# Start every process with an empty metrics directory, so /metrics only aggregates live samples
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
 
-# Start RQ workers for specific queues with options
-echo "Starting Redis Queue workers..."
+# Usage: entrypoint.sh [all|web|worker]
+#   web     the API under gunicorn (gunicorn.conf.py runs the migrations before forking)
+#   worker  the worker supervisor (RQ workers for every queue plus the API trigger dispatcher)
+#   all     both in one container (the default)
+ROLE="${1:-all}"
 
-# Worker for 'trigger' queue with scheduler
-rq worker trigger  &
+case "$ROLE" in
+    web)
+        echo "Starting web server..."
+        exec gunicorn -c gunicorn.conf.py main:app
+        ;;
+    worker)
+        echo "Starting workers..."
+        exec python worker.py
+        ;;
+    all)
+        # Migrate before the workers start, so neither side sees an old schema
+        echo "Running database migrations..."
+        flask db upgrade || exit 1
 
-# Worker for 'alert' queue without scheduler
-rq worker archive &
+        echo "Starting workers..."
+        python worker.py &
 
-# Start the Flask app
-echo "Starting Flask app..."
-exec flask run --host=0.0.0.0
+        echo "Starting web server..."
+        WEB_RUN_MIGRATIONS=false exec gunicorn -c gunicorn.conf.py main:app
+        ;;
+    *)
+        echo "Unknown role: $ROLE (expected all, web or worker)" >&2
+        exit 1
+        ;;
+esac
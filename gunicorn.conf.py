@@ -0,0 +1,73 @@
+"""
+Gunicorn settings for the web role.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Workers are forked from a master that has already imported the app (preload), run the
+migrations once before forking, and open their database and Redis connections before
+they accept traffic. Each worker holds up to WEB_DB_POOL_SIZE + WEB_DB_MAX_OVERFLOW
+database connections, so size WEB_WORKERS * that against Postgres' max_connections.
+
+Reloading: `kill -HUP <master>` replaces the workers gracefully, but with preload on they
+are forked from the master's already imported code. To deploy new code without dropping
+requests, send USR2 (starts a new master next to the old one) and then TERM to the old
+master, or set WEB_PRELOAD=false so HUP re-imports the app.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")                    # "gthread", or "gevent" (pip install gevent)
+workers = int(os.getenv("WEB_WORKERS", 0)) or max(2, multiprocessing.cpu_count())
+threads = int(os.getenv("WEB_THREADS", 4))                                 # Per gthread worker, keep <= WEB_DB_POOL_SIZE
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", 1000))        # Per gevent worker
+timeout = int(os.getenv("WEB_TIMEOUT", 30))                                # Seconds before a silent worker is restarted
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))              # Seconds to finish requests on TERM/HUP
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 10000))                   # Recycle workers to bound memory growth
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 1000))
+# gevent has to patch the standard library before the app is imported, so it can't preload
+preload_app = os.getenv("WEB_PRELOAD", "false" if worker_class == "gevent" else "true").lower() == "true"
+accesslog = os.getenv("WEB_ACCESS_LOG") or None                            # "-" for stdout; off by default
+
+
+def on_starting(server):
+    """Runs the migrations once in the master, before any worker is forked."""
+    if os.getenv("WEB_RUN_MIGRATIONS", "true").lower() == "true":
+        server.log.info("Running database migrations...")
+        # In a separate process, so the master doesn't import the app just for this
+        subprocess.run([sys.executable, "-m", "flask", "db", "upgrade"], check=True,
+                       env={**os.environ, "FLASK_APP": os.getenv("FLASK_APP", "main.py")})
+
+
+def post_worker_init(worker):
+    """
+    Prepares a freshly forked worker before it accepts requests: restarts the log writer
+    thread (threads don't survive fork), drops any database connections inherited from the
+    master, and opens this worker's own database and Redis connections.
+    """
+    from sqlalchemy import text
+    from app import db
+    from app.logger import setup_logger
+    from app.redis_client import get_redis
+
+    app = worker.wsgi
+    setup_logger(app)
+    with app.app_context():
+        db.engine.dispose(close=False)
+        connections = [db.engine.connect() for _ in range(min(worker.cfg.threads, db.engine.pool.size()))]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+            connection.close()
+    get_redis().ping()
+    app.logger.info(f"Web worker {worker.pid} warmed up.")
+
+
+def child_exit(server, worker):
+    # Let /metrics drop the live gauges of workers that are gone
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
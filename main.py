@@ -1,6 +1,12 @@
+from dotenv import load_dotenv
+
+load_dotenv()  # Before the app reads its settings from the environment
+
 from app import create_app
 
+# Served by gunicorn in production (gunicorn -c gunicorn.conf.py main:app)
 app = create_app()
 
 if __name__ == "__main__":
+    # Development server only
     app.run(debug=True)
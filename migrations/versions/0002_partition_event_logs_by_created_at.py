@@ -0,0 +1,92 @@
+"""Partition event_logs by created_at
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:12:40.318204
+
+"""
+from datetime import datetime, timedelta, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Initial partitions are daily; app/partitions.py takes over from here and may switch to hourly
+PARTITIONS_AHEAD = 3
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    op.execute("ALTER TABLE event_logs RENAME TO event_logs_unpartitioned")
+    op.execute("ALTER TABLE event_logs_unpartitioned RENAME CONSTRAINT event_logs_pkey TO event_logs_unpartitioned_pkey")
+    op.execute("ALTER TABLE event_logs_unpartitioned DROP CONSTRAINT event_logs_trigger_id_fkey")
+    op.execute("ALTER SEQUENCE event_logs_id_seq OWNED BY NONE")
+
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE event_logs (
+            id INTEGER NOT NULL DEFAULT nextval('event_logs_id_seq'),
+            trigger_id INTEGER NOT NULL REFERENCES triggers (id),
+            response JSON,
+            status VARCHAR(50),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            archived_at TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE event_logs_id_seq OWNED BY event_logs.id")
+
+    # Catches rows outside every ranged partition if partition maintenance falls behind
+    op.execute("CREATE TABLE event_logs_default PARTITION OF event_logs DEFAULT")
+
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    days = set(conn.execute(sa.text(
+        "SELECT DISTINCT date_trunc('day', coalesce(created_at, now() AT TIME ZONE 'utc')) FROM event_logs_unpartitioned"
+    )).scalars())
+    days.update(today + timedelta(days=offset) for offset in range(PARTITIONS_AHEAD + 1))
+
+    for day in sorted(days):
+        op.execute(
+            f"CREATE TABLE event_logs_p{day.strftime('%Y%m%d')} PARTITION OF event_logs "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+
+    op.execute("""
+        INSERT INTO event_logs (id, trigger_id, response, status, created_at, archived_at)
+        SELECT id, trigger_id, response, status, coalesce(created_at, now() AT TIME ZONE 'utc'), archived_at
+        FROM event_logs_unpartitioned
+    """)
+    op.drop_table('event_logs_unpartitioned')
+
+
+def downgrade():
+    op.execute("ALTER TABLE event_logs RENAME TO event_logs_partitioned")
+    op.execute("ALTER TABLE event_logs_partitioned RENAME CONSTRAINT event_logs_pkey TO event_logs_partitioned_pkey")
+    op.execute("ALTER TABLE event_logs_partitioned DROP CONSTRAINT event_logs_trigger_id_fkey")
+    op.execute("ALTER SEQUENCE event_logs_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE event_logs (
+            id INTEGER NOT NULL DEFAULT nextval('event_logs_id_seq'),
+            trigger_id INTEGER NOT NULL REFERENCES triggers (id),
+            response JSON,
+            status VARCHAR(50),
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            archived_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT event_logs_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE event_logs_id_seq OWNED BY event_logs.id")
+
+    op.execute("""
+        INSERT INTO event_logs (id, trigger_id, response, status, created_at, archived_at)
+        SELECT id, trigger_id, response, status, created_at, archived_at FROM event_logs_partitioned
+    """)
+    # Dropping the parent drops every partition with it
+    op.drop_table('event_logs_partitioned')
@@ -0,0 +1,29 @@
+"""Add event log and trigger indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:05:52.640917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Created on the partitioned parent, so every current and future partition gets it.
+    # Trailing id lets keyset pagination seek on (created_at, id) straight from the index.
+    op.create_index('ix_event_logs_trigger_status_created', 'event_logs',
+                    ['trigger_id', 'status', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_triggers_user_id'), 'triggers', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_triggers_user_id'), table_name='triggers')
+    op.drop_index('ix_event_logs_trigger_status_created', table_name='event_logs')
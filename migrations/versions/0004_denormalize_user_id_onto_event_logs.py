@@ -0,0 +1,51 @@
+"""Denormalize user_id onto event_logs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:21:07.118534
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade():
+    # Nullable so the column can be added without rewriting or locking the table for long
+    op.add_column('event_logs', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('event_logs_user_id_fkey', 'event_logs', 'users', ['user_id'], ['id'])
+
+    # Backfill in id-ranged batches, each committed on its own, so writers are never blocked for long
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            upper_id = conn.execute(sa.text(
+                "SELECT max(id) FROM (SELECT id FROM event_logs WHERE id > :last_id ORDER BY id LIMIT :batch_size) AS chunk"
+            ), {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE}).scalar()
+            if upper_id is None:
+                break
+
+            conn.execute(sa.text(
+                "UPDATE event_logs SET user_id = triggers.user_id FROM triggers "
+                "WHERE triggers.id = event_logs.trigger_id AND event_logs.user_id IS NULL "
+                "AND event_logs.id > :last_id AND event_logs.id <= :upper_id"
+            ), {"last_id": last_id, "upper_id": upper_id})
+            last_id = upper_id
+
+    op.create_index('ix_event_logs_user_status_created', 'event_logs',
+                    ['user_id', 'status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_event_logs_user_status_created', table_name='event_logs')
+    op.drop_constraint('event_logs_user_id_fkey', 'event_logs', type_='foreignkey')
+    op.drop_column('event_logs', 'user_id')
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+# Settings are read when app.config is imported, so point the app at test resources first.
+# Tests flush their Redis database, so they get one of their own rather than REDIS_URL.
+TEST_DIR = tempfile.mkdtemp(prefix="triggerwise-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{TEST_DIR}/test.db")
+os.environ["REDIS_URL"] = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+os.environ["WEB_DB_STATEMENT_TIMEOUT_MS"] = "0"     # Passed as a Postgres startup option, which SQLite rejects
+os.environ["WORKER_DB_STATEMENT_TIMEOUT_MS"] = "0"
+os.environ["LOG_DIR"] = ""
+os.environ["EVENT_ARCHIVE_DIR"] = os.path.join(TEST_DIR, "archive")
+
+import redis as redis_py  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.dispatch import _consume  # noqa: E402
+from app.local_cache import get_local_cache  # noqa: E402
+from app.models import Trigger, User  # noqa: E402
+from app.partitions import DEFAULT_PARTITION  # noqa: E402
+
+# SQLite only autoincrements a lone INTEGER PRIMARY KEY, not event_logs' (id, created_at) key
+SQLITE_EVENT_LOGS = """
+CREATE TABLE event_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trigger_id INTEGER NOT NULL REFERENCES triggers (id),
+    user_id INTEGER REFERENCES users (id),
+    response JSON,
+    status VARCHAR(50),
+    created_at DATETIME NOT NULL,
+    archived_at DATETIME
+)
+"""
+
+
+@pytest.fixture
+def redis():
+    """The test Redis database, emptied; skips the test when Redis isn't reachable."""
+    connection = redis_py.Redis.from_url(os.environ["REDIS_URL"])
+    try:
+        connection.ping()
+    except redis_py.exceptions.ConnectionError:
+        pytest.skip(f"Redis isn't reachable at {os.environ['REDIS_URL']}")
+    connection.flushdb()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def app(redis, tmp_path):
+    app = create_app("web")
+    app.config.update(EVENT_ARCHIVE_BACKEND="cold", EVENT_ARCHIVE_DIR=str(tmp_path))
+    # The local cache lives as long as the process, and the Redis its entries came from was just flushed
+    local_cache = get_local_cache()
+    if local_cache is not None:
+        local_cache.clear()
+    return app
+
+
+@pytest.fixture
+def database(app):
+    """Empty users, triggers and event_logs tables for the test."""
+    with app.app_context():
+        db.drop_all()
+        if db.engine.dialect.name == "sqlite":
+            db.metadata.create_all(db.engine, tables=[User.__table__, Trigger.__table__])
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(SQLITE_EVENT_LOGS)
+        else:
+            db.create_all()
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF event_logs DEFAULT")
+    yield db
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app, database):
+    """Creates a user and returns (user_id, Authorization headers)."""
+    from flask_jwt_extended import create_access_token
+
+    def make_user(email="user@example.com"):
+        with app.app_context():
+            user = User(email=email)
+            user.set_password("secret")
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+    return make_user
+
+
+class ApiTarget:
+    """An HTTP endpoint on a thread of its own. Answers POSTs with the queued statuses in turn, then 200."""
+
+    def __init__(self):
+        self.statuses = []
+        self.requests = []  # (headers, JSON body) of every call
+        self._socket = socket.socket()
+        self._socket.bind(("127.0.0.1", 0))
+        self.url = "http://127.0.0.1:%d/hook" % self._socket.getsockname()[1]
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    async def _handle(self, request):
+        self.requests.append((dict(request.headers), await request.json() if request.can_read_body else None))
+        return web.Response(status=self.statuses.pop(0) if self.statuses else 200)
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        application = web.Application()
+        application.router.add_post("/hook", self._handle)
+        runner = web.AppRunner(application)
+        self._loop.run_until_complete(runner.setup())
+        self._loop.run_until_complete(web.SockSite(runner, self._socket).start())
+        self._loop.run_forever()
+        self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+@pytest.fixture
+def api_target():
+    target = ApiTarget()
+    target.start()
+    yield target
+    target.stop()
+
+
+@pytest.fixture
+def dispatch(app):
+    """Runs a dispatcher until until() holds or timeout seconds pass, then stops it as SIGTERM would."""
+
+    def dispatch(until, timeout=5.0):
+        async def main():
+            stop = asyncio.Event()
+            consumer = asyncio.create_task(_consume(app, stop))
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and not consumer.done():
+                with app.app_context():
+                    if until():
+                        break
+                await asyncio.sleep(0.05)
+            stop.set()
+            await consumer
+        asyncio.run(main())
+    return dispatch
@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app import db
+from app.executions import DISPATCH_QUEUE_KEY
+from app.models import EventLog, Trigger
+from app.scheduler import SCHEDULE_KEY
+
+SCHEDULED = {"type": "scheduled", "interval": 5}
+API = {"type": "api", "api_endpoint": "http://127.0.0.1:1/hook", "api_payload": {"a": 1}}
+
+
+@pytest.fixture
+def user(app, make_user):
+    return make_user()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create(client, headers, items):
+    return client.post("/triggers/bulk", json=items, headers=headers)
+
+
+def test_bulk_create_inserts_valid_items_in_order(app, client, user):
+    user_id, headers = user
+    response = create(client, headers, [SCHEDULED, {"type": "scheduled"}, API])
+    assert response.status_code == 200
+    assert (response.json["succeeded"], response.json["failed"]) == (2, 1)
+    first, invalid, api = response.json["results"]
+    assert (first["index"], first["status"]) == (0, "created")
+    assert (invalid["index"], invalid["status"], invalid["id"]) == (1, "invalid", None)
+    assert (api["index"], api["status"]) == (2, "created")
+    assert api["id"] > first["id"]
+    with app.app_context():
+        assert [trigger.user_id for trigger in Trigger.query.order_by(Trigger.id)] == [user_id, user_id]
+
+
+def test_bulk_create_schedules_and_queues_in_one_go(client, user, redis):
+    _, headers = user
+    scheduled, api = create(client, headers, [SCHEDULED, API]).json["results"]
+    assert redis.zscore(SCHEDULE_KEY, str(scheduled["id"])) is not None
+    assert redis.zscore(SCHEDULE_KEY, str(api["id"])) is None
+    assert redis.llen(DISPATCH_QUEUE_KEY) == 1
+    assert api["execution_id"]
+
+
+def test_bulk_create_rejects_too_many_items(app, client, user):
+    _, headers = user
+    app.config["TRIGGER_BULK_MAX_ITEMS"] = 2
+    assert create(client, headers, [SCHEDULED] * 3).status_code == 400
+    with app.app_context():
+        assert Trigger.query.count() == 0
+
+
+def test_bulk_update_changes_only_the_users_triggers(app, client, user, make_user, redis):
+    _, headers = user
+    _, other = make_user("other@example.com")
+    [mine] = create(client, headers, [SCHEDULED]).json["results"]
+    [theirs] = create(client, other, [SCHEDULED]).json["results"]
+    scheduled_at = redis.zscore(SCHEDULE_KEY, str(mine["id"]))
+
+    response = client.put("/triggers/bulk", json=[{"id": mine["id"], "interval": 60},
+                                                  {"id": theirs["id"], "interval": 60}], headers=headers)
+    assert [result["status"] for result in response.json["results"]] == ["updated", "not_found"]
+    with app.app_context():
+        assert db.session.get(Trigger, mine["id"]).interval == 60
+        assert db.session.get(Trigger, theirs["id"]).interval == 5
+    assert redis.zscore(SCHEDULE_KEY, str(mine["id"])) > scheduled_at
+
+
+def test_bulk_update_unschedules_triggers_that_stop_being_scheduled(client, user, redis):
+    _, headers = user
+    [created] = create(client, headers, [SCHEDULED]).json["results"]
+    client.put("/triggers/bulk", json=[{"id": created["id"], "interval": 0}], headers=headers)
+    assert redis.zscore(SCHEDULE_KEY, str(created["id"])) is None
+
+
+def test_bulk_delete_keeps_triggers_with_event_logs(app, client, user, redis):
+    user_id, headers = user
+    kept, deleted = create(client, headers, [SCHEDULED, SCHEDULED]).json["results"]
+    with app.app_context():
+        db.session.add(EventLog(trigger_id=kept["id"], user_id=user_id, created_at=datetime.now(timezone.utc)))
+        db.session.commit()
+
+    response = client.delete("/triggers/bulk", json={"ids": [kept["id"], deleted["id"], 12345]}, headers=headers)
+    assert [result["status"] for result in response.json["results"]] == ["conflict", "deleted", "not_found"]
+    assert (response.json["succeeded"], response.json["failed"]) == (1, 2)
+    with app.app_context():
+        assert db.session.get(Trigger, deleted["id"]) is None
+    assert redis.zscore(SCHEDULE_KEY, str(deleted["id"])) is None
+    assert redis.zscore(SCHEDULE_KEY, str(kept["id"])) is not None
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app import dispatch as dispatch_module
+from app.dispatch import ALIVE_KEY, DISPATCHERS_KEY, ClaimedFires
+from app.executions import DISPATCH_QUEUE_KEY, enqueue_api_fire, get_execution
+from app.redis_client import create_async_redis
+
+FIRES = [{"execution_id": str(index), "trigger_id": None, "user_id": 1} for index in range(5)]
+BEAT = 0.05
+
+
+@pytest.fixture
+def queued(app, redis):
+    redis.rpush(DISPATCH_QUEUE_KEY, *(json.dumps(fire) for fire in FIRES))
+
+
+def run(app, test):
+    """Runs test(redis) with an asyncio Redis client of the app's, on a fresh event loop."""
+    async def main():
+        redis = create_async_redis()
+        try:
+            return await test(redis)
+        finally:
+            await redis.aclose()
+    with app.app_context():
+        return asyncio.run(main())
+
+
+def queue_ids(redis):
+    return [json.loads(item)["execution_id"] for item in redis.lrange(DISPATCH_QUEUE_KEY, 0, -1)]
+
+
+def test_pop_moves_fires_to_the_processing_list(app, redis, queued):
+    async def test(async_redis):
+        claims = ClaimedFires(async_redis)
+        fires = await claims.pop(3, block=False)
+        return claims.key, [fire["execution_id"] for fire in fires]
+
+    key, popped = run(app, test)
+    assert popped == ["0", "1", "2"]
+    assert redis.llen(key) == 3
+    assert queue_ids(redis) == ["3", "4"]
+
+
+def test_ack_removes_only_the_finished_fires(app, redis, queued):
+    async def test(async_redis):
+        claims = ClaimedFires(async_redis)
+        fires = await claims.pop(3, block=False)
+        await claims.ack_now(fires[:2])
+        return claims.key
+
+    key = run(app, test)
+    assert [json.loads(item)["execution_id"] for item in redis.lrange(key, 0, -1)] == ["2"]
+
+
+def test_claims_of_a_dead_dispatcher_go_back_to_the_head_in_order(app, redis, queued):
+    async def test(async_redis):
+        dead = ClaimedFires(async_redis)
+        await dead.heartbeat()
+        await dead.pop(3, block=False)
+        await async_redis.delete(ALIVE_KEY.format(dead.id))  # As if its heartbeat had expired
+        return await ClaimedFires(async_redis).heartbeat(), dead.id
+
+    recovered, dead_id = run(app, test)
+    assert recovered == 3
+    assert queue_ids(redis) == ["0", "1", "2", "3", "4"]
+    assert not redis.sismember(DISPATCHERS_KEY, dead_id)
+
+
+def test_claims_of_a_live_dispatcher_are_left_alone(app, redis, queued):
+    async def test(async_redis):
+        live = ClaimedFires(async_redis)
+        await live.heartbeat()
+        await live.pop(3, block=False)
+        return await ClaimedFires(async_redis).heartbeat()
+
+    assert run(app, test) == 0
+    assert queue_ids(redis) == ["3", "4"]
+
+
+def test_close_hands_claims_back(app, redis, queued):
+    async def test(async_redis):
+        claims = ClaimedFires(async_redis)
+        await claims.heartbeat()
+        await claims.pop(2, block=False)
+        await claims.close()
+        return claims.id
+
+    claims_id = run(app, test)
+    assert queue_ids(redis) == ["0", "1", "2", "3", "4"]
+    assert not redis.exists(ALIVE_KEY.format(claims_id))
+
+
+def test_heartbeat_keeps_beating_through_a_slow_flush(app, redis, monkeypatch):
+    monkeypatch.setattr(dispatch_module, "HEARTBEAT_INTERVAL", BEAT)
+
+    async def test(async_redis):
+        claims = ClaimedFires(async_redis)
+        heartbeat = asyncio.create_task(claims.keep_alive(app.logger))
+        # Flushes run in an executor, like this one, while the dispatch loop waits on them
+        await asyncio.get_running_loop().run_in_executor(None, time.sleep, BEAT * 4)
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        return claims.id
+
+    claims_id = run(app, test)
+    assert redis.ttl(ALIVE_KEY.format(claims_id)) > 0
+
+
+def test_dispatcher_fires_and_completes_the_execution(app, api_target, dispatch):
+    with app.app_context():
+        execution_id = enqueue_api_fire(None, 1, api_target.url, {"hello": "world"}, status="test")
+
+    dispatch(lambda: get_execution(execution_id)["status"] == "completed")
+    with app.app_context():
+        execution = get_execution(execution_id)
+    assert execution["status"] == "completed"
+    assert execution["result"]["status_code"] == 200
+    [(headers, body)] = api_target.requests
+    assert body == {"hello": "world"}
+    assert headers["Idempotency-Key"] == execution_id
+
+
+def test_dispatcher_leaves_nothing_claimed_after_stopping(app, redis, api_target, dispatch):
+    with app.app_context():
+        enqueue_api_fire(None, 1, api_target.url, None, status="test")
+
+    dispatch(lambda: len(api_target.requests) == 1)
+    assert not redis.keys("trigger:api-dispatch:processing:*")
+    assert redis.llen(DISPATCH_QUEUE_KEY) == 0
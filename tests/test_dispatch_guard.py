@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+
+from app.dispatch_guard import DEFERRED_KEY, DispatchGuard, is_failure, target_host
+from app.executions import enqueue_api_fire, get_execution
+from app.redis_client import create_async_redis
+
+ENDPOINT = "https://hooks.example.com/fire"
+OTHER_ENDPOINT = "https://other.example.com/fire"
+COOLDOWN = 0.2
+OK = {"status_code": 200}
+SERVER_ERROR = {"status_code": 503}
+
+
+def guarded(app, test, **settings):
+    """Runs test(guard, redis) with a guard on the app's config, overridden by settings."""
+    config = {**app.config, "DISPATCH_DEFER_BASE_MS": 10, **settings}
+
+    async def main():
+        redis = create_async_redis()
+        try:
+            return await test(DispatchGuard(redis, config), redis)
+        finally:
+            await redis.aclose()
+    with app.app_context():
+        return asyncio.run(main())
+
+
+def fires(count, endpoint=ENDPOINT):
+    return [{"execution_id": str(index), "api_endpoint": endpoint} for index in range(count)]
+
+
+@pytest.mark.parametrize("endpoint, host", [
+    ("https://Hooks.Example.com/fire", "hooks.example.com"),
+    ("http://127.0.0.1:8080/x", "127.0.0.1:8080"),
+    ("not a url", "invalid"),
+    (None, "invalid"),
+])
+def test_target_host(endpoint, host):
+    assert target_host(endpoint) == host
+
+
+@pytest.mark.parametrize("result, failure", [
+    ({"status_code": 200}, False),
+    ({"status_code": 404}, False),
+    ({"status_code": 429}, True),
+    ({"status_code": 502}, True),
+    ({"error": "timed out"}, True),
+])
+def test_is_failure(result, failure):
+    assert is_failure(result) is failure
+
+
+def test_burst_is_allowed_then_fires_are_rate_limited(app, redis):
+    async def test(guard, async_redis):
+        return await guard.admit(fires(3))
+
+    allowed, expired = guarded(app, test, DISPATCH_HOST_RATE=1, DISPATCH_HOST_BURST=2)
+    assert [fire["execution_id"] for fire in allowed] == ["0", "1"]
+    assert expired == []
+    assert redis.zcard(DEFERRED_KEY) == 1
+
+
+def test_fires_over_the_concurrency_cap_wait_for_a_slot(app):
+    async def test(guard, async_redis):
+        allowed, _ = await guard.admit(fires(2))
+        waiting = guard.held
+        await guard.release([(allowed[0], OK)])
+        return allowed, waiting, guard.take_held()
+
+    allowed, waiting, retried = guarded(app, test, DISPATCH_HOST_CONCURRENCY=1)
+    assert len(allowed) == 1
+    assert waiting == 1
+    assert [fire["execution_id"] for fire in retried] == ["1"]
+
+
+def test_consecutive_failures_open_the_circuit_for_that_host_only(app):
+    async def test(guard, async_redis):
+        allowed, _ = await guard.admit(fires(2))
+        opened = await guard.release([(fire, SERVER_ERROR) for fire in allowed])
+        blocked, _ = await guard.admit(fires(1))
+        other, _ = await guard.admit(fires(1, OTHER_ENDPOINT))
+        return opened, blocked, other
+
+    opened, blocked, other = guarded(app, test, DISPATCH_BREAKER_FAILURES=2)
+    assert opened == ["hooks.example.com"]
+    assert blocked == []
+    assert len(other) == 1
+
+
+def test_one_probe_is_let_through_after_the_cooldown(app):
+    async def test(guard, async_redis):
+        allowed, _ = await guard.admit(fires(1))
+        await guard.release([(allowed[0], SERVER_ERROR)])
+        await asyncio.sleep(COOLDOWN + 0.05)
+        probes, _ = await guard.admit(fires(2))
+        await guard.release([(probes[0], OK)])
+        closed, _ = await guard.admit(fires(2))
+        return probes, closed
+
+    probes, closed = guarded(app, test, DISPATCH_BREAKER_FAILURES=1, DISPATCH_BREAKER_COOLDOWN=COOLDOWN)
+    assert len(probes) == 1
+    assert len(closed) == 2
+
+
+def test_failed_probe_keeps_the_circuit_open(app):
+    async def test(guard, async_redis):
+        allowed, _ = await guard.admit(fires(1))
+        await guard.release([(allowed[0], SERVER_ERROR)])
+        await asyncio.sleep(COOLDOWN + 0.05)
+        probes, _ = await guard.admit(fires(1))
+        await guard.release([(probes[0], SERVER_ERROR)])
+        blocked, _ = await guard.admit(fires(1))
+        return blocked
+
+    assert guarded(app, test, DISPATCH_BREAKER_FAILURES=1, DISPATCH_BREAKER_COOLDOWN=COOLDOWN) == []
+
+
+def test_fire_deferred_for_too_long_is_given_up(app, redis):
+    async def test(guard, async_redis):
+        fire = {"execution_id": "0", "api_endpoint": ENDPOINT, "deferred_since": time.time() - 10, "deferrals": 4}
+        return await guard.defer([(fire, 0, "rate_limited")])
+
+    [(fire, result)] = guarded(app, test, DISPATCH_DEFER_MAX_AGE=5)
+    assert result == {"error": "Gave up after 4 deferrals (rate_limited)"}
+    assert redis.zcard(DEFERRED_KEY) == 0
+
+
+def test_backoff_grows_with_deferrals_except_for_busy_hosts(app):
+    async def test(guard, async_redis):
+        return ([guard.backoff_ms(deferrals, 0, "rate_limited") for deferrals in range(4)],
+                [guard.backoff_ms(deferrals, 0, "concurrency") for deferrals in range(4)])
+
+    rate_limited, busy = guarded(app, test, DISPATCH_DEFER_BASE_MS=100, DISPATCH_DEFER_MAX_MS=500)
+    for deferrals, delay in enumerate(rate_limited):
+        ceiling = min(500, 100 * 2 ** deferrals)
+        assert ceiling / 2 <= delay <= ceiling
+    assert all(50 <= delay <= 100 for delay in busy)
+
+
+def test_rate_limited_fires_are_sent_later_not_dropped(app, api_target, dispatch):
+    app.config.update(DISPATCH_HOST_RATE=20, DISPATCH_HOST_BURST=1, DISPATCH_DEFER_BASE_MS=10)
+    with app.app_context():
+        execution_ids = [enqueue_api_fire(None, 1, api_target.url, None, status="test") for _ in range(3)]
+
+    dispatch(lambda: all(get_execution(execution_id)["status"] == "completed" for execution_id in execution_ids))
+    assert len(api_target.requests) == 3
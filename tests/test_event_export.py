@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.cold_storage import get_cold_store
+from app.models import EventLog, Trigger
+
+START = datetime(2026, 10, 18, 12, 0)
+LOGGED_EVENTS = 5
+
+
+@pytest.fixture
+def user(app, make_user):
+    """(user_id, headers, [trigger_id, other_trigger_id]) with LOGGED_EVENTS events, a minute apart, alternating triggers."""
+    user_id, headers = make_user()
+    other_id, _ = make_user("other@example.com")
+    with app.app_context():
+        triggers = [Trigger(type="scheduled", interval=5, user_id=user_id) for _ in range(2)]
+        other_trigger = Trigger(type="scheduled", interval=5, user_id=other_id)
+        db.session.add_all(triggers + [other_trigger])
+        db.session.flush()
+        db.session.add_all(
+            EventLog(trigger_id=triggers[index % 2].id, user_id=user_id, status="active",
+                     response={"index": index}, created_at=START + timedelta(minutes=index))
+            for index in range(LOGGED_EVENTS))
+        db.session.add(EventLog(trigger_id=other_trigger.id, user_id=other_id, status="active",
+                                created_at=START))
+        db.session.commit()
+        return user_id, headers, [trigger.id for trigger in triggers]
+
+
+def export(app, headers, **params):
+    response = app.test_client().get("/events/export", query_string=params, headers=headers)
+    assert response.status_code == 200
+    return response
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def test_ndjson_export_streams_the_users_events_oldest_first(app, user):
+    _, headers, _ = user
+    response = export(app, headers)
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["Content-Disposition"] == "attachment; filename=events.ndjson"
+    assert [record["response"] for record in ndjson(response)] == [{"index": index} for index in range(LOGGED_EVENTS)]
+
+
+def test_export_reads_in_batches(app, user):
+    _, headers, _ = user
+    app.config["EVENT_EXPORT_BATCH_SIZE"] = 2
+    assert len(ndjson(export(app, headers))) == LOGGED_EVENTS
+
+
+def test_csv_export_has_a_header_and_json_responses(app, user):
+    _, headers, _ = user
+    rows = list(csv.DictReader(io.StringIO(export(app, headers, format="csv").data.decode())))
+    assert len(rows) == LOGGED_EVENTS
+    assert list(rows[0]) == ["id", "trigger_id", "status", "created_at", "archived_at", "response"]
+    assert json.loads(rows[0]["response"]) == {"index": 0}
+    assert rows[0]["archived_at"] == ""
+
+
+def test_export_filters_by_trigger_and_time(app, user):
+    _, headers, [trigger_id, _] = user
+    records = ndjson(export(app, headers, trigger_id=trigger_id, since=(START + timedelta(minutes=1)).isoformat(),
+                            until=(START + timedelta(minutes=4)).isoformat()))
+    assert [record["response"] for record in records] == [{"index": 2}]
+
+
+def test_cold_events_come_first_unless_only_active_events_are_asked_for(app, user):
+    user_id, headers, [trigger_id, _] = user
+    archived = SimpleNamespace(id=1000, user_id=user_id, trigger_id=trigger_id, created_at=START - timedelta(days=1),
+                               archived_at=START, response=None)
+    get_cold_store(app.config).write([archived], START)
+
+    assert ndjson(export(app, headers))[0]["id"] == 1000
+    assert [record["id"] for record in ndjson(export(app, headers, status="archived"))] == [1000]
+    assert 1000 not in [record["id"] for record in ndjson(export(app, headers, status="active"))]
@@ -0,0 +1,81 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.cold_storage import get_cold_store
+
+ARCHIVED_EVENTS = 3
+MAX_PER_PAGE = 100
+
+
+@pytest.fixture
+def user_id(app):
+    user_id = random.randrange(10**9, 2 * 10**9)
+    created_at = datetime(2026, 10, 18, 12, 0)
+    rows = [
+        SimpleNamespace(id=index + 1, user_id=user_id, trigger_id=1, created_at=created_at + timedelta(minutes=index),
+                        archived_at=None, response=None)
+        for index in range(ARCHIVED_EVENTS)
+    ]
+    get_cold_store(app.config).write(rows, created_at + timedelta(days=1))
+    return user_id
+
+
+@pytest.fixture
+def get_events(app, user_id):
+    client = app.test_client()
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+
+    def get_events(**params):
+        return client.get("/events/", query_string={"status": "archived", **params},
+                          headers={"Authorization": f"Bearer {token}"})
+    return get_events
+
+
+def test_archived_smallest_page(get_events):
+    response = get_events(per_page=1)
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json["events"]] == [3]
+    assert response.json["pagination"]["total_pages"] == ARCHIVED_EVENTS
+    assert response.json["pagination"]["next_page"] == 2
+
+
+def test_archived_last_page_of_smallest_pages(get_events):
+    response = get_events(per_page=1, page=ARCHIVED_EVENTS)
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json["events"]] == [1]
+    assert response.json["pagination"]["next_page"] is None
+
+
+def test_archived_largest_page(get_events):
+    response = get_events(per_page=MAX_PER_PAGE)
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json["events"]] == [3, 2, 1]
+    assert response.json["pagination"]["total_pages"] == 1
+
+
+def test_archived_keyset_smallest_page(get_events):
+    response = get_events(per_page=1, after="")
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json["events"]] == [3]
+    assert response.json["pagination"]["next_after"] is not None
+
+
+@pytest.mark.parametrize("per_page", [0, -1, MAX_PER_PAGE + 1, "ten"])
+def test_archived_per_page_out_of_range(get_events, per_page):
+    response = get_events(per_page=per_page)
+    assert response.status_code == 400
+    assert "per_page" in response.json["errors"]["query"]
+
+
+@pytest.mark.parametrize("per_page", [0, MAX_PER_PAGE + 1])
+def test_archived_keyset_per_page_out_of_range(get_events, per_page):
+    assert get_events(per_page=per_page, after="").status_code == 400
+
+
+def test_archived_page_zero(get_events):
+    assert get_events(page=0).status_code == 400
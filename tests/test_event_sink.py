@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app import db
+from app.event_sink import SPILL_KEY, EventLogSink, replay_spilled_events
+from app.models import EventLog, Trigger
+from app.tasks import log_events
+
+FLUSH_SIZE = 3
+CREATED_AT = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def rows(app, make_user):
+    """Builds event log rows of a trigger of a new user."""
+    user_id, _ = make_user()
+    with app.app_context():
+        trigger = Trigger(type="scheduled", interval=5, user_id=user_id)
+        db.session.add(trigger)
+        db.session.commit()
+        trigger_id = trigger.id
+
+    def rows(count):
+        return [{"trigger_id": trigger_id, "user_id": user_id, "status": "active", "response": {"index": index},
+                 "created_at": CREATED_AT} for index in range(count)]
+    return rows
+
+
+def logged(app):
+    with app.app_context():
+        return sorted(response["index"] for response in db.session.scalars(db.select(EventLog.response)))
+
+
+def rename_table(app, name, new_name):
+    with app.app_context():
+        db.session.execute(db.text(f"ALTER TABLE {name} RENAME TO {new_name}"))
+        db.session.commit()
+
+
+@pytest.fixture
+def restore_event_logs(app):
+    """Makes writes to event_logs fail until the fixture's value is called."""
+    rename_table(app, "event_logs", "event_logs_unavailable")
+    restored = []
+
+    def restore_event_logs():
+        if not restored:
+            rename_table(app, "event_logs_unavailable", "event_logs")
+            restored.append(True)
+    yield restore_event_logs
+    restore_event_logs()
+
+
+def test_sink_writes_once_flush_size_rows_are_waiting(app, rows):
+    sink = EventLogSink(app, flush_size=FLUSH_SIZE, flush_interval_ms=60000)
+    for row in rows(FLUSH_SIZE - 1):
+        sink.add(row)
+    assert logged(app) == []
+    sink.add(rows(FLUSH_SIZE)[-1])
+    assert logged(app) == list(range(FLUSH_SIZE))
+
+
+def test_sink_flushes_after_the_interval(app, rows):
+    sink = EventLogSink(app, flush_size=FLUSH_SIZE, flush_interval_ms=0)
+    sink.add(rows(1)[0])
+    assert sink.due()
+    sink.flush_if_due()
+    assert logged(app) == [0]
+
+
+def test_stopping_the_sink_writes_what_is_buffered(app, rows):
+    sink = EventLogSink(app, flush_size=FLUSH_SIZE, flush_interval_ms=60000)
+    sink.start()
+    sink.add(rows(1)[0])
+    sink.stop()
+    assert logged(app) == [0]
+
+
+def test_bad_row_is_dropped_without_the_rest_of_the_batch(app, rows):
+    batch = rows(3)
+    batch[1]["trigger_id"] = None
+    with app.app_context():
+        log_events(batch)
+    assert logged(app) == [0, 2]
+
+
+def test_rows_are_spilled_to_redis_when_the_table_is_unavailable(app, redis, rows, restore_event_logs):
+    with app.app_context():
+        log_events(rows(2))
+    restore_event_logs()
+    assert redis.llen(SPILL_KEY) == 2
+    assert logged(app) == []
+
+
+def test_spilled_rows_are_replayed_once_the_table_is_back(app, redis, rows, restore_event_logs):
+    with app.app_context():
+        log_events(rows(3))
+    restore_event_logs()
+
+    with app.app_context():
+        assert replay_spilled_events(2) == 2
+        assert replay_spilled_events(2) == 1
+        assert replay_spilled_events(2) == 0
+        [created_at] = set(db.session.scalars(db.select(EventLog.created_at)))
+    assert logged(app) == [0, 1, 2]
+    assert created_at == CREATED_AT.replace(tzinfo=None)
+    assert redis.llen(SPILL_KEY) == 0
@@ -0,0 +1,183 @@
+import threading
+import time
+
+import pytest
+
+from app.cache import (EVENTS_VERSION_KEY, cached_events_page, deserialize, events_cache_stats, events_cache_suffix,
+                       invalidate_user_events, read_events_cache, serialize, to_json, write_events_cache)
+from app.local_cache import init_local_cache
+
+USER_ID = 7
+OTHER_USER_ID = 8
+PARAMS = {"status": "active", "page": 1, "per_page": 10}
+SUFFIX = events_cache_suffix(PARAMS)
+EMPTY_PAGE = to_json({"events": []})
+ONE_EVENT_PAGE = to_json({"events": [1]})
+CONCURRENT_REQUESTS = 8
+COALESCE_MS = 60000
+
+
+@pytest.fixture(autouse=True)
+def context(app):
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def redis_tier_only(app):
+    """Turns the local tier off, so every lookup reaches Redis."""
+    app.config["LOCAL_CACHE_ENABLED"] = False
+    init_local_cache(app)
+
+
+def page_lock_key(user_id, version=0):
+    return f"events:{user_id}:v{version}:{SUFFIX}:lock"
+
+
+def cache_page(user_id, data=b"page"):
+    _, version, window_ms, _ = read_events_cache(user_id, SUFFIX)
+    write_events_cache(user_id, version, SUFFIX, data, window_ms)
+
+
+def test_suffix_ignores_parameter_order():
+    assert events_cache_suffix({"page": 2, "status": "archived"}) == events_cache_suffix(
+        {"status": "archived", "page": 2})
+
+
+def test_suffix_keeps_empty_after_apart_from_missing_after():
+    assert events_cache_suffix({"after": None}) != events_cache_suffix({})
+
+
+def test_cached_page_is_read_back():
+    cache_page(USER_ID)
+    data, version, _, ttl_ms = read_events_cache(USER_ID, SUFFIX)
+    assert data == b"page"
+    assert version == 0
+    assert ttl_ms > 0
+
+
+def test_invalidation_bumps_version_and_hides_cached_pages(redis):
+    cache_page(USER_ID)
+    invalidate_user_events([USER_ID])
+    data, version, _, _ = read_events_cache(USER_ID, SUFFIX)
+    assert data is None
+    assert version == 1
+    assert int(redis.get(EVENTS_VERSION_KEY.format(USER_ID))) == 1
+
+
+def test_invalidation_leaves_other_users_cached():
+    cache_page(USER_ID)
+    cache_page(OTHER_USER_ID)
+    invalidate_user_events([USER_ID])
+    assert read_events_cache(OTHER_USER_ID, SUFFIX)[0] == b"page"
+
+
+def test_invalidation_bumps_each_user_once(redis):
+    invalidate_user_events([USER_ID, USER_ID, OTHER_USER_ID])
+    assert int(redis.get(EVENTS_VERSION_KEY.format(USER_ID))) == 1
+    assert int(redis.get(EVENTS_VERSION_KEY.format(OTHER_USER_ID))) == 1
+
+
+def test_invalidations_within_the_window_are_coalesced(app, redis):
+    app.config["EVENTS_CACHE_COALESCE_MS"] = COALESCE_MS
+    for _ in range(3):
+        invalidate_user_events([USER_ID])
+    assert int(redis.get(EVENTS_VERSION_KEY.format(USER_ID))) == 1
+    stats = events_cache_stats()
+    assert stats["invalidations"] == 3
+    assert stats["coalesced"] == 2
+
+
+def test_page_cached_inside_the_window_expires_with_it(app):
+    app.config["EVENTS_CACHE_COALESCE_MS"] = COALESCE_MS
+    invalidate_user_events([USER_ID])
+    cache_page(USER_ID)
+    _, _, window_ms, ttl_ms = read_events_cache(USER_ID, SUFFIX)
+    assert window_ms > 0
+    assert 0 < ttl_ms <= COALESCE_MS
+
+
+def test_hits_and_misses_are_counted():
+    read_events_cache(USER_ID, SUFFIX)
+    cache_page(USER_ID)
+    read_events_cache(USER_ID, SUFFIX)
+    stats = events_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["hit_rate"] == 0.3333
+
+
+def test_serialize_compresses_large_pages():
+    body = b'{"events": []}' * 1000
+    data = serialize(body, 12)
+    assert data.startswith(b"12:z:")
+    assert len(data) < len(body)
+    assert deserialize(data) == (body, 12)
+
+
+def test_serialize_keeps_small_pages_plain():
+    assert serialize(b"{}", 3) == b"3:j:{}"
+    assert deserialize(b"3:j:{}") == (b"{}", 3)
+
+
+def test_page_is_built_once_then_served_from_redis(redis_tier_only):
+    builds = []
+    build = lambda: builds.append(1) or {"events": []}
+    assert cached_events_page(USER_ID, PARAMS, build) == EMPTY_PAGE
+    assert cached_events_page(USER_ID, PARAMS, build) == EMPTY_PAGE
+    assert len(builds) == 1
+    assert events_cache_stats()["builds"] == 1
+
+
+def test_rebuild_lock_is_released(redis, redis_tier_only):
+    cached_events_page(USER_ID, PARAMS, lambda: {"events": []})
+    assert not redis.exists(page_lock_key(USER_ID))
+
+
+def test_rebuild_lock_is_released_when_the_build_fails(redis, redis_tier_only):
+    def build():
+        raise RuntimeError("database down")
+    with pytest.raises(RuntimeError):
+        cached_events_page(USER_ID, PARAMS, build)
+    assert not redis.exists(page_lock_key(USER_ID))
+
+
+def test_request_waits_for_the_rebuild_in_progress(app, redis, redis_tier_only):
+    redis.set(page_lock_key(USER_ID), "another request", px=5000)
+
+    def finish_rebuild():
+        time.sleep(0.2)
+        with app.app_context():
+            write_events_cache(USER_ID, 0, SUFFIX, serialize(ONE_EVENT_PAGE, 1), -1)
+    threading.Thread(target=finish_rebuild).start()
+
+    def build():
+        raise AssertionError("built the page while another request was rebuilding it")
+    assert cached_events_page(USER_ID, PARAMS, build) == ONE_EVENT_PAGE
+    assert events_cache_stats()["lock_waits"] == 1
+
+
+def test_request_builds_itself_when_the_rebuild_never_comes(app, redis, redis_tier_only):
+    app.config["EVENTS_CACHE_LOCK_TIMEOUT_MS"] = 100
+    redis.set(page_lock_key(USER_ID), "another request", px=5000)
+    assert cached_events_page(USER_ID, PARAMS, lambda: {"events": []}) == EMPTY_PAGE
+
+
+def test_concurrent_misses_build_the_page_once(app, redis_tier_only):
+    builds = []
+    bodies = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.2)
+        return {"events": []}
+
+    def request():
+        with app.app_context():
+            bodies.append(cached_events_page(USER_ID, PARAMS, build))
+    threads = [threading.Thread(target=request) for _ in range(CONCURRENT_REQUESTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert bodies == [EMPTY_PAGE] * CONCURRENT_REQUESTS
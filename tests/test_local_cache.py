@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from app.local_cache import INVALIDATION_CHANNEL, LocalCache, get_local_cache, publish_invalidation
+
+MAX_BYTES = 100
+MAX_ENTRIES = 3
+TTL = 60
+PUBSUB_TIMEOUT = 2.0
+
+
+@pytest.fixture
+def cache():
+    return LocalCache(MAX_BYTES, MAX_ENTRIES, TTL)
+
+
+def put(cache, key, value=b"value", namespace="events:1"):
+    cache.set(key, value, namespace, cache.generation(namespace))
+
+
+def test_set_then_get(cache):
+    put(cache, "a")
+    assert cache.get("a") == b"value"
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_entries_expire_after_ttl():
+    cache = LocalCache(MAX_BYTES, MAX_ENTRIES, 0.01)
+    put(cache, "a")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_past_max_entries(cache):
+    for key in "abc":
+        put(cache, key)
+    cache.get("a")
+    put(cache, "d")
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in "acd"] == [True, True, True]
+
+
+def test_entries_are_evicted_past_max_bytes(cache):
+    put(cache, "a", b"x" * 60)
+    put(cache, "b", b"x" * 60)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 60
+
+
+def test_value_larger_than_the_cache_is_not_stored(cache):
+    put(cache, "a", b"x" * (MAX_BYTES + 1))
+    assert cache.get("a") is None
+
+
+def test_invalidate_drops_only_its_namespace(cache):
+    put(cache, "a", namespace="events:1")
+    put(cache, "b", namespace="events:2")
+    cache.invalidate("events:1")
+    assert cache.get("a") is None
+    assert cache.get("b") == b"value"
+
+
+def test_value_read_before_an_invalidation_is_not_stored(cache):
+    generation = cache.generation("events:1")
+    cache.invalidate("events:1")
+    cache.set("a", b"stale", "events:1", generation)
+    assert cache.get("a") is None
+
+
+def test_value_read_before_a_clear_is_not_stored(cache):
+    generation = cache.generation("events:1")
+    cache.clear()
+    cache.set("a", b"stale", "events:1", generation)
+    assert cache.get("a") is None
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + PUBSUB_TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_published_invalidation_reaches_the_process_cache(app, redis):
+    with app.app_context():
+        cache = get_local_cache()
+        assert wait_for(lambda: redis.pubsub_numsub(INVALIDATION_CHANNEL)[0][1] > 0)
+        put(cache, "kept", namespace="events:2")
+        put(cache, "dropped", namespace="events:1")
+        publish_invalidation("events:1")
+        assert wait_for(lambda: cache.get("dropped") is None)
+        assert cache.get("kept") == b"value"
+
+
+def test_trigger_is_cached_per_owner(app, make_user):
+    owner_id, owner = make_user("owner@example.com")
+    _, other = make_user("other@example.com")
+    client = app.test_client()
+    trigger_id = client.post("/triggers/", json={"type": "scheduled", "interval": 5}, headers=owner).json["id"]
+
+    assert client.get(f"/triggers/{trigger_id}", headers=owner).json["user_id"] == owner_id
+    assert client.get(f"/triggers/{trigger_id}", headers=other).status_code == 404
+
+
+def test_missing_trigger_is_not_found(app, make_user):
+    _, headers = make_user()
+    assert app.test_client().get("/triggers/12345", headers=headers).status_code == 404
+
+
+def test_updated_trigger_is_not_served_from_the_cache(app, make_user):
+    _, headers = make_user()
+    client = app.test_client()
+    trigger_id = client.post("/triggers/", json={"type": "scheduled", "interval": 5}, headers=headers).json["id"]
+    client.get(f"/triggers/{trigger_id}", headers=headers)
+
+    client.put(f"/triggers/{trigger_id}", json={"interval": 10}, headers=headers)
+    assert wait_for(lambda: client.get(f"/triggers/{trigger_id}", headers=headers).json["interval"] == 10)
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from app.recurrence import plan_fires
+
+PLANNED = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+STEP = timedelta(minutes=1)
+
+
+def test_fire_all_on_time_fires_planned_window():
+    fires, next_fire = plan_fires(PLANNED, STEP, PLANNED + timedelta(seconds=5), "fire_all", 10)
+    assert fires == [PLANNED]
+    assert next_fire == PLANNED + STEP
+
+
+def test_fire_all_keeps_most_recent_windows_up_to_the_bound():
+    now = PLANNED + timedelta(minutes=30, seconds=5)
+    fires, next_fire = plan_fires(PLANNED, STEP, now, "fire_all", 10)
+    assert fires == [PLANNED + STEP * index for index in range(21, 31)]
+    assert next_fire == PLANNED + STEP * 31
+
+
+def test_fire_all_with_zero_catch_up_fires_no_missed_window():
+    now = PLANNED + timedelta(minutes=30, seconds=5)
+    fires, next_fire = plan_fires(PLANNED, STEP, now, "fire_all", 0)
+    assert fires == []
+    assert next_fire == PLANNED + STEP * 31
+
+
+def test_fire_all_with_zero_catch_up_still_fires_on_time_window():
+    fires, _ = plan_fires(PLANNED, STEP, PLANNED + timedelta(seconds=5), "fire_all", 0)
+    assert fires == [PLANNED]
+
+
+def test_fire_all_large_gap_fires_only_the_bound():
+    # A year-long outage on a one-minute interval is over half a million missed windows
+    now = PLANNED + timedelta(days=365)
+    fires, next_fire = plan_fires(PLANNED, STEP, now, "fire_all", 10)
+    assert fires == [now - STEP * index for index in range(9, -1, -1)]
+    assert next_fire == now + STEP
+
+
+def test_fire_all_bound_larger_than_gap_fires_every_window():
+    now = PLANNED + timedelta(minutes=3, seconds=5)
+    fires, _ = plan_fires(PLANNED, STEP, now, "fire_all", 10)
+    assert fires == [PLANNED + STEP * index for index in range(4)]
+
+
+def test_coalesce_fires_latest_window_once():
+    now = PLANNED + timedelta(minutes=30, seconds=5)
+    fires, _ = plan_fires(PLANNED, STEP, now, "coalesce", 10)
+    assert fires == [PLANNED + STEP * 30]
+
+
+def test_skip_fires_nothing_after_an_outage():
+    now = PLANNED + timedelta(minutes=30, seconds=5)
+    fires, next_fire = plan_fires(PLANNED, STEP, now, "skip", 10)
+    assert fires == []
+    assert next_fire == PLANNED + STEP * 31
@@ -0,0 +1,146 @@
+import pytest
+from rq import Queue
+from rq.registry import ScheduledJobRegistry
+
+from app import db
+from app.executions import DISPATCH_QUEUE_KEY, enqueue_api_fire, get_execution
+from app.models import Trigger
+from app.retries import add_dead_letters, backoff_seconds, get_dead_letter, list_dead_letters, next_retry_delay
+from app.tasks import retry_scheduled_trigger
+
+CONFIG = {"TRIGGER_MAX_ATTEMPTS": 3, "TRIGGER_RETRY_BACKOFF_MS": 1000, "TRIGGER_RETRY_MAX_MS": 5000}
+PLANNED_AT = 1_800_000_000.0
+
+
+def api_dead_letter(user_id, trigger_id=None):
+    return {"kind": "api", "trigger_id": trigger_id, "user_id": user_id, "attempts": 3,
+            "result": {"status_code": 503},
+            "fire": {"api_endpoint": "http://127.0.0.1:1/hook", "api_payload": {"a": 1}, "idempotency_key": "key-1"}}
+
+
+def test_retry_delay_doubles_up_to_the_maximum():
+    for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (30, 5.0)]:
+        assert ceiling / 2 <= backoff_seconds(attempt, 1000, 5000) <= ceiling
+
+
+def test_no_retry_once_out_of_attempts():
+    assert next_retry_delay(CONFIG, 2) is not None
+    assert next_retry_delay(CONFIG, 3) is None
+
+
+def test_trigger_policy_overrides_the_defaults():
+    assert next_retry_delay(CONFIG, 3, max_attempts=5) is not None
+    assert next_retry_delay(CONFIG, 1, max_attempts=1) is None
+    assert next_retry_delay(CONFIG, 1, backoff_ms=0) == 0
+
+
+def test_dead_letters_are_listed_for_their_owner_only(app):
+    with app.app_context():
+        [first] = add_dead_letters([api_dead_letter(1)])
+        [second] = add_dead_letters([api_dead_letter(1)])
+        add_dead_letters([api_dead_letter(2)])
+        assert [entry["id"] for entry in list_dead_letters(1)] == [second, first]
+        assert get_dead_letter(2, first) is None
+
+
+def test_failed_api_fire_is_retried_with_the_same_idempotency_key(app, api_target, dispatch):
+    api_target.statuses = [503]
+    with app.app_context():
+        execution_id = enqueue_api_fire(None, 1, api_target.url, None, max_attempts=2, retry_backoff_ms=10)
+
+    dispatch(lambda: get_execution(execution_id)["status"] == "completed")
+    with app.app_context():
+        execution = get_execution(execution_id)
+    assert (execution["status"], execution["attempts"]) == ("completed", 2)
+    assert [headers["Idempotency-Key"] for headers, _ in api_target.requests] == [execution_id] * 2
+
+
+def test_api_fire_out_of_attempts_is_dead_lettered(app, api_target, dispatch):
+    api_target.statuses = [503, 503]
+    with app.app_context():
+        execution_id = enqueue_api_fire(None, 1, api_target.url, None, max_attempts=2, retry_backoff_ms=10)
+
+    dispatch(lambda: get_execution(execution_id)["status"] == "failed")
+    with app.app_context():
+        execution = get_execution(execution_id)
+        [entry] = list_dead_letters(1)
+    assert execution["result"]["dead_letter_id"] == entry["id"]
+    assert (entry["kind"], entry["attempts"]) == ("api", 2)
+    assert entry["fire"]["idempotency_key"] == execution_id
+
+
+def test_client_error_is_dead_lettered_without_retrying(app, api_target, dispatch):
+    api_target.statuses = [404]
+    with app.app_context():
+        execution_id = enqueue_api_fire(None, 1, api_target.url, None, max_attempts=3, retry_backoff_ms=10)
+
+    dispatch(lambda: get_execution(execution_id)["status"] == "failed")
+    assert len(api_target.requests) == 1
+
+
+@pytest.fixture
+def trigger_id(app, make_user):
+    user_id, _ = make_user()
+    with app.app_context():
+        trigger = Trigger(type="scheduled", interval=5, recurrence=True, user_id=user_id, max_attempts=2,
+                          retry_backoff_ms=10)
+        db.session.add(trigger)
+        db.session.commit()
+        return trigger.id
+
+
+def test_failed_scheduled_fire_waits_in_the_scheduled_registry(app, redis, trigger_id):
+    with app.app_context():
+        retry_scheduled_trigger(trigger_id, PLANNED_AT, 1, RuntimeError("boom"))
+
+    [job_id] = ScheduledJobRegistry(queue=Queue("trigger", connection=redis)).get_job_ids()
+    job = Queue("trigger", connection=redis).fetch_job(job_id)
+    assert job.args == (trigger_id,)
+    assert job.kwargs == {"planned_at": PLANNED_AT, "attempt": 2}
+
+
+def test_scheduled_fire_out_of_attempts_is_dead_lettered(app, trigger_id):
+    with app.app_context():
+        retry_scheduled_trigger(trigger_id, PLANNED_AT, 2, RuntimeError("boom"))
+        [entry] = list_dead_letters(Trigger.query.get(trigger_id).user_id)
+    assert (entry["kind"], entry["trigger_id"], entry["planned_at"]) == ("scheduled", trigger_id, PLANNED_AT)
+    assert entry["result"] == {"error": "boom"}
+
+
+@pytest.fixture
+def owner(app, make_user):
+    """(Authorization headers, id of one of their dead letters)"""
+    user_id, headers = make_user("owner@example.com")
+    with app.app_context():
+        [dead_letter_id] = add_dead_letters([api_dead_letter(user_id)])
+    return headers, dead_letter_id
+
+
+def test_dead_letter_endpoints_hide_other_users_entries(app, owner, make_user):
+    _, dead_letter_id = owner
+    _, other = make_user("other@example.com")
+    client = app.test_client()
+    assert client.get("/dead-letters/", headers=other).json == []
+    assert client.get(f"/dead-letters/{dead_letter_id}", headers=other).status_code == 404
+    assert client.delete(f"/dead-letters/{dead_letter_id}", headers=other).status_code == 404
+    assert client.post(f"/dead-letters/{dead_letter_id}/replay", headers=other).status_code == 404
+
+
+def test_discarded_dead_letter_is_gone(app, owner):
+    headers, dead_letter_id = owner
+    client = app.test_client()
+    assert client.delete(f"/dead-letters/{dead_letter_id}", headers=headers).status_code == 200
+    assert client.get(f"/dead-letters/{dead_letter_id}", headers=headers).status_code == 404
+    assert client.delete(f"/dead-letters/{dead_letter_id}", headers=headers).status_code == 404
+
+
+def test_replayed_api_dead_letter_is_queued_again_once(app, redis, owner):
+    headers, dead_letter_id = owner
+    client = app.test_client()
+    response = client.post(f"/dead-letters/{dead_letter_id}/replay", headers=headers)
+    assert response.status_code == 202
+    assert response.json["id"] == dead_letter_id
+    assert redis.llen(DISPATCH_QUEUE_KEY) == 1
+    with app.app_context():
+        assert get_execution(response.json["execution_id"])["status"] == "queued"
+    assert client.post(f"/dead-letters/{dead_letter_id}/replay", headers=headers).status_code == 404
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.models import EventLog, Trigger
+from app.scheduler import SCHEDULE_KEY
+from app.tasks import execute_scheduled_trigger
+
+INTERVAL = 1
+
+
+@pytest.fixture
+def trigger(app, make_user):
+    """A recurring trigger whose next fire was due five seconds ago."""
+    user_id, _ = make_user()
+    with app.app_context():
+        next_fire_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=5)
+        trigger = Trigger(type="scheduled", interval=INTERVAL, recurrence=True, user_id=user_id,
+                          next_fire_at=next_fire_at)
+        db.session.add(trigger)
+        db.session.commit()
+        yield trigger.id, next_fire_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+def fire(trigger_id, planned_at, attempt=1):
+    execute_scheduled_trigger(trigger_id, planned_at=planned_at, attempt=attempt)
+    db.session.expire_all()
+    return db.session.get(Trigger, trigger_id).next_fire_at, EventLog.query.filter_by(trigger_id=trigger_id).count()
+
+
+def test_fire_logs_and_schedules_the_next_one(trigger, redis):
+    trigger_id, planned_at = trigger
+    next_fire_at, logged = fire(trigger_id, planned_at)
+    assert logged == 1
+    assert next_fire_at.replace(tzinfo=timezone.utc).timestamp() == pytest.approx(planned_at + INTERVAL * 60)
+    assert redis.zscore(SCHEDULE_KEY, str(trigger_id)) == pytest.approx(planned_at + INTERVAL * 60)
+
+
+def test_duplicate_fire_is_dropped(trigger):
+    trigger_id, planned_at = trigger
+    first = fire(trigger_id, planned_at)
+    assert fire(trigger_id, planned_at) == first
+
+
+def test_fire_of_an_edited_trigger_is_dropped(trigger):
+    trigger_id, planned_at = trigger
+    next_fire_at, logged = fire(trigger_id, planned_at - 60)
+    assert logged == 0
+    assert next_fire_at.replace(tzinfo=timezone.utc).timestamp() == pytest.approx(planned_at)
+
+
+def test_retry_after_the_schedule_moved_on_only_logs(trigger):
+    trigger_id, planned_at = trigger
+    next_fire_at, _ = fire(trigger_id, planned_at)
+    assert fire(trigger_id, planned_at, attempt=2) == (next_fire_at, 2)
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from rq import Queue
+
+from app.scheduler import (SCHEDULE_KEY, WAKEUP_KEY, TriggerScheduler, claims_key, processing_key,
+                           schedule_triggers, unschedule_trigger)
+
+NOW = 1_800_000_000.0
+DUE = datetime.fromtimestamp(NOW - 5, timezone.utc)
+LATER = datetime.fromtimestamp(NOW + 60, timezone.utc)
+LEASE = 30
+FUNC = "app.tasks.execute_scheduled_trigger"
+
+
+@pytest.fixture
+def queue(redis):
+    return Queue("trigger", connection=redis)
+
+
+@pytest.fixture
+def scheduler(redis, queue):
+    return TriggerScheduler(redis, queue, FUNC, batch_size=2, lease=LEASE)
+
+
+def test_claims_only_due_triggers(scheduler):
+    schedule_triggers(scheduler.connection, {1: DUE, 2: LATER})
+    assert scheduler.claim_due(NOW) == [(1, DUE.timestamp())]
+    assert scheduler.connection.zscore(SCHEDULE_KEY, "2") == LATER.timestamp()
+
+
+def test_claims_at_most_a_batch(scheduler):
+    schedule_triggers(scheduler.connection, {trigger_id: DUE for trigger_id in range(1, 6)})
+    assert len(scheduler.claim_due(NOW)) == 2
+    assert scheduler.connection.zcard(SCHEDULE_KEY) == 3
+
+
+def test_claimed_fire_is_not_claimed_twice(redis, queue, scheduler):
+    schedule_triggers(redis, {1: DUE})
+    peer = TriggerScheduler(redis, queue, FUNC, lease=LEASE)
+    assert scheduler.claim_due(NOW) == [(1, DUE.timestamp())]
+    assert peer.claim_due(NOW) == []
+
+
+def test_enqueue_passes_planned_time_and_releases_claims(redis, queue, scheduler):
+    schedule_triggers(redis, {1: DUE})
+    scheduler.enqueue(scheduler.claim_due(NOW))
+
+    [job] = queue.get_jobs()
+    assert job.func_name == FUNC
+    assert job.args == (1,)
+    assert job.kwargs == {"planned_at": DUE.timestamp()}
+    assert redis.zcard(processing_key(SCHEDULE_KEY)) == 0
+    assert redis.hlen(claims_key(SCHEDULE_KEY)) == 0
+
+
+def test_expired_claim_is_put_back_at_its_fire_time(redis, scheduler):
+    schedule_triggers(redis, {1: DUE})
+    scheduler.claim_due(NOW)
+    assert scheduler.recover(NOW + LEASE - 1) == 0
+    assert scheduler.recover(NOW + LEASE) == 1
+    assert redis.zscore(SCHEDULE_KEY, "1") == DUE.timestamp()
+    assert redis.zcard(processing_key(SCHEDULE_KEY)) == 0
+
+
+def test_recovery_keeps_a_newer_schedule(redis, scheduler):
+    schedule_triggers(redis, {1: DUE})
+    scheduler.claim_due(NOW)
+    schedule_triggers(redis, {1: LATER})
+    scheduler.recover(NOW + LEASE)
+    assert redis.zscore(SCHEDULE_KEY, "1") == LATER.timestamp()
+
+
+def test_unscheduled_claim_is_not_recovered(redis, scheduler):
+    schedule_triggers(redis, {1: DUE})
+    scheduler.claim_due(NOW)
+    unschedule_trigger(redis, 1)
+    assert scheduler.recover(NOW + LEASE) == 0
+    assert redis.zscore(SCHEDULE_KEY, "1") is None
+
+
+def test_tick_enqueues_due_triggers(redis, queue, scheduler):
+    now = datetime.now(timezone.utc)
+    schedule_triggers(redis, {1: now - timedelta(seconds=5), 2: now + timedelta(minutes=1)})
+    assert scheduler.tick() == 1
+    assert [job.args for job in queue.get_jobs()] == [(1,)]
+
+
+def test_scheduling_wakes_a_sleeping_scheduler(redis, scheduler):
+    schedule_triggers(redis, {1: LATER})
+    assert redis.blpop(WAKEUP_KEY, timeout=1) is not None
+
+
+def test_updated_trigger_is_rescheduled(app, redis, make_user):
+    _, headers = make_user()
+    client = app.test_client()
+    trigger_id = client.post("/triggers/", json={"type": "scheduled", "interval": 5}, headers=headers).json["id"]
+
+    next_fire_at = client.put(f"/triggers/{trigger_id}", json={"interval": 60}, headers=headers).json["next_fire_at"]
+    planned = datetime.fromisoformat(next_fire_at).replace(tzinfo=timezone.utc)
+    assert redis.zscore(SCHEDULE_KEY, str(trigger_id)) == pytest.approx(planned.timestamp(), abs=1e-3)
+
+
+def test_deleted_trigger_is_unscheduled(app, redis, make_user):
+    _, headers = make_user()
+    client = app.test_client()
+    trigger_id = client.post("/triggers/", json={"type": "scheduled", "interval": 5}, headers=headers).json["id"]
+    assert redis.zscore(SCHEDULE_KEY, str(trigger_id)) is not None
+
+    client.delete(f"/triggers/{trigger_id}", headers=headers)
+    assert redis.zscore(SCHEDULE_KEY, str(trigger_id)) is None
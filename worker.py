@@ -1,13 +1,132 @@
-from rq import Worker
-from redis import Redis
-from app.tasks import trigger_queue, archive_queue 
+"""
+Worker supervisor.
+
+Starts and supervises one process per worker slot:
+- dedicated mode: WORKER_CONCURRENCY processes per queue, each listening on its own
+  queue plus any queue ranked above it in WORKER_QUEUE_PRIORITY;
+- weighted mode: WORKER_PROCESSES processes that each drain every queue in
+  WORKER_WEIGHTS, picking the next queue by weight;
+plus DISPATCHER_PROCESSES async API trigger dispatchers and SCHEDULER_PROCESSES
+trigger schedulers.
+
+Crashed processes are restarted. On SIGTERM/SIGINT every child is asked to finish
+its current job and exit, and is killed after WORKER_SHUTDOWN_TIMEOUT seconds.
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()  # Before the app reads its settings from the environment
+
+from app import create_app
+from app.config import parse_queue_counts
+from app.redis_client import get_redis
+from app.tasks import schedule_event_archival_and_deletion
+from app.workers import AppWorker, WeightedWorker, prioritized_queues
+
+
+def run_worker(queues, weights=None):
+    app = create_app("worker")
+    if weights:
+        worker = WeightedWorker(queues, connection=get_redis(), app=app, weights=weights)
+    else:
+        worker = AppWorker(queues, connection=get_redis(), app=app)
+    worker.work(with_scheduler=True)
+
+
+def run_dispatcher_process():
+    from app.dispatch import run_dispatcher
+
+    run_dispatcher(create_app("worker"))
+
+
+def run_scheduler_process():
+    from app.scheduler import run_scheduler
+
+    run_scheduler(create_app("worker"))
+
+
+def worker_slots(config):
+    """Returns (name, target, args) for every process to supervise."""
+    slots = []
+    if config["WORKER_MODE"] == "weighted":
+        weights = parse_queue_counts(config["WORKER_WEIGHTS"])
+        for index in range(config["WORKER_PROCESSES"] or os.cpu_count()):
+            slots.append((f"weighted-{index}", run_worker, (list(weights), weights)))
+    else:
+        priority = [name.strip() for name in config["WORKER_QUEUE_PRIORITY"].split(",") if name.strip()]
+        for queue_name, count in parse_queue_counts(config["WORKER_CONCURRENCY"]).items():
+            for index in range(count):
+                slots.append((f"{queue_name}-{index}", run_worker, (prioritized_queues(queue_name, priority),)))
+
+    for index in range(config["DISPATCHER_PROCESSES"]):
+        slots.append((f"dispatcher-{index}", run_dispatcher_process, ()))
+    for index in range(config["SCHEDULER_PROCESSES"]):
+        slots.append((f"scheduler-{index}", run_scheduler_process, ()))
+    return slots
+
+
+class Supervisor:
+    """Keeps one child process alive per slot until asked to stop."""
+
+    def __init__(self, slots, shutdown_timeout, logger):
+        self.slots = slots
+        self.shutdown_timeout = shutdown_timeout
+        self.logger = logger
+        self.processes = {}
+        self.stopping = False
+
+    def start(self, slot):
+        name, target, args = slot
+        process = multiprocessing.Process(target=target, args=args, name=name)
+        process.start()
+        self.processes[name] = (slot, process)
+        self.logger.info(f"Started {name} (pid {process.pid}).")
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        for slot in self.slots:
+            self.start(slot)
+
+        while not self.stopping:
+            time.sleep(1)
+            for name, (slot, process) in list(self.processes.items()):
+                if not process.is_alive() and not self.stopping:
+                    self.logger.warning(f"{name} exited with code {process.exitcode}, restarting.")
+                    self.start(slot)
+
+        self.drain()
+
+    def drain(self):
+        """Asks every child to finish its current work, then kills whatever is left after the timeout."""
+        self.logger.info("Stopping workers...")
+        for _, process in self.processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for name, (_, process) in self.processes.items():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.warning(f"{name} did not stop in time, killing it.")
+                process.kill()
+                process.join()
+        self.logger.info("All workers stopped.")
 
-redis_conn = Redis(host='redis_cache')
 
 if __name__ == "__main__":
 
-    trigger_worker = Worker(['trigger'], connection=redis_conn)
-    archive_worker = Worker(['archive'], connection=redis_conn)
-    
-    trigger_worker.work()
-    archive_worker.work()
\ No newline at end of file
+    app = create_app("worker")
+
+    # Start the archival/partition maintenance chain if it is not already pending
+    schedule_event_archival_and_deletion()
+
+    Supervisor(worker_slots(app.config), app.config["WORKER_SHUTDOWN_TIMEOUT"], app.logger).run()